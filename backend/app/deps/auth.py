@@ -1,7 +1,14 @@
+import base64
 import os
+import hashlib
+import json
+import threading
+import time
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from typing import Optional
+from typing import Any, Dict, Optional
+
+from app.utils.cache import TTLCache
 
 firebase_admin_available = False
 try:
@@ -13,9 +20,167 @@ except Exception:
 
 bearer_scheme = HTTPBearer(auto_error=False)
 
+# Verified ID tokens, keyed by SHA-256 of the token, kept until the token's own
+# `exp` (never longer). Clients resend the same token for its whole lifetime.
+_token_cache = TTLCache(
+    maxsize=int(os.getenv("AUTH_TOKEN_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("AUTH_TOKEN_CACHE_MAX_TTL", "3600")),
+    negative_ttl=None,
+    name="auth_tokens",
+)
+# Leave a little room so a token is never accepted from cache right at expiry
+_EXPIRY_SKEW_SECONDS = 5
+
+_firebase_lock = threading.Lock()
+_firebase_ready = False
+_cert_refresher: Optional[threading.Thread] = None
+
+_verify_stats_lock = threading.Lock()
+_verify_stats: Dict[str, float] = {
+    "cache_hits": 0,
+    "verifications": 0,
+    "failures": 0,
+    "verify_ms_total": 0.0,
+    "verify_ms_max": 0.0,
+    "cert_refreshes": 0,
+    "cert_refresh_failures": 0,
+}
+
+
+def _record(**deltas: float) -> None:
+    with _verify_stats_lock:
+        for key, value in deltas.items():
+            _verify_stats[key] += value
+
+
+def auth_stats() -> Dict[str, Any]:
+    with _verify_stats_lock:
+        stats: Dict[str, Any] = dict(_verify_stats)
+    if stats["verifications"]:
+        stats["verify_ms_avg"] = round(stats["verify_ms_total"] / stats["verifications"], 3)
+    stats["token_cache"] = _token_cache.stats()
+    return stats
+
+
+def _b64url(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode("ascii")
+
+
+def _cert_probe_token(project_id: str) -> str:
+    """A well-formed ID token with a bogus signature.
+
+    It passes the SDK's claim checks, so verifying it fetches (or reuses) the
+    signing certificates and then fails on the unknown key id.
+    """
+    now = int(time.time())
+    header = {"alg": "RS256", "kid": "landten-cert-probe", "typ": "JWT"}
+    claims = {
+        "aud": project_id,
+        "iss": f"https://securetoken.google.com/{project_id}",
+        "sub": "cert-probe",
+        "iat": now,
+        "auth_time": now,
+        "exp": now + 300,
+    }
+    segments = [_b64url(json.dumps(part, separators=(",", ":")).encode("utf-8")) for part in (header, claims)]
+    return ".".join(segments + [_b64url(b"probe")])
+
+
+def _prefetch_signing_certs() -> None:
+    """Warm firebase-admin's certificate cache through the public verify path."""
+    if os.getenv("FIREBASE_AUTH_EMULATOR_HOST"):
+        return  # the emulator does not sign tokens
+    app = firebase_admin.get_app()
+    try:
+        fb_auth.verify_id_token(_cert_probe_token(app.project_id), app=app)
+    except fb_auth.CertificateFetchError as exc:
+        _record(cert_refresh_failures=1)
+        print(f"[auth] signing certificate prefetch failed: {exc}")
+        return
+    except fb_auth.InvalidIdTokenError:
+        pass  # expected: rejected at the signature check, after the certs were loaded
+    _record(cert_refreshes=1)
+
+
+def _refresh_certs_forever(interval: float) -> None:  # pragma: no cover - background loop
+    while True:
+        try:
+            _prefetch_signing_certs()
+        except Exception as exc:
+            _record(cert_refresh_failures=1)
+            print(f"[auth] signing certificate prefetch error: {type(exc).__name__}: {exc}")
+        time.sleep(interval)
+
+
+def _ensure_firebase_app() -> None:
+    global _firebase_ready, _cert_refresher
+    if _firebase_ready:
+        return
+    with _firebase_lock:
+        if _firebase_ready:
+            return
+        if not firebase_admin._apps:
+            cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS") or os.getenv("FIREBASE_CREDENTIALS")
+            if cred_path and os.path.isfile(cred_path):
+                firebase_admin.initialize_app(fb_credentials.Certificate(cred_path))
+            else:
+                firebase_admin.initialize_app()
+        interval = float(os.getenv("AUTH_CERT_REFRESH_SECONDS", "1800"))
+        if interval > 0:
+            _cert_refresher = threading.Thread(
+                target=_refresh_certs_forever, args=(interval,), name="firebase-cert-refresh", daemon=True
+            )
+            _cert_refresher.start()
+        _firebase_ready = True
+
+
+def _verify_with_firebase(token: str) -> str:
+    key = hashlib.sha256(token.encode("utf-8")).hexdigest()
+    cached = _token_cache.get(key)
+    if cached is not None:
+        uid, exp = cached
+        if exp - _EXPIRY_SKEW_SECONDS > time.time():
+            _record(cache_hits=1)
+            return uid
+        _token_cache.invalidate(key)
+
+    _ensure_firebase_app()
+    start = time.perf_counter()
+    try:
+        decoded = fb_auth.verify_id_token(token)
+    except Exception:
+        _record(failures=1)
+        raise HTTPException(status_code=401, detail="Invalid Firebase token")
+    finally:
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        _record(verifications=1, verify_ms_total=elapsed_ms)
+        with _verify_stats_lock:
+            _verify_stats["verify_ms_max"] = max(_verify_stats["verify_ms_max"], elapsed_ms)
+
+    uid = decoded.get("uid", "user")
+    exp = float(decoded.get("exp") or 0)
+    remaining = exp - _EXPIRY_SKEW_SECONDS - time.time()
+    if remaining > 0:
+        _token_cache.set(key, (uid, exp), ttl=min(remaining, _token_cache.ttl))
+    return uid
+
+
+def auth_disabled() -> bool:
+    return os.getenv("AUTH_DISABLED", "false").lower() in {"1", "true", "yes"}
+
+
+def firebase_enabled() -> bool:
+    return os.getenv("USE_FIREBASE_ADMIN", "false").lower() in {"1", "true", "yes"}
+
+
+def identity_verified() -> bool:
+    """Whether ``verify_firebase_token`` returns a verified uid (not dev mode or the any-token fallback)."""
+    return firebase_enabled() and not auth_disabled()
+
+
 def verify_firebase_token(credentials: HTTPAuthorizationCredentials = Depends(bearer_scheme)):
     # Dev-mode bypass controlled by env AUTH_DISABLED
-    if os.getenv("AUTH_DISABLED", "false").lower() in {"1", "true", "yes"}:
+    if auth_disabled():
         return "dev-mode"
 
     # TODO: Integrate firebase-admin in production
@@ -24,20 +189,10 @@ def verify_firebase_token(credentials: HTTPAuthorizationCredentials = Depends(be
     token = credentials.credentials
 
     # Production path using firebase-admin if available and enabled
-    if os.getenv("USE_FIREBASE_ADMIN", "false").lower() in {"1","true","yes"}:
+    if firebase_enabled():
         if not firebase_admin_available:
             raise HTTPException(status_code=500, detail="Firebase admin not available")
-        if not firebase_admin._apps:
-            cred_path = os.getenv("GOOGLE_APPLICATION_CREDENTIALS") or os.getenv("FIREBASE_CREDENTIALS")
-            if cred_path and os.path.isfile(cred_path):
-                firebase_admin.initialize_app(fb_credentials.Certificate(cred_path))
-            else:
-                firebase_admin.initialize_app()
-        try:
-            decoded = fb_auth.verify_id_token(token)
-            return decoded.get("uid", "user")
-        except Exception:
-            raise HTTPException(status_code=401, detail="Invalid Firebase token")
+        return _verify_with_firebase(token)
 
     # Fallback accepts any non-empty token
     return token
@@ -1,17 +1,118 @@
 import os
+import threading
+from typing import Any, Dict, Optional
+
 import boto3
 from botocore.config import Config
 
+from app.utils.dependency_timing import instrument_boto_session
+from app.utils.dynamo_capacity import instrument_capacity
+
+# Process-wide registry. boto3 sessions/resources are expensive to build
+# (credential resolution, endpoint loading, a fresh urllib3 pool), so we
+# build them once and reuse them across requests and warm Lambda invocations.
+# The repos only call Table actions (put_item/query/...), which delegate to the
+# underlying client, and botocore clients are thread-safe.
+_lock = threading.Lock()
+_owner_pid: Optional[int] = None
+_session: Optional[boto3.session.Session] = None
+_resource = None
+_client = None
+_tables: Dict[str, Any] = {}
+
+
+def _env_flag(name: str, default: str) -> bool:
+    return os.getenv(name, default).lower() not in {"false", "0", "no"}
+
+
+def _dynamo_config() -> Config:
+    return Config(
+        retries={"max_attempts": 3, "mode": "standard"},
+        max_pool_connections=int(os.getenv("DYNAMO_MAX_POOL_CONNECTIONS", "50")),
+        tcp_keepalive=_env_flag("DYNAMO_TCP_KEEPALIVE", "true"),
+        connect_timeout=float(os.getenv("DYNAMO_CONNECT_TIMEOUT", "2")),
+        read_timeout=float(os.getenv("DYNAMO_READ_TIMEOUT", "5")),
+    )
+
+
+def _ensure_fresh_process() -> None:
+    # Sockets must not be shared with a forked child (gunicorn --preload, etc.)
+    global _owner_pid, _session, _resource, _client
+    pid = os.getpid()
+    if _owner_pid != pid:
+        _owner_pid = pid
+        _session = None
+        _resource = None
+        _client = None
+        _tables.clear()
+
+
+def _get_session() -> boto3.session.Session:
+    global _session
+    if _session is None:
+        region = os.getenv("AWS_REGION", os.getenv("AWS_DEFAULT_REGION", "us-east-1"))
+        _session = boto3.session.Session(region_name=region)
+        instrument_boto_session(_session)
+        instrument_capacity(_session)
+    return _session
+
 
 def get_dynamo_resource():
-    region = os.getenv("AWS_REGION", os.getenv("AWS_DEFAULT_REGION", "us-east-1"))
-    endpoint_url = os.getenv("DYNAMO_ENDPOINT_URL")  # allow local dynamodb
-    cfg = Config(retries={"max_attempts": 3, "mode": "standard"})
-    return boto3.resource("dynamodb", region_name=region, endpoint_url=endpoint_url, config=cfg)
+    """Return the shared DynamoDB service resource, creating it on first use."""
+    global _resource
+    resource = _resource
+    if resource is not None and _owner_pid == os.getpid():
+        return resource
+    with _lock:
+        _ensure_fresh_process()
+        if _resource is None:
+            endpoint_url = os.getenv("DYNAMO_ENDPOINT_URL")  # allow local dynamodb
+            _resource = _get_session().resource(
+                "dynamodb", endpoint_url=endpoint_url, config=_dynamo_config()
+            )
+        return _resource
+
+
+def get_dynamo_client():
+    """Return the shared low-level DynamoDB client (thread-safe)."""
+    global _client
+    client = _client
+    if client is not None and _owner_pid == os.getpid():
+        return client
+    with _lock:
+        _ensure_fresh_process()
+        if _client is None:
+            endpoint_url = os.getenv("DYNAMO_ENDPOINT_URL")
+            _client = _get_session().client(
+                "dynamodb", endpoint_url=endpoint_url, config=_dynamo_config()
+            )
+        return _client
+
+
+def get_table(base: str):
+    """Return a cached ``Table`` handle for the logical table ``base``."""
+    name = table_name(base)
+    table = _tables.get(name)
+    if table is not None and _owner_pid == os.getpid():
+        return table
+    resource = get_dynamo_resource()
+    with _lock:
+        table = _tables.get(name)
+        if table is None:
+            table = resource.Table(name)
+            _tables[name] = table
+        return table
+
+
+def reset_dynamo_resources() -> None:
+    """Drop cached session/resource/client (tests, credential rotation)."""
+    global _owner_pid
+    with _lock:
+        _owner_pid = None
+        _ensure_fresh_process()
 
 
 def table_name(base: str) -> str:
     prefix = os.getenv("TABLE_PREFIX", "landtenmvp")
     stage = os.getenv("STAGE", "dev")
     return f"{prefix}_{stage}_{base}"
-
@@ -0,0 +1,27 @@
+from fastapi import Depends, HTTPException, Request
+
+from app.deps.auth import identity_verified, verify_firebase_token
+
+
+def enforce_user_rate_limit(request: Request, uid: str = Depends(verify_firebase_token)) -> str:
+    """Apply the route's ``user``-scoped rate policy to the authenticated caller.
+
+    ``RateLimitMiddleware`` defers such policies to this dependency, so the
+    bucket is keyed on the verified uid rather than on the bearer string
+    (a fresh ID token must not mean a fresh bucket). Without a verified
+    identity (dev mode, any-token fallback) the client IP is the key.
+    Returns the uid, so routes can use it in place of ``verify_firebase_token``.
+    """
+    deferred = request.scope.get("state", {}).get("rate_limit")
+    if deferred is None:
+        return uid
+    limiter, policy = deferred
+    if identity_verified():
+        key = f"user:{uid}"
+    else:
+        key = f"ip:{request.client.host if request.client else 'unknown'}"
+    if not limiter.allow(key, policy):
+        raise HTTPException(
+            status_code=429, detail="Too Many Requests", headers={"Retry-After": str(policy.retry_after())}
+        )
+    return uid
@@ -0,0 +1,60 @@
+from functools import lru_cache
+
+from app.repos.chat_repo import ChatRepo
+from app.repos.idempotency_repo import IdempotencyRepo
+from app.repos.incident_repo import IncidentRepo
+from app.repos.job_repo import JobRepo
+from app.repos.profile_repo import ProfileRepo
+from app.repos.task_repo import TaskRepo
+from app.repos.thread_repo import ThreadRepo
+
+# Repos are stateless wrappers around the shared DynamoDB table handles, so a
+# single instance per process is enough. These double as FastAPI dependencies.
+
+
+@lru_cache(maxsize=None)
+def get_chat_repo() -> ChatRepo:
+    return ChatRepo()
+
+
+@lru_cache(maxsize=None)
+def get_idempotency_repo() -> IdempotencyRepo:
+    return IdempotencyRepo()
+
+
+@lru_cache(maxsize=None)
+def get_incident_repo() -> IncidentRepo:
+    return IncidentRepo()
+
+
+@lru_cache(maxsize=None)
+def get_job_repo() -> JobRepo:
+    return JobRepo()
+
+
+@lru_cache(maxsize=None)
+def get_profile_repo() -> ProfileRepo:
+    return ProfileRepo()
+
+
+@lru_cache(maxsize=None)
+def get_task_repo() -> TaskRepo:
+    return TaskRepo()
+
+
+@lru_cache(maxsize=None)
+def get_thread_repo() -> ThreadRepo:
+    return ThreadRepo()
+
+
+def reset_repos() -> None:
+    for factory in (
+        get_chat_repo,
+        get_idempotency_repo,
+        get_incident_repo,
+        get_job_repo,
+        get_profile_repo,
+        get_task_repo,
+        get_thread_repo,
+    ):
+        factory.cache_clear()
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from stream_chat import StreamChat
+except ImportError:  # pragma: no cover
+    StreamChat = None  # type: ignore
+
+try:
+    import aiohttp
+    from stream_chat.async_chat import StreamChatAsync
+except ImportError:  # pragma: no cover
+    aiohttp = None  # type: ignore
+    StreamChatAsync = None  # type: ignore
+
+POOL_SIZE = int(os.getenv("STREAM_HTTP_POOL_SIZE", "32"))
+TIMEOUT = float(os.getenv("STREAM_HTTP_TIMEOUT", "6"))
+KEEPALIVE = float(os.getenv("STREAM_HTTP_KEEPALIVE", "59"))
+
+_clients: Dict[Tuple[str, str], "StreamChat"] = {}
+_clients_lock = threading.Lock()
+# (api_key, api_secret) -> (event loop, client); aiohttp sessions are bound to a loop
+_async_clients: Dict[Tuple[str, str], Tuple[asyncio.AbstractEventLoop, "StreamChatAsync"]] = {}
+
+
+def _pooled_session() -> requests.Session:
+    session = requests.Session()
+    # One host (chat.stream-io-api.com); keep enough warm connections for the
+    # threadpool so concurrent requests do not open and discard sockets
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=1)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def get_stream_client(api_key: str, api_secret: str) -> "StreamChat":
+    """Process-wide Stream client per credential pair, sharing one pooled keep-alive session."""
+    key = (api_key, api_secret)
+    client = _clients.get(key)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(key)
+            if client is None:
+                client = StreamChat(api_key, api_secret, timeout=TIMEOUT)
+                client.session.close()
+                client.session = _pooled_session()
+                _clients[key] = client
+    return client
+
+
+async def get_async_stream_client(api_key: str, api_secret: str) -> "StreamChatAsync":
+    """Async Stream client for the running event loop (created on first use)."""
+    key = (api_key, api_secret)
+    loop = asyncio.get_running_loop()
+    entry = _async_clients.get(key)
+    if entry is not None and entry[0] is loop and not entry[1].session.closed:
+        return entry[1]
+    client = StreamChatAsync(api_key, api_secret, timeout=TIMEOUT)
+    await client.session.close()
+    client.session = aiohttp.ClientSession(
+        base_url=client.base_url,
+        connector=aiohttp.TCPConnector(limit=POOL_SIZE, keepalive_timeout=KEEPALIVE),
+    )
+    # A client left behind by another (finished) loop cannot be closed from here
+    _async_clients[key] = (loop, client)
+    return client
+
+
+async def close_async_stream_clients() -> None:
+    """Close the async clients owned by the running loop."""
+    loop = asyncio.get_running_loop()
+    for key, (owner, client) in list(_async_clients.items()):
+        if owner is loop:
+            _async_clients.pop(key, None)
+            await client.close()
+
+
+def reset_stream_clients() -> None:
+    """Forget the cached clients (tests, credential rotation)."""
+    with _clients_lock:
+        for client in _clients.values():
+            client.session.close()
+        _clients.clear()
+    _async_clients.clear()
@@ -12,10 +12,15 @@ from app.routes import (
     profile,
     task,
     chat_stream,
+    metrics,
 )
-from starlette.middleware.base import BaseHTTPMiddleware
-import time, uuid, logging
-from app.utils.rate_limit import SimpleRateLimiter
+import os, logging
+from contextlib import asynccontextmanager
+from app.utils.rate_limit import PolicyTable, RateLimitMiddleware, RatePolicy, SLIDING_WINDOW
+from app.utils.rate_limit_shared import limiter_from_env
+from app.utils.lifecycle import flush_background_work
+from app.utils.logging import configure_logging
+from app.utils.metrics import MetricsMiddleware, register_collector
 from app.utils.startup_checks import validate_env
 try:
     from dotenv import load_dotenv
@@ -23,10 +28,19 @@ try:
 except Exception:
     pass
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Server processes only: Lambda (Mangum) keeps its own log handlers
+    if os.getenv("LOG_QUEUE", "true").lower() in {"1", "true", "yes"} and not os.getenv("AWS_LAMBDA_FUNCTION_NAME"):
+        configure_logging()
+    yield
+    # Drain write-behind/background queues (runs per invocation under Mangum)
+    flush_background_work(timeout=float(os.getenv("SHUTDOWN_FLUSH_TIMEOUT", "5")))
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Minimal CORS for local dev and Next.js frontend
-import os
 cors_origins_env = os.getenv("BACKEND_CORS_ORIGINS", "*")
 origins = [o.strip() for o in cors_origins_env.split(",") if o.strip()]
 app.add_middleware(
@@ -37,38 +51,47 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-class LoggingMiddleware(BaseHTTPMiddleware):
-    async def dispatch(self, request, call_next):
-        rid = str(uuid.uuid4())
-        start = time.time()
-        response = None
-        try:
-            response = await call_next(request)
-            return response
-        finally:
-            dur = (time.time() - start) * 1000
-            logging.info(
-                {
-                    "request_id": rid,
-                    "method": request.method,
-                    "path": request.url.path,
-                    "status": getattr(response, "status_code", None),
-                    "duration_ms": round(dur, 2),
-                }
-            )
-
-app.add_middleware(LoggingMiddleware)
-
-limiter = SimpleRateLimiter(max_requests=120, window_seconds=60)
-
-@app.middleware("http")
-async def rate_limit_middleware(request, call_next):
-    client_ip = request.client.host if request.client else "unknown"
-    key = f"ip:{client_ip}"
-    if not limiter.allow(key):
-        from fastapi import Response
-        return Response(status_code=429, content="Too Many Requests")
-    return await call_next(request)
+_access_logger = logging.getLogger("app.access")
+
+
+def _log_access(entry):
+    _access_logger.info(entry)
+
+
+_metrics_access_log = _log_access if os.getenv("ACCESS_LOG", "true").lower() in {"1", "true", "yes"} else None
+
+# Per-process by default; RATE_LIMIT_BACKEND=shm|dynamodb shares counts across workers/instances
+limiter = limiter_from_env()
+rate_policies = PolicyTable(
+    default=RatePolicy.parse("default", os.getenv("RATE_LIMIT_DEFAULT", "120/60"), algorithm=SLIDING_WINDOW),
+    routes=[
+        ("/health", RatePolicy.parse("health", os.getenv("RATE_LIMIT_HEALTH", "600/60"))),
+        # Each call is an LLM completion plus a Stream post: limit per user
+        # (enforced after auth by the routes' enforce_user_rate_limit dependency)
+        (
+            "/chat/stream/agent_reply",
+            RatePolicy.parse("agent_reply", os.getenv("RATE_LIMIT_AGENT_REPLY", "10/60"), burst=3, scope="user"),
+        ),
+        # Stream delivers webhooks from a handful of IPs
+        ("/chat/stream/webhook", RatePolicy.parse("stream_webhook", os.getenv("RATE_LIMIT_WEBHOOK", "1200/60"))),
+    ],
+)
+
+
+def _rate_limit_key(scope, policy: RatePolicy) -> str:
+    # "user" policies are keyed on the verified uid by app.deps.rate_limit
+    client = scope.get("client")
+    return f"ip:{client[0] if client else 'unknown'}"
+
+
+app.add_middleware(RateLimitMiddleware, limiter=limiter, policies=rate_policies, key_func=_rate_limit_key)
+register_collector("rate_limiter", limiter.stats)
+# Outermost, so it also times the rate limiter and CORS (middleware added last runs first)
+app.add_middleware(
+    MetricsMiddleware,
+    access_log=_metrics_access_log,
+    server_timing=os.getenv("SERVER_TIMING", "true").lower() in {"1", "true", "yes"},
+)
 
 app.include_router(chat.router)
 app.include_router(incident.router)
@@ -80,6 +103,7 @@ app.include_router(media.router)
 app.include_router(profile.router)
 app.include_router(task.router)
 app.include_router(chat_stream.router)
+app.include_router(metrics.router)
 
 @app.get("/")
 def root():
@@ -1,14 +1,17 @@
 from __future__ import annotations
-from typing import Dict, Any, List
-from app.deps.dynamo import get_dynamo_resource, table_name
+from typing import Dict, Any, Iterator, List, Optional, Tuple
+from app.deps.dynamo import get_table
+from app.utils.dynamo_capacity import track_repo_methods
+from app.repos.pagination import decode_cursor, encode_cursor
 
 
+@track_repo_methods
 class ChatRepo:
     def __init__(self):
-        self.dynamo = get_dynamo_resource()
-        self.table = self.dynamo.Table(table_name("chat_messages"))
+        self.table = get_table("chat_messages")
 
-    def put_message(self, payload: Dict[str, Any]) -> None:
+    @staticmethod
+    def build_item(payload: Dict[str, Any]) -> Dict[str, Any]:
         # partition by thread_id if provided, else 'default'
         thread_id = payload.get("thread_id", "default")
         item = {
@@ -26,13 +29,90 @@ class ChatRepo:
         card_payload = payload.get("payload")
         if card_payload is not None:
             item["payload"] = card_payload
-        self.table.put_item(Item=item)
+        return item
 
-    def list_messages(self, thread_id: str) -> List[Dict[str, Any]]:
-        resp = self.table.query(
-            KeyConditionExpression="#tid = :tid",
-            ExpressionAttributeNames={"#tid": "thread_id"},
-            ExpressionAttributeValues={":tid": thread_id},
-            ScanIndexForward=True,
+    def put_message(self, payload: Dict[str, Any]) -> None:
+        self.table.put_item(Item=self.build_item(payload))
+
+    def batch_put(self, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """One BatchWriteItem call (max 25 items); returns the unprocessed items."""
+        resp = self.table.meta.client.batch_write_item(
+            RequestItems={self.table.name: [{"PutRequest": {"Item": item}} for item in items]}
         )
-        return resp.get("Items", [])
+        unprocessed = resp.get("UnprocessedItems", {}).get(self.table.name, [])
+        return [req["PutRequest"]["Item"] for req in unprocessed]
+
+    @staticmethod
+    def start_key(thread_id: str, cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+        """The ``ExclusiveStartKey`` in ``cursor``; raises InvalidCursor unless it is one of ``thread_id``'s."""
+        return decode_cursor(cursor, keys=("thread_id", "timestamp"), expect={"thread_id": thread_id})
+
+    def query_messages(
+        self,
+        thread_id: str,
+        limit: Optional[int] = None,
+        before: Optional[str] = None,
+        after: Optional[str] = None,
+        cursor: Optional[str] = None,
+        newest_first: bool = False,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Return one page of messages and an opaque cursor for the next page.
+
+        ``before``/``after`` are exclusive timestamp bounds. ``cursor`` is the
+        ``next_cursor`` returned by a previous call with the same filters.
+        """
+        names = {"#tid": "thread_id"}
+        values: Dict[str, Any] = {":tid": thread_id}
+        condition = "#tid = :tid"
+        if before and after:
+            names["#ts"] = "timestamp"
+            values[":after"] = after
+            values[":before"] = before
+            condition += " AND #ts BETWEEN :after AND :before"
+        elif before:
+            names["#ts"] = "timestamp"
+            values[":before"] = before
+            condition += " AND #ts < :before"
+        elif after:
+            names["#ts"] = "timestamp"
+            values[":after"] = after
+            condition += " AND #ts > :after"
+
+        kwargs: Dict[str, Any] = {
+            "KeyConditionExpression": condition,
+            "ExpressionAttributeNames": names,
+            "ExpressionAttributeValues": values,
+            "ScanIndexForward": not newest_first,
+        }
+        if limit:
+            kwargs["Limit"] = limit
+        start_key = self.start_key(thread_id, cursor)
+        if start_key:
+            kwargs["ExclusiveStartKey"] = start_key
+
+        resp = self.table.query(**kwargs)
+        items = resp.get("Items", [])
+        if before and after:
+            # BETWEEN is inclusive; the API bounds are not
+            items = [i for i in items if i.get("timestamp") not in (before, after)]
+        return items, encode_cursor(resp.get("LastEvaluatedKey"))
+
+    def iter_message_pages(
+        self, thread_id: str, page_size: int = 500, **filters: Any
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """Yield pages until the thread is exhausted; memory stays at one page."""
+        cursor = filters.pop("cursor", None)
+        while True:
+            items, cursor = self.query_messages(
+                thread_id, limit=page_size, cursor=cursor, **filters
+            )
+            if items:
+                yield items
+            if not cursor:
+                return
+
+    def list_messages(self, thread_id: str) -> List[Dict[str, Any]]:
+        messages: List[Dict[str, Any]] = []
+        for page in self.iter_message_pages(thread_id):
+            messages.extend(page)
+        return messages
@@ -0,0 +1,30 @@
+import time
+from typing import Optional
+
+from app.deps.dynamo import get_table
+from app.utils.dynamo_capacity import track_repo_methods
+
+
+@track_repo_methods
+class IdempotencyRepo:
+    """Processed-event markers with a DynamoDB TTL (attribute ``expires_at``)."""
+
+    def __init__(self):
+        self.table = get_table("webhook_events")
+
+    def claim(self, event_key: str, ttl_seconds: int, now: Optional[float] = None) -> bool:
+        """Record ``event_key`` unless a live marker exists; True if we own it now."""
+        now = int(now if now is not None else time.time())
+        try:
+            self.table.put_item(
+                Item={"event_key": event_key, "claimed_at": now, "expires_at": now + ttl_seconds},
+                # DynamoDB TTL deletes lazily, so an expired marker can still be present
+                ConditionExpression="attribute_not_exists(event_key) OR expires_at < :now",
+                ExpressionAttributeValues={":now": now},
+            )
+        except self.table.meta.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def release(self, event_key: str) -> None:
+        self.table.delete_item(Key={"event_key": event_key})
@@ -1,12 +1,14 @@
 from typing import Dict, Any
 
-from app.deps.dynamo import get_dynamo_resource, table_name
+from app.deps.dynamo import get_table
+from app.utils.dynamo_capacity import track_repo_methods
 
 
+@track_repo_methods
 class IncidentRepo:
 
     def __init__(self):
-        self.table = get_dynamo_resource().Table(table_name("incidents"))
+        self.table = get_table("incidents")
 
     def create_incident(self, payload: Dict[str, Any]) -> None:
         self.table.put_item(Item=payload)
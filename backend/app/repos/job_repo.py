@@ -1,10 +1,12 @@
 from typing import Dict, Any, List
-from app.deps.dynamo import get_dynamo_resource, table_name
+from app.deps.dynamo import get_table
+from app.utils.dynamo_capacity import track_repo_methods
 
 
+@track_repo_methods
 class JobRepo:
     def __init__(self):
-        self.table = get_dynamo_resource().Table(table_name("jobs"))
+        self.table = get_table("jobs")
 
     def create_job(self, job: Dict[str, Any]) -> None:
         self.table.put_item(Item=job)
@@ -0,0 +1,55 @@
+import base64
+import json
+from decimal import Decimal
+from typing import Any, Dict, Iterable, Optional
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+def _default(value: Any):
+    if isinstance(value, Decimal):
+        return {"$n": str(value)}
+    raise TypeError(f"Unsupported cursor value: {type(value).__name__}")
+
+
+def _object_hook(obj: Dict[str, Any]):
+    if set(obj) == {"$n"}:
+        return Decimal(obj["$n"])
+    return obj
+
+
+def encode_cursor(key: Optional[Dict[str, Any]]) -> Optional[str]:
+    """Turn a DynamoDB ``LastEvaluatedKey`` (or any small dict) into an opaque token."""
+    if not key:
+        return None
+    raw = json.dumps(key, default=_default, separators=(",", ":"), sort_keys=True)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(
+    token: Optional[str],
+    keys: Optional[Iterable[str]] = None,
+    expect: Optional[Dict[str, Any]] = None,
+) -> Optional[Dict[str, Any]]:
+    """Inverse of :func:`encode_cursor`.
+
+    ``keys`` are the exact fields the cursor must have and ``expect`` fixes
+    some of their values (e.g. the partition key of the queried item), so a
+    token from another query is rejected instead of reaching DynamoDB.
+    """
+    if not token:
+        return None
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        raw = base64.urlsafe_b64decode(padded.encode("ascii"))
+        key = json.loads(raw.decode("utf-8"), object_hook=_object_hook)
+    except (ValueError, UnicodeError) as exc:
+        raise InvalidCursor("Malformed pagination cursor") from exc
+    if not isinstance(key, dict) or (keys is not None and set(key) != set(keys)):
+        raise InvalidCursor("Malformed pagination cursor")
+    for name, value in (expect or {}).items():
+        if key.get(name) != value:
+            raise InvalidCursor("Pagination cursor belongs to a different query")
+    return key
@@ -1,16 +1,42 @@
+import os
 from typing import Optional, Dict
-from app.deps.dynamo import get_dynamo_resource, table_name
+from app.deps.dynamo import get_table
+from app.utils.dynamo_capacity import track_repo_methods
+from app.utils.cache import TTLCache
 
+# Personas change rarely but are read on nearly every screen. Shared by all
+# ProfileRepo instances in the process; writes go through it.
+profile_cache = TTLCache(
+    maxsize=int(os.getenv("PROFILE_CACHE_SIZE", "10000")),
+    ttl=float(os.getenv("PROFILE_CACHE_TTL", "300")),
+    negative_ttl=float(os.getenv("PROFILE_CACHE_NEGATIVE_TTL", "30")),
+    name="profiles",
+)
 
+
+@track_repo_methods
 class ProfileRepo:
     def __init__(self):
-        self.table = get_dynamo_resource().Table(table_name("profiles"))
+        self.table = get_table("profiles")
+        self.cache = profile_cache
 
     def upsert_profile(self, user_id: str, persona: str) -> Dict[str, str]:
         item = {"user_id": user_id, "persona": persona}
-        self.table.put_item(Item=item)
+        try:
+            self.table.put_item(Item=item)
+        except Exception:
+            self.cache.invalidate(user_id)
+            raise
+        self.cache.set(user_id, item)
         return item
 
-    def get_profile(self, user_id: str) -> Optional[Dict[str, str]]:
+    def _load_profile(self, user_id: str) -> Optional[Dict[str, str]]:
         resp = self.table.get_item(Key={"user_id": user_id})
         return resp.get("Item")
+
+    def get_profile(self, user_id: str) -> Optional[Dict[str, str]]:
+        return self.cache.get_or_load(user_id, lambda: self._load_profile(user_id))
+
+    def get_persona(self, user_id: str) -> Optional[str]:
+        profile = self.get_profile(user_id)
+        return profile.get("persona") if profile else None
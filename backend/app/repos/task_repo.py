@@ -1,11 +1,30 @@
-from typing import Dict, Any, List
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime, timezone
-from app.deps.dynamo import get_dynamo_resource, table_name
+from app.deps.dynamo import get_table
+from app.utils.dynamo_capacity import track_repo_methods
+from app.repos.pagination import decode_cursor, encode_cursor
 
+# GSIs keyed by the owning persona / assignee. Their sort key is the composite
+# "<status>#<created_at>" so a status filter and a date range are both key
+# conditions; without a status filter results come back grouped by status,
+# newest first within each status.
+PERSONA_INDEX = "persona-status-index"
+ASSIGNEE_INDEX = "assignee-status-index"
+SORT_KEY = "status_created_at"
 
+_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="task-query")
+
+
+def _sort_key(status: Optional[str], created_at: Optional[str]) -> str:
+    return f"{status or ''}#{created_at or ''}"
+
+
+@track_repo_methods
 class TaskRepo:
     def __init__(self):
-        self.table = get_dynamo_resource().Table(table_name("tasks"))
+        self.table = get_table("tasks")
 
     def create_task(self, payload: Dict[str, Any]) -> Dict[str, Any]:
         now = datetime.now(timezone.utc).isoformat()
@@ -19,18 +38,178 @@ class TaskRepo:
             "assigned_to": payload.get("assigned_to"),
             "persona": payload.get("persona"),
         }
+        item[SORT_KEY] = _sort_key(item["status"], item["created_at"])
         self.table.put_item(Item=item)
         return item
 
-    def list_tasks(self, persona: str) -> List[Dict[str, Any]]:
-        resp = self.table.scan()
-        items = resp.get("Items", [])
-        return [item for item in items if item.get("persona") == persona or item.get("assigned_to") == persona]
+    def _query_stream(
+        self,
+        index: str,
+        attr: str,
+        value: str,
+        limit: Optional[int],
+        start_key: Optional[Dict[str, Any]],
+        status: Optional[str],
+        created_from: Optional[str],
+        created_to: Optional[str],
+    ) -> Tuple[List[Dict[str, Any]], Optional[Dict[str, Any]]]:
+        """Collect up to ``limit`` matching items from one index, newest first."""
+        names = {"#pk": attr}
+        values: Dict[str, Any] = {":pk": value}
+        condition = "#pk = :pk"
+        kwargs: Dict[str, Any] = {"IndexName": index, "ScanIndexForward": False}
+        if status:
+            names["#sk"] = SORT_KEY
+            values[":lo"] = _sort_key(status, created_from)
+            values[":hi"] = _sort_key(status, created_to) + "\uffff"
+            condition += " AND #sk BETWEEN :lo AND :hi"
+        else:
+            filters = []
+            if created_from:
+                names["#ca"] = "created_at"
+                values[":from"] = created_from
+                filters.append("#ca >= :from")
+            if created_to:
+                names["#ca"] = "created_at"
+                values[":to"] = created_to + "\uffff"
+                filters.append("#ca <= :to")
+            if filters:
+                kwargs["FilterExpression"] = " AND ".join(filters)
+        kwargs.update(
+            KeyConditionExpression=condition,
+            ExpressionAttributeNames=names,
+            ExpressionAttributeValues=values,
+        )
+
+        items: List[Dict[str, Any]] = []
+        while True:
+            if limit:
+                kwargs["Limit"] = limit - len(items)
+            if start_key:
+                kwargs["ExclusiveStartKey"] = start_key
+            resp = self.table.query(**kwargs)
+            items.extend(resp.get("Items", []))
+            start_key = resp.get("LastEvaluatedKey")
+            # A FilterExpression can return short pages; keep reading so the
+            # merge below never skips items that sort ahead of the other stream.
+            if not start_key or (limit and len(items) >= limit):
+                return items, start_key
+
+    @staticmethod
+    def _index_key(item: Dict[str, Any], attr: str) -> Dict[str, Any]:
+        return {"task_id": item["task_id"], attr: item[attr], SORT_KEY: item[SORT_KEY]}
+
+    def list_tasks(
+        self,
+        persona: str,
+        status: Optional[str] = None,
+        created_from: Optional[str] = None,
+        created_to: Optional[str] = None,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """Tasks owned by or assigned to ``persona``, merged and de-duplicated.
+
+        Both GSIs are queried in parallel; the cursor carries the position in
+        each so paging stays consistent. ``limit=None`` returns everything.
+        """
+        state = decode_cursor(cursor) or {}
+        streams = [
+            ("p", PERSONA_INDEX, "persona"),
+            ("a", ASSIGNEE_INDEX, "assigned_to"),
+        ]
+        futures = {}
+        for tag, index, attr in streams:
+            if state.get(f"{tag}_done"):
+                continue
+            # Run in a copy of our context so timing/capacity stay attributed to this request
+            futures[tag] = _executor.submit(
+                contextvars.copy_context().run,
+                self._query_stream,
+                index,
+                attr,
+                persona,
+                limit,
+                state.get(tag),
+                status,
+                created_from,
+                created_to,
+            )
+        results = {tag: fut.result() for tag, fut in futures.items()}
+
+        pending = {tag: list(results[tag][0]) for tag in results}
+        positions = {tag: 0 for tag in results}
+        last_taken: Dict[str, Dict[str, Any]] = {}
+        merged: List[Dict[str, Any]] = []
+        while not limit or len(merged) < limit:
+            heads = [
+                (pending[tag][positions[tag]][SORT_KEY], tag)
+                for tag in pending
+                if positions[tag] < len(pending[tag])
+            ]
+            if not heads:
+                break
+            _, tag = max(heads)
+            item = pending[tag][positions[tag]]
+            positions[tag] += 1
+            last_taken[tag] = item
+            # A task matching both indexes is always emitted by the persona
+            # stream, which keeps de-duplication correct across pages too.
+            if tag == "a" and item.get("persona") == persona:
+                continue
+            merged.append(item)
+
+        next_state: Dict[str, Any] = {}
+        for tag, _, attr in streams:
+            if tag not in results:
+                next_state[f"{tag}_done"] = True
+                continue
+            items, last_key = results[tag]
+            if positions[tag] < len(items):
+                next_state[tag] = self._index_key(last_taken[tag], attr) if tag in last_taken else state.get(tag)
+            elif last_key:
+                next_state[tag] = last_key
+            else:
+                next_state[f"{tag}_done"] = True
+        if next_state.get("p_done") and next_state.get("a_done"):
+            return merged, None
+        return merged, encode_cursor(next_state)
 
     def update_status(self, task_id: str, status: str) -> None:
+        resp = self.table.get_item(
+            Key={"task_id": task_id},
+            ProjectionExpression="created_at",
+        )
+        created_at = (resp.get("Item") or {}).get("created_at")
         self.table.update_item(
             Key={"task_id": task_id},
-            UpdateExpression="SET #s = :status",
-            ExpressionAttributeNames={"#s": "status"},
-            ExpressionAttributeValues={":status": status},
+            UpdateExpression="SET #s = :status, #sk = :sk",
+            ExpressionAttributeNames={"#s": "status", "#sk": SORT_KEY},
+            ExpressionAttributeValues={
+                ":status": status,
+                ":sk": _sort_key(status, created_at),
+            },
+        )
+
+    def iter_all_tasks(self, page_size: int = 200):
+        """Scan the table page by page (backfill only; never on a request path)."""
+        kwargs: Dict[str, Any] = {"Limit": page_size}
+        while True:
+            resp = self.table.scan(**kwargs)
+            yield resp.get("Items", [])
+            last_key = resp.get("LastEvaluatedKey")
+            if not last_key:
+                return
+            kwargs["ExclusiveStartKey"] = last_key
+
+    def backfill_sort_key(self, item: Dict[str, Any]) -> bool:
+        expected = _sort_key(item.get("status"), item.get("created_at"))
+        if item.get(SORT_KEY) == expected:
+            return False
+        self.table.update_item(
+            Key={"task_id": item["task_id"]},
+            UpdateExpression="SET #sk = :sk",
+            ExpressionAttributeNames={"#sk": SORT_KEY},
+            ExpressionAttributeValues={":sk": expected},
         )
+        return True
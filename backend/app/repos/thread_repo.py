@@ -1,11 +1,20 @@
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from datetime import datetime, timezone
-from app.deps.dynamo import get_dynamo_resource, table_name
+from app.deps.dynamo import get_table
+from app.utils.dynamo_capacity import track_repo_methods
+from app.repos.pagination import decode_cursor, encode_cursor
 
+# Adjacency table: one item per (user_id, thread_id) carrying a denormalized
+# copy of the thread so a user's inbox is a single Query. The GSI orders a
+# user's threads by last_activity_at.
+MEMBERS_ACTIVITY_INDEX = "user-activity-index"
 
+
+@track_repo_methods
 class ThreadRepo:
     def __init__(self):
-        self.table = get_dynamo_resource().Table(table_name("threads"))
+        self.table = get_table("threads")
+        self.members = get_table("thread_members")
 
     def create_thread(self, thread: Dict[str, Any]) -> Dict[str, Any]:
         now = datetime.now(timezone.utc).isoformat()
@@ -16,10 +25,106 @@ class ThreadRepo:
             "participants": thread.get("participants", []),
         }
         self.table.put_item(Item=item)
+        self.index_thread(item)
         return item
 
+    def index_thread(self, thread: Dict[str, Any]) -> int:
+        """Write the per-participant adjacency items for ``thread``."""
+        participants = list(dict.fromkeys(thread.get("participants") or []))
+        last_activity = thread.get("last_activity_at") or thread.get("created_at")
+        with self.members.batch_writer(overwrite_by_pkeys=["user_id", "thread_id"]) as batch:
+            for user_id in participants:
+                batch.put_item(
+                    Item={
+                        "user_id": user_id,
+                        "thread_id": thread.get("thread_id"),
+                        "title": thread.get("title"),
+                        "created_at": thread.get("created_at"),
+                        "participants": participants,
+                        "last_activity_at": last_activity,
+                    }
+                )
+        return len(participants)
+
+    def get_participants(self, thread_id: str) -> List[str]:
+        resp = self.table.get_item(
+            Key={"thread_id": thread_id},
+            ProjectionExpression="participants",
+        )
+        return list((resp.get("Item") or {}).get("participants", []))
+
+    def is_participant(self, user_id: str, thread_id: str) -> bool:
+        resp = self.members.get_item(
+            Key={"user_id": user_id, "thread_id": thread_id},
+            ProjectionExpression="thread_id",
+        )
+        return "Item" in resp
+
+    def touch_thread(self, thread_id: str, at: Optional[str] = None, participants: Optional[Iterable[str]] = None) -> None:
+        """Bump ``last_activity_at`` for every participant's index entry."""
+        at = at or datetime.now(timezone.utc).isoformat()
+        if participants is None:
+            participants = self.get_participants(thread_id)
+        client_errors = self.members.meta.client.exceptions
+        for user_id in participants:
+            try:
+                self.members.update_item(
+                    Key={"user_id": user_id, "thread_id": thread_id},
+                    UpdateExpression="SET last_activity_at = :at",
+                    ConditionExpression="attribute_exists(thread_id) AND "
+                    "(attribute_not_exists(last_activity_at) OR last_activity_at < :at)",
+                    ExpressionAttributeValues={":at": at},
+                )
+            except client_errors.ConditionalCheckFailedException:
+                # Not indexed for this user, or a newer message already won
+                continue
+
+    @staticmethod
+    def start_key(user_id: str, cursor: Optional[str]) -> Optional[Dict[str, Any]]:
+        """The activity-index ``ExclusiveStartKey`` in ``cursor``; raises InvalidCursor unless it is ``user_id``'s."""
+        return decode_cursor(
+            cursor, keys=("user_id", "thread_id", "last_activity_at"), expect={"user_id": user_id}
+        )
+
+    def query_threads_for_user(
+        self, user_id: str, limit: Optional[int] = None, cursor: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+        """One page of the user's threads, most recently active first."""
+        kwargs: Dict[str, Any] = {
+            "IndexName": MEMBERS_ACTIVITY_INDEX,
+            "KeyConditionExpression": "#uid = :uid",
+            "ExpressionAttributeNames": {"#uid": "user_id"},
+            "ExpressionAttributeValues": {":uid": user_id},
+            "ScanIndexForward": False,
+        }
+        if limit:
+            kwargs["Limit"] = limit
+        start_key = self.start_key(user_id, cursor)
+        if start_key:
+            kwargs["ExclusiveStartKey"] = start_key
+        resp = self.members.query(**kwargs)
+        threads = []
+        for entry in resp.get("Items", []):
+            thread = {k: v for k, v in entry.items() if k != "user_id"}
+            threads.append(thread)
+        return threads, encode_cursor(resp.get("LastEvaluatedKey"))
+
     def list_threads_for_user(self, user_id: str) -> List[Dict[str, Any]]:
-        # For MVP, scan (small scale); TODO: add GSI for participants
-        resp = self.table.scan()
-        items = resp.get("Items", [])
-        return [item for item in items if user_id in item.get("participants", [])]
+        threads: List[Dict[str, Any]] = []
+        cursor = None
+        while True:
+            page, cursor = self.query_threads_for_user(user_id, cursor=cursor)
+            threads.extend(page)
+            if not cursor:
+                return threads
+
+    def iter_all_threads(self, page_size: int = 200) -> Iterable[List[Dict[str, Any]]]:
+        """Scan the base table page by page (backfill only; never on a request path)."""
+        kwargs: Dict[str, Any] = {"Limit": page_size}
+        while True:
+            resp = self.table.scan(**kwargs)
+            yield resp.get("Items", [])
+            last_key = resp.get("LastEvaluatedKey")
+            if not last_key:
+                return
+            kwargs["ExclusiveStartKey"] = last_key
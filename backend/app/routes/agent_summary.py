@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends
 from app.deps.auth import verify_firebase_token
 from app.repos.chat_repo import ChatRepo
+from app.deps.repos import get_chat_repo
 from typing import List, Dict
 
 
@@ -16,9 +17,15 @@ def _summarize_locally(messages: List[Dict]) -> str:
 
 
 @router.get("/agent/summarize_thread/{thread_id}")
-def summarize_thread(thread_id: str, token: str = Depends(verify_firebase_token)):
+def summarize_thread(
+    thread_id: str,
+    token: str = Depends(verify_firebase_token),
+    repo: ChatRepo = Depends(get_chat_repo),
+):
     try:
-        messages = ChatRepo().list_messages(thread_id)
+        # Only the tail is summarized; fetch it newest-first instead of the whole thread
+        recent, _ = repo.query_messages(thread_id, limit=5, newest_first=True)
+        messages = list(reversed(recent))
     except Exception:
         messages = []
 
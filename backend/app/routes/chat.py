@@ -1,10 +1,22 @@
-from fastapi import APIRouter, Depends, HTTPException
+import json
+import os
+from urllib.parse import parse_qs
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
-from app.deps.auth import verify_firebase_token
-from app.deps.pusher_client import get_pusher_client
+from typing import Iterator, List, Literal, Optional, Dict, Any
+from app.deps.auth import auth_disabled, identity_verified, verify_firebase_token
 from datetime import datetime, timezone
 from app.repos.chat_repo import ChatRepo
+from app.deps.repos import get_chat_repo, get_thread_repo
+from app.repos.thread_repo import ThreadRepo
+from app.repos.pagination import InvalidCursor
+from app.services.write_behind import get_chat_write_buffer
+from app.services.realtime_dispatcher import get_realtime_dispatcher
+from app.services.thread_activity import get_thread_activity
+from app.services.realtime_channels import parse_channel, thread_channel, user_channel
+from app.deps.pusher_client import get_pusher_client
 
 router = APIRouter()
 
@@ -18,6 +30,16 @@ class ChatMessage(BaseModel):
     attachments: Optional[List[Dict[str, Any]]] = None
     payload: Optional[Dict[str, Any]] = None
     timestamp: Optional[str] = None
+    # sync: persisted before the response; buffered: queued for a batched write
+    durability: Optional[Literal["sync", "buffered"]] = None
+
+# Default when the client does not pick a durability mode
+CHAT_DURABILITY = os.getenv("CHAT_DURABILITY", "sync").lower()
+
+# Fan-out: every message goes to its thread's private channel; optionally to
+# each participant's private user channel and to the legacy global channel.
+REALTIME_USER_CHANNELS = os.getenv("REALTIME_USER_CHANNELS", "false").lower() in {"1", "true", "yes"}
+REALTIME_LEGACY_CHANNEL = os.getenv("REALTIME_LEGACY_CHANNEL", "false").lower() in {"1", "true", "yes"}
 
 _IN_MEMORY_HISTORY: Dict[str, List[dict]] = {}
 
@@ -25,35 +47,194 @@ _IN_MEMORY_HISTORY: Dict[str, List[dict]] = {}
 def _append_history(thread_id: str, payload: dict) -> None:
     _IN_MEMORY_HISTORY.setdefault(thread_id, []).append(payload)
 
-def _get_pusher():
-    return get_pusher_client()
+
+def _broadcast_channels(thread_id: str, participants: Optional[List[str]]) -> List[str]:
+    channels = []
+    try:
+        channels.append(thread_channel(thread_id))
+        for user_id in participants or []:
+            channels.append(user_channel(user_id))
+    except ValueError as exc:
+        print(f"[chat] realtime channel skipped for {thread_id}: {exc}")
+    if REALTIME_LEGACY_CHANNEL:
+        channels.append("chat")
+    return channels
+
+
+def _keep_failed_writes(items: List[dict]) -> None:
+    # Buffered writes that exhausted their retries stay readable in dev/local
+    for item in items:
+        _append_history(item.get("thread_id", "default"), item)
+
 
 @router.post("/chat/send")
-def send_message(msg: ChatMessage, token: str = Depends(verify_firebase_token)):
+def send_message(
+    msg: ChatMessage,
+    token: str = Depends(verify_firebase_token),
+    repo: ChatRepo = Depends(get_chat_repo),
+    threads: ThreadRepo = Depends(get_thread_repo),
+):
     # Timestamp if missing
     payload = msg.model_dump()
     if not payload.get("timestamp"):
         payload["timestamp"] = datetime.now(timezone.utc).isoformat()
 
     thread_id = payload.get("thread_id", "default")
+    durability = payload.pop("durability", None) or CHAT_DURABILITY
+
+    participants = None
+    if REALTIME_USER_CHANNELS:
+        try:
+            participants = threads.get_participants(thread_id)
+        except Exception as exc:
+            print(f"[chat] participant lookup failed for {thread_id}: {exc}")
 
-    # Broadcast on aligned channel/event
-    p = _get_pusher()
-    p.trigger("chat", "message", payload)
+    # Broadcast per thread (and per member); the dispatcher batches and sends
+    # in the background so the push API's latency never lands on this request
+    dispatcher = get_realtime_dispatcher()
+    for channel in _broadcast_channels(thread_id, participants):
+        dispatcher.publish(channel, "message", payload)
+
+    if durability == "buffered":
+        buffered = get_chat_write_buffer(on_failure=_keep_failed_writes).submit(repo.build_item(payload))
+        if not buffered:
+            durability = "sync"  # buffer full: apply backpressure by writing inline
 
     # Persist to DynamoDB
     try:
-        ChatRepo().put_message(payload)
+        if durability != "buffered":
+            repo.put_message(payload)
     except Exception:
         # Fall back to in-memory for dev/local
         _append_history(thread_id, payload)
+    else:
+        # Keep participants' inbox ordering (thread_members activity index)
+        # fresh; written in the background, at most once per interval per thread
+        get_thread_activity().record(thread_id, payload["timestamp"], participants)
+
+    return {"status": "sent", "message": payload, "durability": durability}
+
+def _in_memory_page(
+    thread_id: str,
+    limit: Optional[int],
+    before: Optional[str],
+    after: Optional[str],
+    newest_first: bool,
+) -> List[dict]:
+    items = [
+        m
+        for m in _IN_MEMORY_HISTORY.get(thread_id, [])
+        if (not before or (m.get("timestamp") or "") < before)
+        and (not after or (m.get("timestamp") or "") > after)
+    ]
+    if newest_first:
+        items = list(reversed(items))
+    return items[:limit] if limit else items
+
+
+def _ndjson_lines(pages: Iterator[List[dict]]) -> Iterator[str]:
+    for page in pages:
+        for item in page:
+            yield json.dumps(item, default=str) + "\n"
+
+
+async def _read_auth_params(request: Request) -> Dict[str, str]:
+    body = await request.body()
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            data = json.loads(body or b"{}")
+        except json.JSONDecodeError:
+            raise HTTPException(status_code=400, detail="Invalid JSON payload")
+        return {k: str(v) for k, v in data.items()}
+    # pusher-js posts application/x-www-form-urlencoded
+    return {k: v[0] for k, v in parse_qs(body.decode("utf-8")).items()}
+
+
+@router.post("/chat/realtime/auth")
+async def authorize_realtime_channel(
+    request: Request,
+    caller: str = Depends(verify_firebase_token),
+    threads: ThreadRepo = Depends(get_thread_repo),
+):
+    """Sign a private-channel subscription for the caller's own thread/user channel."""
+    params = await _read_auth_params(request)
+    socket_id = params.get("socket_id")
+    channel_name = params.get("channel_name")
+    if not socket_id or not channel_name:
+        raise HTTPException(status_code=400, detail="socket_id and channel_name required")
+    target = parse_channel(channel_name)
+    if target is None:
+        raise HTTPException(status_code=403, detail="Unknown channel")
+
+    kind, ident = target
+    if not auth_disabled():
+        if not identity_verified():
+            # The any-token fallback would sign "Bearer alice" into alice's channels
+            raise HTTPException(status_code=403, detail="Private channels require a verified sign-in")
+        if kind == "user":
+            allowed = ident == caller
+        else:
+            try:
+                allowed = await run_in_threadpool(threads.is_participant, caller, ident)
+            except Exception as exc:
+                print(f"[chat] realtime auth membership lookup failed: {exc}")
+                allowed = False
+        if not allowed:
+            raise HTTPException(status_code=403, detail="Not a member of this channel")
+
+    try:
+        return get_pusher_client().authenticate(channel=channel_name, socket_id=socket_id)
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+
+
+@router.get("/chat/realtime/stats")
+def realtime_stats(token: str = Depends(verify_firebase_token)):
+    return get_realtime_dispatcher().stats()
 
-    return {"status": "sent", "message": payload}
 
 @router.get("/chat/history/{thread_id}")
-def get_history(thread_id: str, token: str = Depends(verify_firebase_token)):
+def get_history(
+    thread_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size; omit for the full thread"),
+    before: Optional[str] = Query(None, description="Only messages strictly older than this timestamp"),
+    after: Optional[str] = Query(None, description="Only messages strictly newer than this timestamp"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    order: Literal["asc", "desc"] = Query("asc", description="desc = newest first (inbox)"),
+    format: Literal["json", "ndjson"] = Query("json"),
+    token: str = Depends(verify_firebase_token),
+    repo: ChatRepo = Depends(get_chat_repo),
+):
+    try:
+        # Checked up front: the fallback below would otherwise hide a bad cursor
+        repo.start_key(thread_id, cursor)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    newest_first = order == "desc"
+    filters = {"before": before, "after": after, "newest_first": newest_first}
+
+    if format == "ndjson":
+        try:
+            pages = repo.iter_message_pages(thread_id, page_size=limit or 500, cursor=cursor, **filters)
+            first = next(pages, None)
+        except Exception:
+            fallback = _in_memory_page(thread_id, None, before, after, newest_first)
+            return StreamingResponse(_ndjson_lines(iter([fallback])), media_type="application/x-ndjson")
+
+        def _all_pages() -> Iterator[List[dict]]:
+            if first is not None:
+                yield first
+            yield from pages
+
+        return StreamingResponse(_ndjson_lines(_all_pages()), media_type="application/x-ndjson")
+
     try:
-        items = ChatRepo().list_messages(thread_id)
-        return {"thread_id": thread_id, "messages": items}
+        if limit or cursor:
+            items, next_cursor = repo.query_messages(thread_id, limit=limit, cursor=cursor, **filters)
+        else:
+            items = [m for page in repo.iter_message_pages(thread_id, **filters) for m in page]
+            next_cursor = None
+        return {"thread_id": thread_id, "messages": items, "next_cursor": next_cursor}
     except Exception:
-        return {"thread_id": thread_id, "messages": _IN_MEMORY_HISTORY.get(thread_id, [])}
+        items = _in_memory_page(thread_id, limit, before, after, newest_first)
+        return {"thread_id": thread_id, "messages": items, "next_cursor": None}
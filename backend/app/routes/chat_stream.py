@@ -1,20 +1,34 @@
+import asyncio
+import math
 import os, json
 import re
 from uuid import uuid4
 from typing import List, Dict, Any, Optional, Tuple
 
-from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
+from starlette.concurrency import run_in_threadpool
 
 from app.deps.auth import verify_firebase_token
+from app.deps.rate_limit import enforce_user_rate_limit
+from app.deps.stream_client import get_async_stream_client, get_stream_client
 from app.deps.stream_signing import verify_stream_signature
-from app.services.ai_service import get_ai_response
+from app.deps.repos import get_profile_repo
+from app.services.ai_service import get_ai_response, stream_ai_response
 from app.services.chatbot import (
     ensure_agent_user as bot_ensure_agent_user,
-    build_context,
+    aensure_agent_user as bot_aensure_agent_user,
     agent_reply,
     post_agent_message,
 )
+from app.services.agent_scheduler import PRIORITIES, AdmissionTimeout, agent_scheduler, priority_for, priority_hints
+from app.services.conversation_context import context_builder
+from app.services.idempotency import DUPLICATE, get_webhook_idempotency
+from app.services.stream_inbox import inbox_cache, summarize_channels
+from app.services.stream_provisioning import provisioning_cache, token_cache
+from app.services.webhook_queue import get_webhook_pool
+from app.utils.dependency_timing import track
 from app.services.incident_flow import (
     classify_issue,
     diy_suggestions,
@@ -26,9 +40,11 @@ from app.services.incident_flow import (
 
 try:
     from stream_chat import StreamChat
+    from stream_chat.async_chat import StreamChatAsync
     from stream_chat.base.exceptions import StreamAPIException
 except ImportError:  # pragma: no cover
     StreamChat = None  # type: ignore
+    StreamChatAsync = None  # type: ignore
     StreamAPIException = Exception  # type: ignore
 
 
@@ -54,6 +70,9 @@ AGENT_ROLE = os.getenv("STREAM_AGENT_ROLE", "admin")
 AGENT_PERSONA = os.getenv("STREAM_AGENT_PERSONA", "assistant")
 AUTOJOIN_AGENT = os.getenv("STREAM_AGENT_AUTOJOIN", "true").lower() not in {"false", "0", "no"}
 WEBHOOK_SECRET = os.getenv("STREAM_WEBHOOK_SECRET", "")
+WEBHOOK_ASYNC = os.getenv("STREAM_WEBHOOK_ASYNC", "true").lower() not in {"false", "0", "no"}
+INBOX_PAGE_SIZE = int(os.getenv("STREAM_INBOX_PAGE_SIZE", "30"))
+WEBHOOK_IDEMPOTENCY = os.getenv("STREAM_WEBHOOK_IDEMPOTENCY", "true").lower() not in {"false", "0", "no"}
 
 DISCOVERY_QUESTIONS = [
     {"key": "location", "prompt": "Where exactly is the leak or issue located?"},
@@ -77,32 +96,75 @@ def _channel_identifier(channel, channel_state: Dict[str, Any]) -> str:
 
 def _persist_discovery(channel, discovery: Dict[str, Any]) -> None:
     try:
-        channel.update({"discovery": discovery})
+        with track("stream", "channel.update"):
+            channel.update({"discovery": discovery})
     except (KeyError, StreamAPIException) as exc:  # pragma: no cover - logging only
         print(f"[stream] failed to persist discovery state: {exc}")
 
 
+def _discovery_texts(discovery: Dict[str, Any]) -> List[str]:
+    """What the channel reported so far; classifies the conversation's priority."""
+    if discovery.get("stage") not in {"questions", "diy"}:
+        return []
+    answers = [v for v in (discovery.get("answers") or {}).values() if isinstance(v, str)]
+    return [t for t in (discovery.get("summary"), *answers) if t]
+
+
 def _handle_discovery_message(
     client: "StreamChat",
     channel,
     channel_state: Dict[str, Any],
     message: Dict[str, Any],
     persona: Optional[str] = None,
+    reply_fn=agent_reply,
 ) -> None:
     channel_data = channel_state.get("channel", {}).get("data", {}) or {}
     discovery = channel_data.get("discovery") or {}
     lower_text = (message.get("text") or "").lower()
-    context = build_context(channel_state.get("messages", []))
     channel_id = _channel_identifier(channel, channel_state)
-
-    def ask_question(index: int, acknowledgement: Optional[str] = None):
+    context = context_builder.build(channel_id, channel_state.get("messages", []))
+    cid = message.get("cid")
+    # Gas/flood conversations are answered first when agent capacity is saturated
+    texts = _discovery_texts(discovery)
+    priority = priority_for(message.get("text"), *texts)
+    if cid:
+        priority_hints.remember(cid, texts)
+
+    def respond(
+        prompt: str,
+        reply_context: Optional[str],
+        *follow_ups: str,
+        offline: str,
+        advance: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        try:
+            with agent_scheduler.slot(priority, timeout=agent_scheduler.admission_timeout):
+                reply = reply_fn(prompt, reply_context, persona)
+                post_agent_message(client, channel_id, reply)
+                for text in follow_ups:
+                    post_agent_message(client, channel_id, text)
+        except AdmissionTimeout as exc:
+            # Agent capacity saturated: keep the conversation moving with the
+            # fixed wording instead of parking a webhook worker on the LLM
+            print(f"[stream] {exc}; answering {channel_id} offline")
+            for text in (offline, *follow_ups):
+                post_agent_message(client, channel_id, text)
+        # Discovery only advances once the reply went out: a failed LLM call
+        # or post is retried by the webhook queue from the same state
+        if advance is not None:
+            _persist_discovery(channel, advance)
+            if cid:
+                priority_hints.remember(cid, _discovery_texts(advance))
+
+    # Fixed-template prompts go out without the conversation so the agent's
+    # response cache can answer them; prompts with tenant details keep it
+    def ask_question(index: int, acknowledgement: Optional[str] = None, advance: Optional[Dict[str, Any]] = None):
         question = DISCOVERY_QUESTIONS[index]["prompt"]
         prompt = (
             f"You are assisting a tenant with a maintenance issue. "
             f"{acknowledgement or ''} Ask them: {question}. Keep it short and friendly."
         )
-        reply = agent_reply(prompt, context, persona)
-        post_agent_message(client, channel_id, reply)
+        respond(prompt, None, offline=question, advance=advance)
 
     if not discovery or discovery.get("stage") in {None, "complete"} or "start discovery" in lower_text:
         discovery = {
@@ -111,13 +173,12 @@ def _handle_discovery_message(
             "answers": {},
             "history": [],
         }
-        _persist_discovery(channel, discovery)
         prompt = (
             "A tenant requested help with a maintenance issue. "
             f"Let them know you'll gather a few details and ask the first question: {DISCOVERY_QUESTIONS[0]['prompt']}"
         )
-        reply = agent_reply(prompt, context, persona)
-        post_agent_message(client, channel_id, reply)
+        offline = f"I'll gather a few details about the issue. {DISCOVERY_QUESTIONS[0]['prompt']}"
+        respond(prompt, None, offline=offline, advance=discovery)
         return
 
     if discovery.get("stage") == "questions":
@@ -127,12 +188,11 @@ def _handle_discovery_message(
             discovery.setdefault("answers", {})[key] = message.get("text")
             discovery.setdefault("history", []).append({"key": key, "value": message.get("text")})
             discovery["question_index"] = idx + 1
-            _persist_discovery(channel, discovery)
         idx = discovery.get("question_index", 0)
         if idx < len(DISCOVERY_QUESTIONS):
             prev_key = DISCOVERY_QUESTIONS[idx - 1]["key"] if idx > 0 else None
             ack = f"Thank them for the info about {prev_key}." if prev_key else None
-            ask_question(idx, ack)
+            ask_question(idx, ack, advance=discovery)
         else:
             answers = discovery.get("answers", {})
             summary = "; ".join(f"{k}: {v}" for k, v in answers.items())
@@ -145,14 +205,16 @@ def _handle_discovery_message(
                 "severity": severity,
                 "urgency": urgency,
             }
-            _persist_discovery(channel, discovery)
             prompt = (
                 f"Summarize the tenant issue: {summary}. "
                 f"Provide DIY suggestions ({'; '.join(suggestions)}). "
                 "Ask them to reply 'Resolved' if it works or 'Not resolved' if it still needs help."
             )
-            reply = agent_reply(prompt, context, persona)
-            post_agent_message(client, channel_id, reply)
+            offline = (
+                f"Thanks, here is what I have: {summary}. You could try: {'; '.join(suggestions)}. "
+                "Reply 'Resolved' if that fixes it or 'Not resolved' if it still needs help."
+            )
+            respond(prompt, context, offline=offline, advance=discovery)
         return
 
     if discovery.get("stage") == "diy":
@@ -160,34 +222,33 @@ def _handle_discovery_message(
         if "resolve" in lowered and "not" not in lowered:
             discovery["stage"] = "complete"
             discovery["diy_result"] = "Resolved via DIY"
-            _persist_discovery(channel, discovery)
             prompt = (
                 "The tenant says the issue is resolved. Congratulate them, remind them to reach out if it recurs, "
                 "and close the conversation without escalating."
             )
-            reply = agent_reply(prompt, context, persona)
-            post_agent_message(client, channel_id, reply)
+            offline = "Glad it's resolved! Reach out here if it comes back."
+            respond(prompt, None, offline=offline, advance=discovery)
             return
 
         discovery["stage"] = "incident"
         discovery["diy_result"] = "Unresolved"
-        _persist_discovery(channel, discovery)
         classification = discovery.get("classification", {})
         summary = discovery.get("summary", message.get("text"))
         tenant_email = message.get("user", {}).get("id", "tenant")
-        incident = create_incident_record(
-            channel_id,
-            tenant_email,
-            {
-                "category": classification.get("category", "general"),
-                "severity": classification.get("severity", "medium"),
-                "urgency": classification.get("urgency", "routine"),
-                "summary": summary,
-                "diy_attempted": True,
-                "diy_result": "Unresolved",
-                "media": discovery.get("media", []),
-            },
-        )
+        incident_payload = {
+            "category": classification.get("category", "general"),
+            "severity": classification.get("severity", "medium"),
+            "urgency": classification.get("urgency", "routine"),
+            "summary": summary,
+            "diy_attempted": True,
+            "diy_result": "Unresolved",
+            "media": discovery.get("media", []),
+        }
+        if message.get("id"):
+            # Keyed by the triggering message, so a retried event rewrites the same incident
+            incident_payload["incident_id"] = f"INC-{message['id']}"
+        incident = create_incident_record(channel_id, tenant_email, incident_payload)
+        discovery["incident_id"] = incident["incident_id"]
         bids = generate_contractor_bids(classification.get("category", "general"))
         decision = threshold_decision(bids[0]["quote"])
         landlord_summary = summarize_for_landlord(incident)
@@ -197,24 +258,48 @@ def _handle_discovery_message(
             f"Explain that approval recommendation is '{decision}'. "
             "Let them know they'll receive updates about contractor scheduling."
         )
-        reply = agent_reply(prompt, context, persona)
-        post_agent_message(client, channel_id, reply)
         bids_text = "\n".join(f"- {b['name']}: ${b['quote']} ({b['eta']})" for b in bids)
-        post_agent_message(
-            client,
-            channel_id,
+        respond(
+            prompt,
+            context,
             f"Sample contractor options:\n{bids_text}\nWe'll finalize once the landlord approves.",
+            offline=(
+                f"Incident {incident['incident_id']} has been created and shared with your landlord. "
+                "You'll receive updates about contractor scheduling."
+            ),
+            advance=discovery,
         )
 
 
-def _get_stream_client() -> "StreamChat":
+def _stream_credentials() -> Tuple[str, str]:
     if StreamChat is None:
         raise HTTPException(status_code=500, detail="stream-chat SDK not installed on backend")
     api_key = os.getenv("STREAM_CHAT_API_KEY")
     api_secret = os.getenv("STREAM_CHAT_API_SECRET")
     if not api_key or not api_secret:
         raise HTTPException(status_code=501, detail="Stream Chat credentials not configured")
-    return StreamChat(api_key, api_secret)
+    return api_key, api_secret
+
+
+def _get_stream_client() -> "StreamChat":
+    return get_stream_client(*_stream_credentials())
+
+
+async def _get_async_stream_client() -> "StreamChatAsync":
+    return await get_async_stream_client(*_stream_credentials())
+
+
+async def _prefetch_channel_state(cid: str) -> Dict[str, Any]:
+    """Upsert the agent (if needed) and query the channel concurrently, off the threadpool."""
+    channel_type, channel_id = cid.split(":", 1)
+    client = await _get_async_stream_client()
+
+    async def query() -> Dict[str, Any]:
+        with track("stream", "channel.query"):
+            return dict(await client.channel(channel_type, channel_id).query(state=True, watch=False))
+
+    _, state = await asyncio.gather(bot_aensure_agent_user(client), query())
+    return state
 
 
 def _sanitize_members(members: List[str]) -> Tuple[List[str], Dict[str, Dict[str, str]]]:
@@ -254,42 +339,62 @@ def get_stream_token(user_id: str, persona: str, token: str = Depends(verify_fir
             "email": user_id,
             "persona": persona,
         }
-        client.upsert_user(user_payload)
+        fingerprint = (role, user_id, persona)
+        if not provisioning_cache.user_ready(sanitized_user_id, fingerprint):
+            with track("stream", "upsert_user"):
+                client.upsert_user(user_payload)
+            provisioning_cache.mark_user(sanitized_user_id, fingerprint)
 
         # Ensure channel exists and has member
         channel = client.channel("messaging", DEFAULT_CHANNEL_ID, {"name": "LandTen Conversations"})
-        try:
-            channel.create(user_id=sanitized_user_id)
-        except (KeyError, StreamAPIException) as exc:
-            # Likely already created; log and continue
-            print(f"[stream] channel.create skipped: {exc}")
+        channel_cid = f"messaging:{DEFAULT_CHANNEL_ID}"
+        created = False
+        if not provisioning_cache.channel_ready(channel_cid):
+            try:
+                with track("stream", "channel.create"):
+                    channel.create(user_id=sanitized_user_id)
+                provisioning_cache.mark_channel(channel_cid)
+                created = True
+            except (KeyError, StreamAPIException) as exc:
+                # Likely already created; log and continue
+                print(f"[stream] channel.create skipped: {exc}")
 
-        try:
-            channel.add_members(
-                [sanitized_user_id],
-                message={
-                    "text": f"{sanitized_user_id} joined",
-                    "user_id": sanitized_user_id,
-                },
-                hide_history=False,
-            )
-        except (KeyError, StreamAPIException) as exc:
-            print(f"[stream] add_members skipped for {sanitized_user_id}: {exc}")
+        if created or not provisioning_cache.member_ready(channel_cid, sanitized_user_id):
+            try:
+                with track("stream", "channel.add_members"):
+                    channel.add_members(
+                        [sanitized_user_id],
+                        message={
+                            "text": f"{sanitized_user_id} joined",
+                            "user_id": sanitized_user_id,
+                        },
+                        hide_history=False,
+                    )
+                provisioning_cache.mark_member(channel_cid, sanitized_user_id)
+            except (KeyError, StreamAPIException) as exc:
+                print(f"[stream] add_members skipped for {sanitized_user_id}: {exc}")
 
-        if AUTOJOIN_AGENT and AGENT_USER_ID:
+        if AUTOJOIN_AGENT and AGENT_USER_ID and (
+            created or not provisioning_cache.member_ready(channel_cid, AGENT_USER_ID)
+        ):
             try:
-                channel.add_members(
-                    [AGENT_USER_ID],
-                    message={
-                        "text": f"{AGENT_DISPLAY_NAME} is here to help.",
-                        "user_id": sanitized_user_id,
-                    },
-                    hide_history=False,
-                )
+                with track("stream", "channel.add_members"):
+                    channel.add_members(
+                        [AGENT_USER_ID],
+                        message={
+                            "text": f"{AGENT_DISPLAY_NAME} is here to help.",
+                            "user_id": sanitized_user_id,
+                        },
+                        hide_history=False,
+                    )
+                provisioning_cache.mark_member(channel_cid, AGENT_USER_ID)
             except (KeyError, StreamAPIException) as exc:
                 print(f"[stream] agent add_members skipped: {exc}")
 
-        token_value = client.create_token(sanitized_user_id)
+        # Minted locally (a signed JWT), but reused while still valid
+        token_value = token_cache.get_or_create(
+            sanitized_user_id, lambda uid, exp: client.create_token(uid, exp=exp)
+        )
 
         return {
             "api_key": api_key,
@@ -330,29 +435,36 @@ class AgentMessageRequest(BaseModel):
     requesting_user: Optional[str] = None
 
 
+async def _upsert_missing_users(client: "StreamChatAsync", users: List[Dict[str, Any]]) -> None:
+    """One ``upsert_users`` call for the users not already provisioned."""
+    fingerprints = {u["id"]: (u.get("email"), u.get("persona")) for u in users}
+    missing = [u for u in users if not provisioning_cache.user_ready(u["id"], fingerprints[u["id"]])]
+    if not missing:
+        return
+    try:
+        with track("stream", "upsert_users"):
+            await client.upsert_users(missing)
+    except (KeyError, StreamAPIException) as exc:
+        print(f"[stream] upsert_users failed for {[u['id'] for u in missing]}: {exc}")
+        return
+    for user in missing:
+        provisioning_cache.mark_user(user["id"], fingerprints[user["id"]])
+
+
 @router.post("/chat/stream/thread", response_model=StreamThread)
-def create_stream_thread(req: StreamThreadCreate, token: str = Depends(verify_firebase_token)):
+async def create_stream_thread(req: StreamThreadCreate, token: str = Depends(verify_firebase_token)):
     if not req.participants:
         raise HTTPException(status_code=400, detail="At least one participant is required")
 
-    client = _get_stream_client()
-    bot_ensure_agent_user(client)
+    client = await _get_async_stream_client()
 
     # Ensure creator is part of participants
     all_participants = list(dict.fromkeys([req.creator, *req.participants]))
     sanitized_members, member_meta = _sanitize_members(all_participants)
-
-    # Upsert all users so they exist in Stream
-    for original, sanitized_id in zip(all_participants, sanitized_members):
-        payload = {
-            "id": sanitized_id,
-            "email": original,
-            "persona": req.persona,
-        }
-        try:
-            client.upsert_user(payload)
-        except (KeyError, StreamAPIException) as exc:
-            print(f"[stream] upsert_user failed for {original}: {exc}")
+    users = [
+        {"id": sanitized_id, "email": original, "persona": req.persona}
+        for original, sanitized_id in zip(all_participants, sanitized_members)
+    ]
 
     if req.include_agent and AGENT_USER_ID:
         sanitized_members.append(AGENT_USER_ID)
@@ -366,123 +478,100 @@ def create_stream_thread(req: StreamThreadCreate, token: str = Depends(verify_fi
         for sid, meta in member_meta.items()
         if sid != AGENT_USER_ID and meta.get("display")
     )
+    creator_sanitized = _slugify(req.creator, allow_at=True) or sanitized_members[0]
     channel_data: Dict[str, Any] = {
         "name": name or "Conversation",
         "members_meta": member_meta,
+        "created_by": {"id": creator_sanitized},
     }
     if req.persona:
         channel_data["persona"] = req.persona
     if req.extra_data:
         channel_data.update(req.extra_data)
 
-    channel = client.channel("messaging", channel_id, channel_data)
-    creator_sanitized = _slugify(req.creator, allow_at=True) or sanitized_members[0]
+    # Users must exist before they can be members: one batch for the
+    # participants, alongside the (usually cached) agent upsert
+    await asyncio.gather(_upsert_missing_users(client, users), bot_aensure_agent_user(client))
 
+    # Get-or-create with the members in the same call; the returned state has
+    # the membership and newest message, so no follow-up query is needed
+    channel = client.channel("messaging", channel_id, {**channel_data, "members": sanitized_members})
+    print("[stream] creating channel:", channel_id, "with members:", sanitized_members)
     try:
-        print("[stream] creating channel:", channel_id, "with members:", sanitized_members)
-        members_payload = [{"user_id": mid} for mid in sanitized_members]
-        members_payload = json.loads(members_payload)
-        print("[stream] members payload:", members_payload)
-        channel.create(
-            user_id=creator_sanitized,
-            data={
-                "created_by": {creator_sanitized},
-                "name": name or "Conversation",
-                "members_meta": member_meta,
-                **({"persona": req.persona} if req.persona else {}),
-                **req.extra_data
-            },
-            members=members_payload,
-        )
+        with track("stream", "channel.query"):
+            state = await channel.query(watch=False, state=True, presence=False, messages={"limit": 1})
     except (KeyError, StreamAPIException) as exc:
-        print(f"[stream] channel.create skipped: {exc}")
-        if "already exists" not in str(exc).lower():
-            raise HTTPException(status_code=500, detail=f"Stream error creating channel: {exc}")
+        print(f"[stream] channel.create failed: {exc}")
+        raise HTTPException(status_code=500, detail=f"Stream error creating channel: {exc}")
 
-    try:
-        channel.add_members(
-            sanitized_members,
-            message={
-                "text": f"Conversation synced by {creator_sanitized}",
-                "user_id": creator_sanitized,
-            },
-            hide_history=False,
-        )
-    except (KeyError, StreamAPIException) as exc:
-        print(f"[stream] add_members during create skipped: {exc}")
-
-    last_message = None
-    try:
-        state = channel.query(watch=False, state=True)
-        messages = state.get("messages", [])
-        last_message = messages[-1] if messages else None
-    except (KeyError, StreamAPIException) as exc:
-        print(f"[stream] channel state fetch failed: {exc}")
+    # Members passed on create only apply to a new channel; sync an existing one
+    existing = {m.get("user_id") or (m.get("user") or {}).get("id") for m in state.get("members") or []}
+    missing_members = [mid for mid in sanitized_members if mid not in existing]
+    if missing_members:
+        try:
+            with track("stream", "channel.add_members"):
+                await channel.add_members(
+                    missing_members,
+                    message={
+                        "text": f"Conversation synced by {creator_sanitized}",
+                        "user_id": creator_sanitized,
+                    },
+                    hide_history=False,
+                )
+        except (KeyError, StreamAPIException) as exc:
+            print(f"[stream] add_members during create skipped: {exc}")
+    inbox_cache.invalidate_channel(f"messaging:{channel_id}", sanitized_members)
 
+    messages = state.get("messages") or []
     return StreamThread(
         channel_id=channel_id,
         name=channel_data.get("name"),
         members=list(member_meta.values()),
         unread_count=0,
-        last_message=last_message,
+        last_message=messages[-1] if messages else None,
     )
 
 
 @router.get("/chat/stream/threads/{user_id}", response_model=List[StreamThread])
-def list_stream_threads(user_id: str, token: str = Depends(verify_firebase_token)):
-    client = _get_stream_client()
+def list_stream_threads(
+    user_id: str,
+    limit: int = Query(INBOX_PAGE_SIZE, ge=1, le=30, description="Channels per page (Stream caps it at 30)"),
+    offset: int = Query(0, ge=0, le=1000),
+    token: str = Depends(verify_firebase_token),
+):
     sanitized_user = _slugify(user_id, allow_at=True)
     if not sanitized_user:
         raise HTTPException(status_code=400, detail="Invalid user id")
 
+    cached = inbox_cache.get(sanitized_user, limit, offset)
+    if cached is not None:
+        return cached
+
+    client = _get_stream_client()
     try:
-        channels = client.query_channels(
-            filters={"members": {"$in": [sanitized_user]}},
-            sort=[{"last_message_at": -1}],
-            state=True,
-            watch=False,
-        )
+        # One round trip: each channel comes back with its newest message and
+        # read state, so unread counts and last messages need no extra queries
+        with track("stream", "query_channels"):
+            response = client.query_channels(
+                {"members": {"$in": [sanitized_user]}},
+                [{"last_message_at": -1}],
+                user_id=sanitized_user,
+                state=True,
+                watch=False,
+                message_limit=1,
+                limit=limit,
+                offset=offset,
+            )
     except (KeyError, StreamAPIException) as exc:
         raise HTTPException(status_code=500, detail=f"Stream error listing threads: {exc}")
 
-    summaries: List[StreamThread] = []
-    for ch in channels:
-        cid = getattr(ch, "id", None) or getattr(ch, "channel_id", None)
-        if not cid:
-            continue
-        data = getattr(ch, "data", {}) or {}
-        members_meta = data.get("members_meta", {})
-        members_list = list(members_meta.values()) if isinstance(members_meta, dict) else []
-        last_message = None
-        try:
-            state_payload = ch.query(state=True, watch=False)
-            messages = state_payload.get("messages", [])
-            if messages:
-                last_message = messages[-1]
-        except (KeyError, StreamAPIException) as exc:  # pragma: no cover - logging only
-            print(f"[stream] channel state fetch during list failed: {exc}")
-        summaries.append(
-            StreamThread(
-                channel_id=cid,
-                name=data.get("name"),
-                members=members_list,
-                unread_count=getattr(ch, "unread_count", 0) or 0,
-                last_message=last_message,
-            )
-        )
-    return summaries
-
+    rows = summarize_channels(response, sanitized_user)
+    inbox_cache.put(sanitized_user, limit, offset, rows)
+    return rows
 
-@router.post("/chat/stream/agent_reply")
-def post_agent_reply(req: AgentMessageRequest, token: str = Depends(verify_firebase_token)):
-    if not req.channel_id:
-        raise HTTPException(status_code=400, detail="channel_id required")
-
-    client = _get_stream_client()
-    agent_id = bot_ensure_agent_user(client)
-    if not agent_id:
-        raise HTTPException(status_code=500, detail="Agent user not configured")
 
+def _agent_reply_inputs(req: AgentMessageRequest) -> Tuple[str, Optional[str], Optional[str]]:
+    """Validated prompt, assembled context and resolved persona for an agent reply."""
     prompt = req.prompt.strip()
     if not prompt:
         raise HTTPException(status_code=400, detail="prompt cannot be empty")
@@ -495,21 +584,179 @@ def post_agent_reply(req: AgentMessageRequest, token: str = Depends(verify_fireb
         context_lines.append(f"Request from {req.requesting_user}")
 
     context_text = "\n".join(context_lines) if context_lines else None
-    ai_response = get_ai_response(prompt, persona=req.persona, context=context_text)
+    persona = req.persona
+    if not persona and req.requesting_user:
+        # Served from the in-process profile cache on the hot path
+        try:
+            persona = get_profile_repo().get_persona(req.requesting_user)
+        except Exception as exc:
+            print(f"[stream] persona lookup failed for {req.requesting_user}: {exc}")
+    return prompt, context_text, persona
+
+
+@router.post("/chat/stream/agent_reply")
+def post_agent_reply(req: AgentMessageRequest, token: str = Depends(enforce_user_rate_limit)):
+    if not req.channel_id:
+        raise HTTPException(status_code=400, detail="channel_id required")
+
+    client = _get_stream_client()
+    agent_id = bot_ensure_agent_user(client)
+    if not agent_id:
+        raise HTTPException(status_code=500, detail="Agent user not configured")
 
-    channel = client.channel("messaging", req.channel_id)
+    prompt, context_text, persona = _agent_reply_inputs(req)
+    timeout = agent_scheduler.admission_timeout
     try:
-        channel.send_message(
-            {
-                "text": ai_response,
-                "type": "agent",
-            },
-            user_id=agent_id,
+        with agent_scheduler.slot(priority_for(prompt, req.context), timeout=timeout):
+            ai_response = get_ai_response(prompt, persona=persona, context=context_text)
+
+            channel = client.channel("messaging", req.channel_id)
+            try:
+                with track("stream", "send_message"):
+                    channel.send_message(
+                        {
+                            "text": ai_response,
+                            "type": "agent",
+                        },
+                        user_id=agent_id,
+                    )
+            except (KeyError, StreamAPIException) as exc:
+                raise HTTPException(status_code=500, detail=f"Stream error posting agent reply: {exc}")
+    except AdmissionTimeout:
+        raise HTTPException(
+            status_code=503, detail="Agent is busy, try again shortly", headers={"Retry-After": str(math.ceil(timeout))}
         )
-    except (KeyError, StreamAPIException) as exc:
-        raise HTTPException(status_code=500, detail=f"Stream error posting agent reply: {exc}")
 
     return {"status": "sent", "agent_id": agent_id, "message": ai_response}
+
+
+# Keeps reply tasks referenced until they finish (the loop holds only weak refs)
+_background_replies: "set[asyncio.Task]" = set()
+
+
+def _sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream_and_post(
+    client: "StreamChatAsync",
+    agent_id: str,
+    channel_id: str,
+    prompt: str,
+    context_text: Optional[str],
+    persona: Optional[str],
+    priority: str,
+    events: "asyncio.Queue[Optional[str]]",
+) -> None:
+    """Forward completion deltas to ``events``, then post the full reply once.
+
+    Runs as its own task, so the reply still reaches the channel when the
+    browser disconnects mid-stream. Admitted by ``agent_scheduler`` like the
+    blocking route. ``None`` on the queue ends the response.
+    """
+    timeout = agent_scheduler.admission_timeout
+    try:
+        async with agent_scheduler.aslot(priority, timeout=timeout):
+            await _generate_and_post(client, agent_id, channel_id, prompt, context_text, persona, events)
+    except AdmissionTimeout as exc:
+        print(f"[stream] {exc}; streamed agent reply for {channel_id} refused")
+        events.put_nowait(
+            _sse("error", {"detail": "Agent is busy, try again shortly", "retry_after": math.ceil(timeout)})
+        )
+    finally:
+        events.put_nowait(None)
+
+
+async def _generate_and_post(
+    client: "StreamChatAsync",
+    agent_id: str,
+    channel_id: str,
+    prompt: str,
+    context_text: Optional[str],
+    persona: Optional[str],
+    events: "asyncio.Queue[Optional[str]]",
+) -> None:
+    parts: List[str] = []
+    try:
+        async for delta in stream_ai_response(prompt, persona=persona, context=context_text):
+            parts.append(delta)
+            events.put_nowait(_sse("token", {"text": delta}))
+    except Exception as exc:
+        print(f"[stream] generating streamed agent reply failed for {channel_id}: {type(exc).__name__}: {exc}")
+        events.put_nowait(_sse("error", {"detail": "Agent reply generation failed", "message": "".join(parts)}))
+        return
+    text = "".join(parts).strip()
+    try:
+        with track("stream", "send_message"):
+            await client.channel("messaging", channel_id).send_message(
+                {"text": text, "type": "agent"}, user_id=agent_id
+            )
+    except Exception as exc:
+        # Timeouts and transport errors as well as Stream API errors: the
+        # client is waiting for a final event either way
+        print(f"[stream] posting streamed agent reply failed for {channel_id}: {type(exc).__name__}: {exc}")
+        events.put_nowait(_sse("error", {"detail": f"Stream error posting agent reply: {exc}", "message": text}))
+        return
+    events.put_nowait(_sse("done", {"status": "sent", "agent_id": agent_id, "message": text}))
+
+
+@router.post("/chat/stream/agent_reply/stream")
+async def stream_agent_reply(req: AgentMessageRequest, token: str = Depends(enforce_user_rate_limit)):
+    """Server-Sent Events variant of ``/chat/stream/agent_reply``.
+
+    Emits ``token`` events as the completion is generated and a final
+    ``done`` (or ``error``) event after the reply was posted to the channel.
+    When no agent slot frees within the admission timeout the only event is
+    an ``error`` carrying ``retry_after``.
+    """
+    if not req.channel_id:
+        raise HTTPException(status_code=400, detail="channel_id required")
+
+    client = await _get_async_stream_client()
+    agent_id = await bot_aensure_agent_user(client)
+    if not agent_id:
+        raise HTTPException(status_code=500, detail="Agent user not configured")
+    prompt, context_text, persona = await run_in_threadpool(_agent_reply_inputs, req)
+
+    events: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+    task = asyncio.create_task(
+        _stream_and_post(
+            client, agent_id, req.channel_id, prompt, context_text, persona, priority_for(prompt, req.context), events
+        )
+    )
+    _background_replies.add(task)
+    task.add_done_callback(_background_replies.discard)
+
+    async def body():
+        while True:
+            event = await events.get()
+            if event is None:
+                return
+            yield event
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _forget_provisioning(payload: Dict[str, Any], cid: Optional[str]) -> None:
+    """Drop cached provisioning that a Stream event says is no longer true."""
+    event_type = payload.get("type") or ""
+    user_id = (payload.get("user") or {}).get("id")
+    if event_type in {"user.deleted", "user.deactivated", "user.updated"} and user_id:
+        provisioning_cache.invalidate_user(user_id)
+        if event_type != "user.updated":
+            token_cache.invalidate(user_id)
+    elif event_type == "channel.deleted" and cid:
+        provisioning_cache.invalidate_channel(cid)
+    elif event_type == "member.removed" and cid:
+        member_id = (payload.get("member") or {}).get("user_id") or user_id
+        if member_id:
+            provisioning_cache.invalidate_member(cid, member_id)
+
+
 @router.post("/chat/stream/webhook")
 async def stream_webhook(request: Request):
     if not WEBHOOK_SECRET:
@@ -525,6 +772,15 @@ async def stream_webhook(request: Request):
     except json.JSONDecodeError:
         raise HTTPException(status_code=400, detail="Invalid JSON payload")
 
+    # Any channel event (including our own agent's messages) may change
+    # someone's inbox: last message, unread counts, membership
+    event_cid = payload.get("cid") or (payload.get("message") or {}).get("cid")
+    members = [m.get("user_id") or (m.get("user") or {}).get("id") for m in payload.get("members") or []]
+    inbox_cache.invalidate_channel(event_cid, [m for m in members if m])
+    if payload.get("user", {}).get("id"):
+        inbox_cache.invalidate_user(payload["user"]["id"])
+    _forget_provisioning(payload, event_cid)
+
     if payload.get("type") != "message.new":
         return {"status": "ignored"}
 
@@ -535,12 +791,58 @@ async def stream_webhook(request: Request):
     cid = message.get("cid")
     if not cid or ":" not in cid:
         return {"status": "ignored"}
-    channel_type, channel_id = cid.split(":", 1)
 
-    client = _get_stream_client()
-    bot_ensure_agent_user(client)
+    # Stream redelivers on timeout; a replay must not advance discovery,
+    # open another incident or post the agent reply twice
+    message_id = message.get("id") if WEBHOOK_IDEMPOTENCY else None
+    idempotency = get_webhook_idempotency()
+    if message_id:
+        if idempotency.seen_locally(message_id):
+            return {"status": "duplicate"}
+        if await run_in_threadpool(idempotency.claim, message_id) == DUPLICATE:
+            return {"status": "duplicate"}
+
+    try:
+        if not WEBHOOK_ASYNC:
+            channel_state = await _prefetch_channel_state(cid)
+            return await run_in_threadpool(process_webhook_event, payload, channel_state=channel_state)
+        # Acknowledge now; the channel query and LLM calls can take far longer
+        # than Stream waits before redelivering. Events of one channel are
+        # processed in order, different channels in parallel.
+        # Classified with the channel's discovery so far: "yes, basement"
+        # continuing a flooding report queues as an emergency
+        priority = priority_hints.priority_for(cid, message.get("text"))
+        queued = get_webhook_pool(process_webhook_event).submit(
+            cid, payload, dedupe_key=message.get("id"), priority=PRIORITIES.index(priority)
+        )
+    except Exception:
+        if message_id:
+            idempotency.release(message_id)
+        raise
+    return {"status": "queued" if queued else "duplicate"}
+
+
+def process_webhook_event(
+    payload: Dict[str, Any],
+    client: Optional["StreamChat"] = None,
+    reply_fn=agent_reply,
+    channel_state: Optional[Dict[str, Any]] = None,
+) -> Dict[str, str]:
+    """Run the discovery flow for one ``message.new`` webhook payload.
+
+    ``channel_state`` may be prefetched by the caller (see
+    :func:`_prefetch_channel_state`); otherwise the channel is queried here.
+    """
+    message = payload.get("message") or {}
+    channel_type, channel_id = message["cid"].split(":", 1)
+
+    if client is None:
+        client = _get_stream_client()
     channel = client.channel(channel_type, channel_id)
-    channel_state = channel.query(state=True, watch=False)
+    if channel_state is None:
+        bot_ensure_agent_user(client)
+        with track("stream", "channel.query"):
+            channel_state = channel.query(state=True, watch=False)
     channel_data = channel_state.get("channel", {}).get("data", {}) or {}
     persona = channel_data.get("persona")
     discovery = channel_data.get("discovery") or {}
@@ -555,5 +857,5 @@ async def stream_webhook(request: Request):
     if not should_handle:
         return {"status": "ignored"}
 
-    _handle_discovery_message(client, channel, channel_state, message, persona)
+    _handle_discovery_message(client, channel, channel_state, message, persona, reply_fn=reply_fn)
     return {"status": "ok"}
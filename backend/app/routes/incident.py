@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from typing import List, Optional
 from app.deps.auth import verify_firebase_token
 from app.repos.incident_repo import IncidentRepo
+from app.deps.repos import get_incident_repo
 from datetime import datetime, timezone
 
 router = APIRouter()
@@ -17,12 +18,16 @@ _IN_MEMORY_INCIDENTS: List[dict] = []
 
 
 @router.post("/incident/create")
-def create_incident(incident: Incident, token: str = Depends(verify_firebase_token)):
+def create_incident(
+    incident: Incident,
+    token: str = Depends(verify_firebase_token),
+    repo: IncidentRepo = Depends(get_incident_repo),
+):
     payload = incident.model_dump()
     if not payload.get("created_at"):
         payload["created_at"] = datetime.now(timezone.utc).isoformat()
     try:
-        IncidentRepo().log_incident(payload)
+        repo.log_incident(payload)
         return {"status": "created", "incident": payload}
     except Exception:
         _IN_MEMORY_INCIDENTS.append(payload)
@@ -34,9 +39,13 @@ def create_incident(incident: Incident, token: str = Depends(verify_firebase_tok
 
 
 @router.get("/incident/list/{tenant_id}")
-def list_incidents(tenant_id: str, token: str = Depends(verify_firebase_token)):
+def list_incidents(
+    tenant_id: str,
+    token: str = Depends(verify_firebase_token),
+    repo: IncidentRepo = Depends(get_incident_repo),
+):
     try:
-        items = IncidentRepo().list_incidents(tenant_id)
+        items = repo.list_incidents(tenant_id)
         return {"tenant_id": tenant_id, "incidents": items}
     except Exception:
         items = [i for i in _IN_MEMORY_INCIDENTS if i.get("tenant_id") == tenant_id]
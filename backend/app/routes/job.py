@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from typing import List, Optional
 from app.deps.auth import verify_firebase_token
 from app.repos.job_repo import JobRepo
+from app.deps.repos import get_job_repo
 from datetime import datetime, timezone
 
 router = APIRouter()
@@ -17,12 +18,16 @@ _IN_MEMORY_JOBS: List[dict] = []
 
 
 @router.post("/job/create")
-def create_job(job: Job, token: str = Depends(verify_firebase_token)):
+def create_job(
+    job: Job,
+    token: str = Depends(verify_firebase_token),
+    repo: JobRepo = Depends(get_job_repo),
+):
     payload = job.model_dump()
     if not payload.get("scheduled_time"):
         payload["scheduled_time"] = datetime.now(timezone.utc).isoformat()
     try:
-        JobRepo().create_job(payload)
+        repo.create_job(payload)
         return {"status": "created", "job": payload}
     except Exception:
         _IN_MEMORY_JOBS.append(payload)
@@ -34,9 +39,13 @@ def create_job(job: Job, token: str = Depends(verify_firebase_token)):
 
 
 @router.get("/job/list/{contractor_id}")
-def list_jobs(contractor_id: str, token: str = Depends(verify_firebase_token)):
+def list_jobs(
+    contractor_id: str,
+    token: str = Depends(verify_firebase_token),
+    repo: JobRepo = Depends(get_job_repo),
+):
     try:
-        items = JobRepo().list_jobs(contractor_id)
+        items = repo.list_jobs(contractor_id)
         return {"contractor_id": contractor_id, "jobs": items}
     except Exception:
         items = [j for j in _IN_MEMORY_JOBS if j.get("contractor_id") == contractor_id]
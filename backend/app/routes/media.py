@@ -1,12 +1,22 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from app.deps.auth import verify_firebase_token
 import os
+from functools import lru_cache
+
 import boto3
 
+from app.utils.dependency_timing import track
+
 
 router = APIRouter()
 
 
+@lru_cache(maxsize=1)
+def _s3_client():
+    # Building a client loads endpoint/credential config; reuse it across requests
+    return boto3.client("s3")
+
+
 @router.get("/media/upload_url")
 def get_upload_url(
     filename: str = Query(..., description="Original filename"),
@@ -17,14 +27,14 @@ def get_upload_url(
     if not bucket:
         raise HTTPException(status_code=501, detail="MEDIA_BUCKET env not configured")
 
-    s3 = boto3.client("s3")
     key = f"uploads/{filename}"
     try:
-        upload_url = s3.generate_presigned_url(
-            "put_object",
-            Params={"Bucket": bucket, "Key": key, "ContentType": content_type},
-            ExpiresIn=3600,
-        )
+        with track("s3", "generate_presigned_url"):
+            upload_url = _s3_client().generate_presigned_url(
+                "put_object",
+                Params={"Bucket": bucket, "Key": key, "ContentType": content_type},
+                ExpiresIn=3600,
+            )
         asset_url = f"https://{bucket}.s3.amazonaws.com/{key}"
         return {"upload_url": upload_url, "asset_url": asset_url}
     except Exception as exc:
@@ -0,0 +1,58 @@
+import hmac
+import os
+
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import PlainTextResponse
+
+from app.deps.auth import auth_stats
+from app.repos.profile_repo import profile_cache
+from app.services import ai_service, idempotency, realtime_dispatcher, thread_activity, webhook_queue, write_behind
+from app.services.agent_scheduler import agent_scheduler, priority_hints
+from app.services.conversation_context import context_builder
+from app.services.llm_gateway import llm_gateway
+from app.services.stream_inbox import inbox_cache
+from app.services.stream_provisioning import provisioning_cache, token_cache
+from app.utils.metrics import register_collector, render_prometheus
+
+router = APIRouter()
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+def _existing_stats(module, attr: str):
+    # Only report singletons that were actually created; a scrape must not start workers
+    def collect():
+        instance = getattr(module, attr)
+        return instance.stats() if instance is not None else {}
+    return collect
+
+
+register_collector("profile_cache", profile_cache.stats)
+register_collector("auth", auth_stats)
+register_collector("realtime_dispatcher", _existing_stats(realtime_dispatcher, "_dispatcher"))
+register_collector("chat_write_buffer", _existing_stats(write_behind, "_chat_buffer"))
+register_collector("thread_activity", _existing_stats(thread_activity, "_tracker"))
+register_collector("webhook_queue", _existing_stats(webhook_queue, "_pool"))
+register_collector("webhook_idempotency", _existing_stats(idempotency, "_store"))
+register_collector("stream_inbox", inbox_cache.stats)
+register_collector("stream_provisioning", provisioning_cache.stats)
+register_collector("stream_tokens", token_cache.stats)
+register_collector("agent_response_cache", _existing_stats(ai_service, "response_cache"))
+register_collector("agent_context", context_builder.stats)
+register_collector("llm_gateway", llm_gateway.stats)
+register_collector("agent_scheduler", agent_scheduler.stats)
+register_collector("agent_priority_hints", priority_hints.stats)
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics(request: Request):
+    # Scrapers usually cannot do Firebase auth; guard with a static token.
+    # Only a dev stage may serve the route internals without one.
+    expected = os.getenv("METRICS_TOKEN")
+    if not expected and os.getenv("STAGE", "dev") != "dev":
+        raise HTTPException(status_code=401, detail="METRICS_TOKEN not configured")
+    if expected:
+        supplied = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+        if not hmac.compare_digest(supplied, expected):
+            raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render_prometheus(), media_type=PROMETHEUS_CONTENT_TYPE)
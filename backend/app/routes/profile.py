@@ -2,7 +2,8 @@ from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Optional, Dict
 from app.deps.auth import verify_firebase_token
-from app.repos.profile_repo import ProfileRepo
+from app.repos.profile_repo import ProfileRepo, profile_cache
+from app.deps.repos import get_profile_repo
 
 
 router = APIRouter()
@@ -16,10 +17,19 @@ class ProfileUpdate(BaseModel):
     persona: str
 
 
+@router.get("/profile/cache/stats")
+def profile_cache_stats(token: str = Depends(verify_firebase_token)):
+    return profile_cache.stats()
+
+
 @router.get("/profile/{user_id}")
-def get_profile(user_id: str, token: str = Depends(verify_firebase_token)):
+def get_profile(
+    user_id: str,
+    token: str = Depends(verify_firebase_token),
+    repo: ProfileRepo = Depends(get_profile_repo),
+):
     try:
-        data = ProfileRepo().get_profile(user_id)
+        data = repo.get_profile(user_id)
         if data:
             return data
     except Exception:
@@ -28,10 +38,14 @@ def get_profile(user_id: str, token: str = Depends(verify_firebase_token)):
 
 
 @router.post("/profile")
-def upsert_profile(update: ProfileUpdate, token: str = Depends(verify_firebase_token)):
+def upsert_profile(
+    update: ProfileUpdate,
+    token: str = Depends(verify_firebase_token),
+    repo: ProfileRepo = Depends(get_profile_repo),
+):
     payload = update.model_dump()
     try:
-        ProfileRepo().upsert_profile(payload["user_id"], payload["persona"])
+        repo.upsert_profile(payload["user_id"], payload["persona"])
     except Exception:
         _IN_MEMORY_PROFILES[payload["user_id"]] = payload
         return {"status": "stored", "profile": payload, "warning": "Dynamo unavailable; stored in-memory"}
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
-from typing import List, Dict
+from typing import List, Dict, Optional
 from datetime import datetime, timezone
 from app.deps.auth import verify_firebase_token
 from app.repos.task_repo import TaskRepo
+from app.deps.repos import get_task_repo
+from app.repos.pagination import InvalidCursor, decode_cursor
 
 
 router = APIRouter()
@@ -28,32 +30,76 @@ class TaskStatusUpdate(BaseModel):
 
 
 @router.post("/task/create")
-def create_task(task: TaskCreate, token: str = Depends(verify_firebase_token)):
+def create_task(
+    task: TaskCreate,
+    token: str = Depends(verify_firebase_token),
+    repo: TaskRepo = Depends(get_task_repo),
+):
     payload = task.model_dump()
     payload["created_at"] = datetime.now(timezone.utc).isoformat()
     try:
-        created = TaskRepo().create_task(payload)
+        created = repo.create_task(payload)
         return {"status": "created", "task": created}
     except Exception:
         _IN_MEMORY_TASKS.append(payload)
         return {"status": "created", "task": payload, "warning": "Dynamo unavailable; stored in-memory"}
 
 
+def _in_memory_tasks(
+    persona: str,
+    status: Optional[str],
+    created_from: Optional[str],
+    created_to: Optional[str],
+) -> List[dict]:
+    items = [t for t in _IN_MEMORY_TASKS if t.get("persona") == persona or t.get("assigned_to") == persona]
+    if status:
+        items = [t for t in items if t.get("status") == status]
+    if created_from:
+        items = [t for t in items if (t.get("created_at") or "") >= created_from]
+    if created_to:
+        items = [t for t in items if (t.get("created_at") or "") <= created_to + "\uffff"]
+    return items
+
+
 @router.get("/task/list/{persona}")
-def list_tasks(persona: str, token: str = Depends(verify_firebase_token)):
+def list_tasks(
+    persona: str,
+    status: Optional[str] = Query(None, description="Only tasks in this status"),
+    created_from: Optional[str] = Query(None, description="ISO timestamp/date lower bound (inclusive)"),
+    created_to: Optional[str] = Query(None, description="ISO timestamp/date upper bound (inclusive)"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="Page size; omit for all tasks"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    token: str = Depends(verify_firebase_token),
+    repo: TaskRepo = Depends(get_task_repo),
+):
+    try:
+        decode_cursor(cursor)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
     try:
-        items = TaskRepo().list_tasks(persona)
-        return {"tasks": items}
+        items, next_cursor = repo.list_tasks(
+            persona,
+            status=status,
+            created_from=created_from,
+            created_to=created_to,
+            limit=limit,
+            cursor=cursor,
+        )
+        return {"tasks": items, "next_cursor": next_cursor}
     except Exception:
-        items = [t for t in _IN_MEMORY_TASKS if t.get("persona") == persona or t.get("assigned_to") == persona]
+        items = _in_memory_tasks(persona, status, created_from, created_to)
         return {"tasks": items, "warning": "Dynamo unavailable; returning in-memory tasks"}
 
 
 @router.post("/task/update_status")
-def update_task_status(update: TaskStatusUpdate, token: str = Depends(verify_firebase_token)):
+def update_task_status(
+    update: TaskStatusUpdate,
+    token: str = Depends(verify_firebase_token),
+    repo: TaskRepo = Depends(get_task_repo),
+):
     payload = update.model_dump()
     try:
-        TaskRepo().update_status(payload["task_id"], payload["status"])
+        repo.update_status(payload["task_id"], payload["status"])
     except Exception:
         for task in _IN_MEMORY_TASKS:
             if task.get("task_id") == payload["task_id"]:
@@ -1,9 +1,11 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from pydantic import BaseModel
-from typing import List
+from typing import List, Optional
 from datetime import datetime, timezone
 from app.deps.auth import verify_firebase_token
 from app.repos.thread_repo import ThreadRepo
+from app.deps.repos import get_thread_repo
+from app.repos.pagination import InvalidCursor
 
 
 router = APIRouter()
@@ -19,11 +21,15 @@ _IN_MEMORY_THREADS: List[dict] = []
 
 
 @router.post("/thread/create")
-def create_thread(thread: ThreadCreate, token: str = Depends(verify_firebase_token)):
+def create_thread(
+    thread: ThreadCreate,
+    token: str = Depends(verify_firebase_token),
+    repo: ThreadRepo = Depends(get_thread_repo),
+):
     payload = thread.model_dump()
     payload["created_at"] = datetime.now(timezone.utc).isoformat()
     try:
-        created = ThreadRepo().create_thread(payload)
+        created = repo.create_thread(payload)
         return {"status": "created", "thread": created}
     except Exception:
         _IN_MEMORY_THREADS.append(payload)
@@ -31,10 +37,24 @@ def create_thread(thread: ThreadCreate, token: str = Depends(verify_firebase_tok
 
 
 @router.get("/thread/list/{user_id}")
-def list_threads(user_id: str, token: str = Depends(verify_firebase_token)):
+def list_threads(
+    user_id: str,
+    limit: Optional[int] = Query(None, ge=1, le=200, description="Page size; omit for all threads"),
+    cursor: Optional[str] = Query(None, description="next_cursor from the previous page"),
+    token: str = Depends(verify_firebase_token),
+    repo: ThreadRepo = Depends(get_thread_repo),
+):
     try:
-        items = ThreadRepo().list_threads_for_user(user_id)
-        return {"threads": items}
+        # Checked up front: the fallback below would otherwise hide a bad cursor
+        repo.start_key(user_id, cursor)
+    except InvalidCursor as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    try:
+        if limit or cursor:
+            items, next_cursor = repo.query_threads_for_user(user_id, limit=limit, cursor=cursor)
+        else:
+            items, next_cursor = repo.list_threads_for_user(user_id), None
+        return {"threads": items, "next_cursor": next_cursor}
     except Exception:
         threads = [t for t in _IN_MEMORY_THREADS if user_id in t.get("participants", [])]
         return {"threads": threads, "warning": "Dynamo unavailable; returning in-memory threads"}
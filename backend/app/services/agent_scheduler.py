@@ -0,0 +1,174 @@
+"""Priority admission for agent work (LLM completion plus Stream post).
+
+Work is classified with ``incident_flow.classify_issue``: gas and flooding
+reports are ``emergency``, other immediate issues (leaks) ``urgent``,
+everything else ``routine``. At most ``max_concurrency`` units of agent work
+run at once; when a slot frees, the waiter with the best class goes next.
+A waiter gains one class per ``aging_seconds`` spent queued, so routine
+work is delayed under load but never starved. Callers wait at most
+``admission_timeout`` and then answer without the LLM.
+"""
+import itertools
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from app.services.incident_flow import classify_issue
+from app.utils.cache import TTLCache
+from app.utils.concurrency import acquire_in_thread
+
+EMERGENCY = "emergency"
+URGENT = "urgent"
+ROUTINE = "routine"
+PRIORITIES = (EMERGENCY, URGENT, ROUTINE)
+_RANK = {name: rank for rank, name in enumerate(PRIORITIES)}
+
+
+def priority_for(*texts: Optional[str]) -> str:
+    """Priority class of agent work about ``texts`` (message, discovery summary...)."""
+    _, severity, urgency = classify_issue(" ".join(t for t in texts if t))
+    if severity == "high" and urgency == "immediate":
+        return EMERGENCY
+    if urgency == "immediate":
+        return URGENT
+    return ROUTINE
+
+
+class ChannelPriorityHints:
+    """Recent discovery context (summary, answers) per channel.
+
+    A follow-up such as "yes, basement" says little on its own; classifying
+    it together with what the channel already reported queues it like the
+    rest of the conversation. Filled by the discovery handler, read when a
+    webhook event is enqueued (both in this process).
+    """
+
+    def __init__(self, maxsize: int = 10000, ttl: float = 3600.0):
+        self._texts = TTLCache(maxsize=maxsize, ttl=ttl, negative_ttl=None, name="agent_priority_hints")
+
+    def remember(self, channel_key: str, texts: List[str]) -> None:
+        # An empty context (discovery finished) forgets the channel
+        self._texts.set(channel_key, tuple(t for t in texts if t) or None)
+
+    def priority_for(self, channel_key: Optional[str], *texts: Optional[str]) -> str:
+        known = self._texts.get(channel_key, ()) if channel_key else ()
+        return priority_for(*texts, *known)
+
+    def stats(self) -> Dict[str, Any]:
+        return self._texts.stats()
+
+
+class AdmissionTimeout(RuntimeError):
+    """Raised when work waited longer than its ``timeout`` for a slot."""
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "enqueued", "admitted")
+
+    def __init__(self, priority: str, seq: int):
+        self.priority = priority
+        self.seq = seq
+        self.enqueued = time.monotonic()
+        self.admitted = False
+
+
+class AgentScheduler:
+    def __init__(self, max_concurrency: int = 4, aging_seconds: float = 10.0, admission_timeout: float = 15.0):
+        self.max_concurrency = max_concurrency
+        self.aging_seconds = aging_seconds
+        self.admission_timeout = admission_timeout
+        self._cond = threading.Condition()
+        self._waiters: List[_Waiter] = []
+        self._active = 0
+        self._seq = itertools.count()
+        self._stats: Dict[str, Dict[str, float]] = {name: self._empty_stats() for name in PRIORITIES}
+
+    @staticmethod
+    def _empty_stats() -> Dict[str, float]:
+        return {
+            "admitted": 0,
+            "waiting": 0,
+            "aged": 0,
+            "timeouts": 0,
+            "queue_wait_ms_total": 0.0,
+            "queue_wait_ms_max": 0.0,
+        }
+
+    def _effective_rank(self, waiter: _Waiter, now: float) -> float:
+        return _RANK[waiter.priority] - (now - waiter.enqueued) / self.aging_seconds
+
+    def _admit_locked(self) -> None:
+        now = time.monotonic()
+        while self._active < self.max_concurrency and self._waiters:
+            best = min(self._waiters, key=lambda w: (self._effective_rank(w, now), w.seq))
+            self._waiters.remove(best)
+            best.admitted = True
+            self._active += 1
+            stats = self._stats[best.priority]
+            waited_ms = (now - best.enqueued) * 1000
+            stats["waiting"] -= 1
+            stats["admitted"] += 1
+            stats["queue_wait_ms_total"] += waited_ms
+            stats["queue_wait_ms_max"] = max(stats["queue_wait_ms_max"], waited_ms)
+            if any(_RANK[w.priority] < _RANK[best.priority] for w in self._waiters):
+                stats["aged"] += 1  # overtook a better class thanks to aging
+        self._cond.notify_all()
+
+    def _acquire(self, priority: str, timeout: Optional[float]) -> None:
+        waiter = _Waiter(priority if priority in _RANK else ROUTINE, next(self._seq))
+        deadline = None if timeout is None else waiter.enqueued + timeout
+        with self._cond:
+            self._waiters.append(waiter)
+            self._stats[waiter.priority]["waiting"] += 1
+            self._admit_locked()
+            while not waiter.admitted:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    self._waiters.remove(waiter)
+                    self._stats[waiter.priority]["waiting"] -= 1
+                    self._stats[waiter.priority]["timeouts"] += 1
+                    raise AdmissionTimeout(f"{waiter.priority} agent work waited {timeout:g}s for a slot")
+                self._cond.wait(remaining)
+
+    def _release(self) -> None:
+        with self._cond:
+            self._active -= 1
+            self._admit_locked()
+
+    @contextmanager
+    def slot(self, priority: str = ROUTINE, timeout: Optional[float] = None) -> Iterator[None]:
+        """Hold one unit of agent concurrency for the block, admitted by priority."""
+        self._acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self._release()
+
+    @asynccontextmanager
+    async def aslot(self, priority: str = ROUTINE, timeout: Optional[float] = None) -> AsyncIterator[None]:
+        """:meth:`slot` for coroutines; the wait happens in a worker thread, not on the event loop."""
+        await acquire_in_thread(lambda: self._acquire(priority, timeout), self._release)
+        try:
+            yield
+        finally:
+            self._release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats: Dict[str, Any] = {name: dict(values) for name, values in self._stats.items()}
+            stats["active"] = self._active
+        stats["max_concurrency"] = self.max_concurrency
+        for name in PRIORITIES:
+            stats[name]["queue_wait_ms_total"] = round(stats[name]["queue_wait_ms_total"], 1)
+            stats[name]["queue_wait_ms_max"] = round(stats[name]["queue_wait_ms_max"], 1)
+        return stats
+
+
+agent_scheduler = AgentScheduler(
+    max_concurrency=int(os.getenv("AGENT_MAX_CONCURRENCY", "4")),
+    aging_seconds=float(os.getenv("AGENT_PRIORITY_AGING", "10")),
+    admission_timeout=float(os.getenv("AGENT_ADMISSION_TIMEOUT", "15")),
+)
+priority_hints = ChannelPriorityHints()
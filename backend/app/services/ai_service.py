@@ -1,13 +1,25 @@
+import hashlib
+import json
 import os
-from typing import Optional
+import sqlite3
+import threading
+import time
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.services.llm_gateway import llm_gateway
+from app.utils.cache import TTLCache
+from app.utils.dependency_timing import dependency_stats, track
 
 try:  # pragma: no cover - optional dependency
-    from openai import OpenAI
+    from openai import AsyncOpenAI, OpenAI
 except ImportError:  # pragma: no cover
+    AsyncOpenAI = None  # type: ignore
     OpenAI = None  # type: ignore
 
 
 _openai_client: Optional["OpenAI"] = None
+_async_openai_client: Optional["AsyncOpenAI"] = None
 
 
 def _get_openai_client() -> Optional["OpenAI"]:
@@ -17,13 +29,23 @@ def _get_openai_client() -> Optional["OpenAI"]:
     api_key = os.getenv("OPENAI_API_KEY")
     if OpenAI is None or not api_key:
         return None
-    _openai_client = OpenAI(api_key=api_key)
+    # The gateway owns deadlines and retries (hedging); no SDK-level retries
+    _openai_client = OpenAI(api_key=api_key, timeout=llm_gateway.deadline, max_retries=0)
     return _openai_client
 
 
-def get_ai_response(message: str, persona: Optional[str] = None, context: Optional[str] = None) -> str:
-    """Return an agent response using OpenAI when configured, else lightweight fallback."""
+def _get_async_openai_client() -> Optional["AsyncOpenAI"]:
+    global _async_openai_client
+    if _async_openai_client is not None:
+        return _async_openai_client
+    api_key = os.getenv("OPENAI_API_KEY")
+    if AsyncOpenAI is None or not api_key:
+        return None
+    _async_openai_client = AsyncOpenAI(api_key=api_key, timeout=llm_gateway.deadline, max_retries=0)
+    return _async_openai_client
+
 
+def _system_prompt(persona: Optional[str], context: Optional[str]) -> str:
     system_prompt = os.getenv(
         "AGENT_SYSTEM_PROMPT",
         "You are LandTen's helpful assistant. Provide concise, actionable guidance for property management scenarios.",
@@ -32,24 +54,249 @@ def get_ai_response(message: str, persona: Optional[str] = None, context: Option
         system_prompt += f" You are currently supporting the {persona} persona."
     if context:
         system_prompt += f" Context: {context}."
+    return system_prompt
+
+
+def _completion_args(message: str, persona: Optional[str], context: Optional[str]) -> dict:
+    return {
+        "model": os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+        "messages": [
+            {"role": "system", "content": _system_prompt(persona, context)},
+            {"role": "user", "content": message},
+        ],
+        "temperature": float(os.getenv("OPENAI_TEMPERATURE", "0.2")),
+    }
+
+
+def _normalize(value: Any) -> str:
+    return " ".join(str(value).split()) if value is not None else ""
+
+
+def prompt_cache_key(system_prompt: str, persona: Optional[str], model: str, temperature: float, message: str) -> str:
+    """Hash of the inputs that determine a completion; whitespace differences do not matter."""
+    parts = [_normalize(system_prompt), _normalize(persona), model, f"{temperature:g}", _normalize(message)]
+    return hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """Completed agent responses by prompt key: in-memory LRU/TTL plus an optional SQLite tier.
+
+    Each entry keeps the latency of the completion it replaced, so stats
+    report the time saved by hits as well as hit rates. The disk tier
+    survives restarts (and Lambda cold starts when the path is on a
+    persistent mount); memory misses fall through to it.
+    """
+
+    def __init__(self, maxsize: int = 2048, ttl: float = 86_400.0, path: Optional[str] = None):
+        self.ttl = ttl
+        self._memory = TTLCache(maxsize=maxsize, ttl=ttl, negative_ttl=None, name="agent_responses")
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "saved_ms": 0.0}
+        self._conn: Optional[sqlite3.Connection] = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, text TEXT NOT NULL,"
+                " latency_ms REAL NOT NULL, expires_at REAL NOT NULL)"
+            )
+            self._conn.execute("DELETE FROM responses WHERE expires_at < ?", (time.time(),))
+
+    def get(self, key: str) -> Optional[str]:
+        entry: Optional[Tuple[str, float]] = self._memory.get(key)
+        tier = "memory_hits"
+        if entry is None and self._conn is not None:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT text, latency_ms, expires_at FROM responses WHERE key = ?", (key,)
+                ).fetchone()
+            if row is not None and row[2] > time.time():
+                entry = (row[0], row[1])
+                tier = "disk_hits"
+                self._memory.set(key, entry, ttl=row[2] - time.time())
+        with self._lock:
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats[tier] += 1
+            self._stats["saved_ms"] += entry[1]
+        return entry[0]
+
+    def put(self, key: str, text: str, latency_ms: float) -> None:
+        self._memory.set(key, (text, latency_ms))
+        with self._lock:
+            self._stats["stores"] += 1
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO responses (key, text, latency_ms, expires_at) VALUES (?, ?, ?, ?)",
+                    (key, text, latency_ms, time.time() + self.ttl),
+                )
+
+    def clear(self) -> None:
+        self._memory.clear()
+        with self._lock:
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM responses")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 4) if lookups else 0.0
+        stats["saved_ms"] = round(stats["saved_ms"], 1)
+        stats["size"] = len(self._memory)
+        return stats
+
+
+response_cache: Optional[ResponseCache] = None
+if os.getenv("AGENT_RESPONSE_CACHE", "true").lower() not in {"false", "0", "no"}:
+    response_cache = ResponseCache(
+        maxsize=int(os.getenv("AGENT_RESPONSE_CACHE_SIZE", "2048")),
+        ttl=float(os.getenv("AGENT_RESPONSE_CACHE_TTL", "86400")),
+        path=os.getenv("AGENT_RESPONSE_CACHE_PATH") or None,
+    )
+
+
+def _cache_key(args: Dict[str, Any], persona: Optional[str]) -> str:
+    system_prompt = args["messages"][0]["content"]
+    return prompt_cache_key(system_prompt, persona, args["model"], args["temperature"], args["messages"][1]["content"])
+
+
+class StreamInterrupted(RuntimeError):
+    """A streamed completion failed after some of it was already yielded."""
 
+
+def _fallback_response(message: str) -> str:
+    return f"(Agent offline) {message[::-1]}"
+
+
+def get_ai_response(
+    message: str,
+    persona: Optional[str] = None,
+    context: Optional[str] = None,
+    cacheable: Optional[bool] = None,
+) -> str:
+    """Return an agent response using OpenAI when configured, else lightweight fallback.
+
+    Context-free prompts (templates) are answered from :data:`response_cache`
+    when possible; pass ``cacheable`` to override that choice.
+    Upstream calls go through :data:`llm_gateway` (deadline, concurrency
+    limit, circuit breaker, hedging); identical prompts in flight at the
+    same time share one call.
+    """
     client = _get_openai_client()
     if client:
-        model = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+        args = _completion_args(message, persona, context)
+        use_cache = response_cache is not None and (context is None if cacheable is None else cacheable)
+        key = _cache_key(args, persona) if use_cache else None
+        if key is not None:
+            cached = response_cache.get(key)
+            if cached is not None:
+                return cached
+
+        def complete():
+            with track("openai", "chat.completions"):
+                return client.chat.completions.create(**args)
+
         try:
-            completion = client.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": message},
-                ],
-                temperature=float(os.getenv("OPENAI_TEMPERATURE", "0.2")),
-            )
+            start = time.perf_counter()
+            completion = llm_gateway.call(complete, key=key or _cache_key(args, persona))
             content = completion.choices[0].message.content if completion.choices else None
             if content:
+                if key is not None:
+                    response_cache.put(key, content.strip(), (time.perf_counter() - start) * 1000)
                 return content.strip()
         except Exception as exc:  # pragma: no cover - best effort logging
             print(f"[agent] OpenAI error: {exc}")
 
     # Fallback when OpenAI not configured or errors out
-    return f"(Agent offline) {message[::-1]}"
+    return _fallback_response(message)
+
+
+def summarize_conversation(previous: str, lines: List[str], max_tokens: int) -> Optional[str]:
+    """Fold ``lines`` into the running summary ``previous``; None when OpenAI is unavailable."""
+    client = _get_openai_client()
+    if client is None:
+        return None
+    transcript = "\n".join(lines)
+
+    def complete():
+        with track("openai", "chat.completions.summary"):
+            return client.chat.completions.create(
+                model=os.getenv("OPENAI_SUMMARY_MODEL") or os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
+                messages=[
+                    {
+                        "role": "system",
+                        "content": (
+                            "You maintain a running summary of a property maintenance chat. Merge the new messages "
+                            "into the summary. Keep facts the assistant needs later (issue, location, severity, "
+                            f"answers given, decisions). Plain text, at most {int(max_tokens * 0.75)} words."
+                        ),
+                    },
+                    {"role": "user", "content": f"Summary so far:\n{previous or '(none)'}\n\nNew messages:\n{transcript}"},
+                ],
+                temperature=0,
+                max_tokens=max_tokens,
+            )
+
+    try:
+        completion = llm_gateway.call(complete)
+        content = completion.choices[0].message.content if completion.choices else None
+        return content.strip() if content else None
+    except Exception as exc:  # pragma: no cover - best effort logging
+        print(f"[agent] OpenAI summary error: {exc}")
+        return None
+
+
+async def stream_ai_response(
+    message: str,
+    persona: Optional[str] = None,
+    context: Optional[str] = None,
+    cacheable: Optional[bool] = None,
+) -> AsyncIterator[str]:
+    """Yield the agent response as text deltas while the completion is generated.
+
+    Same prompt, cache and fallback as :func:`get_ai_response`; a cached
+    response is yielded in one piece. Time to the first token is recorded
+    as ``openai.chat.completions.first_token``. An error before any token
+    yields the fallback; an error mid-stream raises :class:`StreamInterrupted`,
+    so callers never mistake a truncated reply for a complete one.
+    """
+    client = _get_async_openai_client()
+    if client is None:
+        yield _fallback_response(message)
+        return
+
+    args = _completion_args(message, persona, context)
+    use_cache = response_cache is not None and (context is None if cacheable is None else cacheable)
+    key = _cache_key(args, persona) if use_cache else None
+    if key is not None:
+        cached = response_cache.get(key)
+        if cached is not None:
+            yield cached
+            return
+
+    # Same slot, breaker and deadline as the blocking path, held for the whole stream
+    start = time.perf_counter()
+    parts = []
+    try:
+        with track("openai", "chat.completions.stream"):
+            chunks = llm_gateway.astream(lambda: client.chat.completions.create(stream=True, **args))
+            async with aclosing(chunks):
+                async for chunk in chunks:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if not delta:
+                        continue
+                    if not parts:
+                        elapsed_ms = (time.perf_counter() - start) * 1000
+                        dependency_stats.record(("openai", "chat.completions.first_token"), elapsed_ms)
+                    parts.append(delta)
+                    yield delta
+    except Exception as exc:
+        print(f"[agent] OpenAI streaming error: {exc}")
+        if parts:
+            raise StreamInterrupted(str(exc)) from exc
+        yield _fallback_response(message)
+        return
+    if key is not None and parts:
+        response_cache.put(key, "".join(parts).strip(), (time.perf_counter() - start) * 1000)
@@ -1,7 +1,10 @@
+import math
 import os
 from typing import List, Dict, Any, Optional
 
 from app.services.ai_service import get_ai_response
+from app.services.stream_provisioning import provisioning_cache
+from app.utils.dependency_timing import track
 
 try:  # pragma: no cover
     from stream_chat import StreamChat
@@ -16,19 +19,46 @@ AGENT_ROLE = os.getenv("STREAM_AGENT_ROLE", "agent")
 AGENT_PERSONA = os.getenv("STREAM_AGENT_PERSONA", "assistant")
 
 
-def ensure_agent_user(client: "StreamChat") -> Optional[str]:
-    if StreamChat is None:
-        return None
-    if not AGENT_USER_ID:
-        return None
-    payload = {
+def _agent_payload() -> Dict[str, Any]:
+    return {
         "id": AGENT_USER_ID,
         "role": AGENT_ROLE,
         "name": AGENT_DISPLAY_NAME,
         "persona": AGENT_PERSONA,
     }
+
+
+def ensure_agent_user(client: "StreamChat") -> Optional[str]:
+    """Upsert the agent user once per process (again only if Stream reports it changed)."""
+    if StreamChat is None:
+        return None
+    if not AGENT_USER_ID:
+        return None
+    payload = _agent_payload()
+    fingerprint = tuple(sorted(payload.items()))
+    if provisioning_cache.user_ready(AGENT_USER_ID, fingerprint):
+        return AGENT_USER_ID
+    try:
+        with track("stream", "upsert_user"):
+            client.upsert_user(payload)
+        provisioning_cache.mark_user(AGENT_USER_ID, fingerprint, ttl=math.inf)
+    except (KeyError, StreamAPIException) as exc:  # pragma: no cover - logging only
+        print(f"[stream-bot] failed to upsert agent user: {exc}")
+    return AGENT_USER_ID
+
+
+async def aensure_agent_user(client: "StreamChatAsync") -> Optional[str]:
+    """:func:`ensure_agent_user` for the async Stream client."""
+    if not AGENT_USER_ID:
+        return None
+    payload = _agent_payload()
+    fingerprint = tuple(sorted(payload.items()))
+    if provisioning_cache.user_ready(AGENT_USER_ID, fingerprint):
+        return AGENT_USER_ID
     try:
-        client.upsert_user(payload)
+        with track("stream", "upsert_user"):
+            await client.upsert_user(payload)
+        provisioning_cache.mark_user(AGENT_USER_ID, fingerprint, ttl=math.inf)
     except (KeyError, StreamAPIException) as exc:  # pragma: no cover - logging only
         print(f"[stream-bot] failed to upsert agent user: {exc}")
     return AGENT_USER_ID
@@ -47,11 +77,9 @@ def build_context(messages: List[Dict[str, Any]], limit: int = 10) -> str:
 
 
 def agent_reply(prompt: str, context: Optional[str], persona: Optional[str]) -> str:
-    if context:
-        combined = f"Context:\n{context}\n\nUser:\n{prompt}"
-    else:
-        combined = prompt
-    return get_ai_response(combined, persona=persona, context=context)
+    # The context goes into the system prompt only; repeating it in the user
+    # message would send the whole history twice
+    return get_ai_response(prompt, persona=persona, context=context)
 
 
 def post_agent_message(client: "StreamChat", channel_id: str, text: str, msg_type: str = "agent") -> None:
@@ -59,4 +87,5 @@ def post_agent_message(client: "StreamChat", channel_id: str, text: str, msg_typ
         raise RuntimeError("stream-chat SDK not installed")
     ensure_agent_user(client)
     channel = client.channel("messaging", channel_id)
-    channel.send_message({"text": text, "type": msg_type}, user_id=AGENT_USER_ID)
+    with track("stream", "send_message"):
+        channel.send_message({"text": text, "type": msg_type}, user_id=AGENT_USER_ID)
@@ -0,0 +1,161 @@
+"""Token-budgeted conversation context with a rolling summary per channel.
+
+Each agent call gets the channel's summary of older messages plus as many of
+the newest messages as fit the budget. Messages that fall out of the recent
+window are folded into the summary once: appended as short extracts while
+the summary has room, and compressed by the LLM (when configured) once it is
+full. The prompt stays bounded however long the conversation runs, and no
+message is sent twice in one prompt.
+"""
+import os
+import threading
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.services.ai_service import summarize_conversation
+from app.utils.cache import TTLCache
+
+try:  # pragma: no cover - optional dependency
+    import tiktoken
+
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:  # pragma: no cover - ImportError, or no network for the BPE file
+    _ENCODING = None
+
+
+def estimate_tokens(text: str) -> int:
+    """Tokens in ``text`` (tiktoken when installed, else ~4 characters per token)."""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+
+def _line(message: Dict[str, Any]) -> Optional[str]:
+    if message.get("type") in {"system", "deleted"}:
+        return None
+    user = message.get("user", {})
+    speaker = user.get("name") or user.get("id") or message.get("user_id", "unknown")
+    text = " ".join((message.get("text") or message.get("message") or "").split())
+    return f"{speaker}: {text}" if text else None
+
+
+def _extract(previous: str, lines: List[str], max_tokens: int) -> str:
+    """Fallback summary: previous summary plus clipped lines, oldest dropped first."""
+    clipped = [line if len(line) <= 160 else line[:157] + "..." for line in lines]
+    parts = ([previous] if previous else []) + clipped
+    while len(parts) > 1 and estimate_tokens("\n".join(parts)) > max_tokens:
+        parts.pop(0)
+    return "\n".join(parts)
+
+
+SummarizeFn = Callable[[str, List[str], int], Optional[str]]
+
+
+class ContextBuilder:
+    """Builds ``summary + recent messages`` context for a channel within a token budget.
+
+    ``budget_tokens`` caps the whole context; the summary is held to
+    ``summary_tokens``, so the summarizer only runs when the summary fills
+    up rather than on every message.
+    """
+
+    def __init__(
+        self,
+        budget_tokens: int = 800,
+        summary_tokens: int = 250,
+        summarize: Optional[SummarizeFn] = None,
+        maxsize: int = 5000,
+        ttl: float = 7 * 86_400.0,
+    ):
+        self.budget_tokens = budget_tokens
+        self.summary_tokens = summary_tokens
+        self.summarize = summarize
+        # channel -> (summary, created_at of the newest summarized message)
+        self._summaries = TTLCache(maxsize=maxsize, ttl=ttl, negative_ttl=None, name="conversation_summaries")
+        self._lock = threading.Lock()
+        self._stats = {"builds": 0, "folds": 0, "llm_folds": 0, "context_tokens": 0, "raw_tokens": 0}
+
+    def build(self, channel_id: str, messages: List[Dict[str, Any]]) -> str:
+        summary, through = self._summaries.get(channel_id) or ("", "")
+        entries: List[Tuple[str, str]] = []  # (created_at, line)
+        for message in messages:
+            created_at = message.get("created_at") or ""
+            if through and created_at and created_at <= through:
+                continue  # already in the summary
+            line = _line(message)
+            if line and (not entries or entries[-1][1] != line):  # drop repeated sends
+                entries.append((created_at, line))
+
+        recent = self._fit(entries, self.budget_tokens - estimate_tokens(summary))
+        if len(recent) < len(entries):
+            # Folding grows the summary up to its cap: leave room for that
+            recent = self._fit(entries, self.budget_tokens - max(self.summary_tokens, estimate_tokens(summary)))
+        overflow = entries[: len(entries) - len(recent)]
+
+        if overflow:
+            summary = self._fold(channel_id, summary, [line for _, line in overflow], overflow[-1][0])
+
+        parts = []
+        if summary:
+            parts.append(f"Summary of earlier conversation:\n{summary}")
+        if recent:
+            parts.append("Recent messages:\n" + "\n".join(line for _, line in recent))
+        context = "\n\n".join(parts)
+        with self._lock:
+            self._stats["builds"] += 1
+            self._stats["context_tokens"] += estimate_tokens(context)
+            self._stats["raw_tokens"] += sum(estimate_tokens(_line(m) or "") for m in messages)
+        return context
+
+    @staticmethod
+    def _fit(entries: List[Tuple[str, str]], remaining: int) -> List[Tuple[str, str]]:
+        """Newest entries that fit ``remaining`` tokens (at least one), oldest first."""
+        recent: List[Tuple[str, str]] = []
+        for entry in reversed(entries):
+            cost = estimate_tokens(entry[1]) + 1
+            if cost > remaining and recent:
+                break
+            recent.append(entry)
+            remaining -= cost
+        recent.reverse()
+        return recent
+
+    def _fold(self, channel_id: str, summary: str, lines: List[str], through: str) -> str:
+        folded = None
+        appended = _extract(summary, lines, self.summary_tokens * 10)
+        if estimate_tokens(appended) <= self.summary_tokens:
+            folded = appended
+        elif self.summarize is not None:
+            try:
+                # Aim well under the cap so the next few folds are cheap appends
+                folded = self.summarize(summary, lines, self.summary_tokens // 2)
+            except Exception as exc:  # pragma: no cover - logging only
+                print(f"[context] summarizing {channel_id} failed: {exc}")
+        with self._lock:
+            self._stats["folds"] += 1
+            self._stats["llm_folds"] += 1 if folded and folded is not appended else 0
+        if not folded:
+            folded = _extract(summary, lines, self.summary_tokens)
+        if through:
+            # Without timestamps the folded messages cannot be told apart later
+            self._summaries.set(channel_id, (folded, through))
+        return folded
+
+    def forget(self, channel_id: str) -> None:
+        self._summaries.invalidate(channel_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+        stats["channels"] = len(self._summaries)
+        if stats["raw_tokens"]:
+            stats["token_ratio"] = round(stats["context_tokens"] / stats["raw_tokens"], 4)
+        return stats
+
+
+context_builder = ContextBuilder(
+    budget_tokens=int(os.getenv("AGENT_CONTEXT_TOKENS", "800")),
+    summary_tokens=int(os.getenv("AGENT_SUMMARY_TOKENS", "250")),
+    summarize=summarize_conversation,
+)
@@ -0,0 +1,88 @@
+import os
+import threading
+from typing import Callable, Dict, Optional
+
+from app.deps.repos import get_idempotency_repo
+from app.repos.idempotency_repo import IdempotencyRepo
+from app.utils.cache import TTLCache
+
+FRESH = "fresh"
+DUPLICATE = "duplicate"
+
+
+class IdempotencyStore:
+    """Has this event been handled? An in-process LRU in front of DynamoDB.
+
+    ``seen_locally`` is a dict lookup and answers most redeliveries (Stream
+    retries to the instance that timed out, usually within seconds).
+    ``claim`` falls through to a conditional put in DynamoDB so other
+    instances agree. If DynamoDB is unavailable the event is treated as
+    fresh: processing twice beats dropping a tenant's message.
+    """
+
+    def __init__(self, get_repo: Callable[[], IdempotencyRepo], ttl_seconds: int = 86400, cache_size: int = 50_000):
+        self._get_repo = get_repo
+        self.ttl_seconds = ttl_seconds
+        self._seen = TTLCache(maxsize=cache_size, ttl=ttl_seconds, negative_ttl=None, name="idempotency")
+        self._lock = threading.Lock()
+        self._stats = {"fresh": 0, "duplicates_local": 0, "duplicates_remote": 0, "store_errors": 0, "released": 0}
+
+    def _count(self, key: str) -> None:
+        with self._lock:
+            self._stats[key] += 1
+
+    def seen_locally(self, event_key: str) -> bool:
+        found, _ = self._seen.lookup(event_key)
+        if found:
+            self._count("duplicates_local")
+        return found
+
+    def claim(self, event_key: str) -> str:
+        """Return ``fresh`` if the caller should process the event, else ``duplicate``."""
+        if self.seen_locally(event_key):
+            return DUPLICATE
+        try:
+            owned = self._get_repo().claim(event_key, self.ttl_seconds)
+        except Exception as exc:
+            self._count("store_errors")
+            print(f"[idempotency] store unavailable, processing {event_key}: {exc}")
+            owned = True
+        self._seen.set(event_key, True)
+        if not owned:
+            self._count("duplicates_remote")
+            return DUPLICATE
+        self._count("fresh")
+        return FRESH
+
+    def release(self, event_key: str) -> None:
+        """Forget a claim whose processing failed, so a redelivery is handled."""
+        self._seen.invalidate(event_key)
+        self._count("released")
+        try:
+            self._get_repo().release(event_key)
+        except Exception as exc:  # pragma: no cover - logging only
+            print(f"[idempotency] failed to release {event_key}: {exc}")
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["retries_absorbed"] = stats["duplicates_local"] + stats["duplicates_remote"]
+        stats["cached_keys"] = len(self._seen)
+        return stats
+
+
+_store: Optional[IdempotencyStore] = None
+_store_lock = threading.Lock()
+
+
+def get_webhook_idempotency() -> IdempotencyStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = IdempotencyStore(
+                    get_idempotency_repo,
+                    ttl_seconds=int(os.getenv("WEBHOOK_IDEMPOTENCY_TTL", "86400")),
+                    cache_size=int(os.getenv("WEBHOOK_IDEMPOTENCY_CACHE_SIZE", "50000")),
+                )
+    return _store
@@ -2,7 +2,7 @@ import os
 from datetime import datetime, timezone
 from typing import Dict, Any, Tuple, List
 
-from app.repos.incident_repo import IncidentRepo
+from app.deps.repos import get_incident_repo
 from app.services.chatbot import agent_reply
 
 
@@ -42,7 +42,7 @@ def diy_suggestions(category: str) -> List[str]:
 
 
 def create_incident_record(thread_id: str, tenant_email: str, payload: Dict[str, Any]) -> Dict[str, Any]:
-    repo = IncidentRepo()
+    repo = get_incident_repo()
     now = datetime.now(timezone.utc).isoformat()
     item = {
         "incident_id": payload.get("incident_id") or f"INC-{int(datetime.now().timestamp())}",
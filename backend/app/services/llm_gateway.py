@@ -0,0 +1,336 @@
+"""Guard rails around upstream LLM calls.
+
+``LLMGateway.call`` runs a completion with a per-call deadline, a bounded
+number of concurrent upstream calls (callers wait at most ``queue_timeout``
+for a slot), a circuit breaker that fails fast while OpenAI is down, optional
+hedging (a second attempt when the first is slow) and single-flight
+coalescing of identical in-flight prompts. Any refusal or failure raises
+:class:`LLMUnavailable`; callers answer with their offline fallback.
+
+A slot is held by the upstream call itself, not by the caller waiting on
+it: a call abandoned at the deadline (or beaten by its hedge) keeps its
+slot until it actually returns, so upstream never sees more than
+``max_concurrency`` calls at once. ``LLMGateway.astream`` applies the same
+slot, breaker and deadline to streamed completions.
+"""
+import asyncio
+import contextvars
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, Optional, TypeVar
+
+from app.utils.concurrency import acquire_in_thread
+
+T = TypeVar("T")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+_STATE_CODES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class LLMUnavailable(RuntimeError):
+    """The gateway refused or gave up on a call (breaker open, busy, timeout, upstream error)."""
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures.
+
+    While open, calls are refused for ``reset_timeout`` seconds; then one
+    probe is let through (half-open). Its success closes the breaker, its
+    failure opens it again.
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._stats = {"opened": 0, "rejected": 0}
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def allow(self) -> bool:
+        with self._lock:
+            if self._state == OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self._state = HALF_OPEN
+                self._probing = False
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self._stats["rejected"] += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def release_probe(self) -> None:
+        """Give back a half-open probe that never reached upstream."""
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != OPEN:
+                    self._stats["opened"] += 1
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probing = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["state"] = _STATE_CODES[self._state]
+            stats["open"] = self._state == OPEN
+            stats["consecutive_failures"] = self._failures
+        return stats
+
+
+class LLMGateway:
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        queue_timeout: float = 2.0,
+        deadline: float = 20.0,
+        hedge_after: Optional[float] = None,
+        breaker: Optional[CircuitBreaker] = None,
+    ):
+        self.max_concurrency = max_concurrency
+        self.queue_timeout = queue_timeout
+        self.deadline = deadline
+        self.hedge_after = hedge_after
+        self.breaker = breaker or CircuitBreaker()
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._stats = {
+            "calls": 0,
+            "coalesced": 0,
+            "failures": 0,
+            "timeouts": 0,
+            "queue_timeouts": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "waiting": 0,
+            "active": 0,
+            "queue_wait_ms_total": 0.0,
+            "queue_wait_ms_max": 0.0,
+        }
+
+    def _count(self, key: str, amount: float = 1) -> None:
+        with self._lock:
+            self._stats[key] += amount
+
+    def call(self, fn: Callable[[], T], key: Optional[Hashable] = None) -> T:
+        """Run ``fn`` (a blocking upstream call) under the gateway's limits.
+
+        Concurrent calls with the same ``key`` share the first caller's
+        upstream call and result.
+        """
+        if key is None:
+            return self._execute(fn)
+        with self._lock:
+            flight = self._inflight.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[key] = Future()
+        if not leader:
+            self._count("coalesced")
+            try:
+                return flight.result(timeout=self.queue_timeout + self.deadline)
+            except FutureTimeoutError:
+                raise LLMUnavailable("timed out waiting for a coalesced call")
+        try:
+            result = self._execute(fn)
+        except BaseException as exc:
+            flight.set_exception(exc if isinstance(exc, LLMUnavailable) else LLMUnavailable(str(exc)))
+            raise
+        else:
+            flight.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def acquire(self) -> None:
+        """Admit one upstream call: breaker check, then a slot within ``queue_timeout``.
+
+        Raises :class:`LLMUnavailable` when refused; pair with :meth:`release`.
+        """
+        if not self.breaker.allow():
+            raise LLMUnavailable("circuit open")
+        queued_at = time.monotonic()
+        self._count("waiting")
+        acquired = self._slots.acquire(timeout=self.queue_timeout)
+        waited_ms = (time.monotonic() - queued_at) * 1000
+        with self._lock:
+            self._stats["waiting"] -= 1
+            self._stats["queue_wait_ms_total"] += waited_ms
+            self._stats["queue_wait_ms_max"] = max(self._stats["queue_wait_ms_max"], waited_ms)
+            if acquired:
+                self._stats["calls"] += 1
+                self._stats["active"] += 1
+        if not acquired:
+            self._count("queue_timeouts")
+            # Our own backlog says nothing about upstream health
+            self.breaker.release_probe()
+            raise LLMUnavailable("too many concurrent LLM calls")
+
+    def release(self) -> None:
+        self._release_slot()
+
+    def _execute(self, fn: Callable[[], T]) -> T:
+        self.acquire()
+        try:
+            result = self._attempt(fn)
+        except Exception as exc:
+            self._count("failures")
+            self.breaker.record_failure()
+            if isinstance(exc, LLMUnavailable):
+                raise
+            raise LLMUnavailable(f"{type(exc).__name__}: {exc}") from exc
+        self.breaker.record_success()
+        return result
+
+    def _release_slot(self, _future: Optional[Future] = None) -> None:
+        self._count("active", -1)
+        self._slots.release()
+
+    def _pool(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    # Every running call holds a slot, so more workers would only idle
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.max_concurrency, thread_name_prefix="llm-gateway"
+                    )
+        return self._executor
+
+    def _submit(self, fn: Callable[[], T]) -> Future:
+        """Start ``fn`` on an already acquired slot; the slot is freed when ``fn`` returns."""
+        try:
+            # Carry the request's contextvars (dependency timing) into the worker
+            future = self._pool().submit(contextvars.copy_context().run, fn)
+        except BaseException:
+            self._release_slot()
+            raise
+        future.add_done_callback(self._release_slot)
+        return future
+
+    def _attempt(self, fn: Callable[[], T]) -> T:
+        first = self._submit(fn)
+        pending = {first}
+        hedged = False
+        wait_for = self.hedge_after if self.hedge_after else self.deadline
+        deadline = time.monotonic() + self.deadline
+        error: Optional[BaseException] = None
+        while pending:
+            timeout = max(0.0, min(wait_for, deadline - time.monotonic()))
+            done, pending = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is not first:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+            if not done and not hedged and self.hedge_after and time.monotonic() < deadline:
+                # The first attempt is slow: race a second one if a slot is free
+                hedged = True
+                if self._slots.acquire(blocking=False):
+                    with self._lock:
+                        self._stats["hedges"] += 1
+                        self._stats["active"] += 1
+                    pending.add(self._submit(fn))
+                wait_for = self.deadline
+                continue
+            if not done and time.monotonic() >= deadline:
+                self._count("timeouts")
+                raise LLMUnavailable(f"no LLM response within {self.deadline:g}s")
+        assert error is not None
+        raise error
+
+    async def astream(self, open_stream: Callable[[], Awaitable[AsyncIterator[T]]]) -> AsyncIterator[T]:
+        """Yield the items of a streamed upstream call under the gateway's limits.
+
+        The slot is held until the stream ends (waiting for it does not block
+        the event loop) and ``deadline`` bounds the whole stream, not each
+        read. Refusals and failures raise :class:`LLMUnavailable`.
+        """
+        await acquire_in_thread(self.acquire, self.release)
+        deadline = time.monotonic() + self.deadline
+        received = False
+        healthy: Optional[bool] = None
+        try:
+            stream = await asyncio.wait_for(open_stream(), max(0.0, deadline - time.monotonic()))
+            items = stream.__aiter__()
+            while True:
+                try:
+                    item = await asyncio.wait_for(items.__anext__(), max(0.0, deadline - time.monotonic()))
+                except StopAsyncIteration:
+                    break
+                received = True
+                yield item
+            healthy = True
+        except asyncio.TimeoutError:
+            healthy = False
+            self._count("timeouts")
+            raise LLMUnavailable(f"no complete LLM response within {self.deadline:g}s")
+        except Exception as exc:
+            healthy = False
+            raise LLMUnavailable(f"{type(exc).__name__}: {exc}") from exc
+        finally:
+            if healthy is None and received:
+                healthy = True  # the consumer stopped reading a working stream
+            if healthy is None:
+                # Gone before upstream answered: says nothing about its health
+                self.breaker.release_probe()
+            elif healthy:
+                self.breaker.record_success()
+            else:
+                self._count("failures")
+                self.breaker.record_failure()
+            self.release()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["inflight_keys"] = len(self._inflight)
+        stats["max_concurrency"] = self.max_concurrency
+        stats["queue_wait_ms_total"] = round(stats["queue_wait_ms_total"], 1)
+        stats["queue_wait_ms_max"] = round(stats["queue_wait_ms_max"], 1)
+        stats["breaker"] = self.breaker.stats()
+        return stats
+
+
+def _float_env(name: str, default: str) -> Optional[float]:
+    value = float(os.getenv(name, default))
+    return value if value > 0 else None
+
+
+llm_gateway = LLMGateway(
+    max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", "8")),
+    queue_timeout=float(os.getenv("LLM_QUEUE_TIMEOUT", "2")),
+    deadline=float(os.getenv("LLM_TIMEOUT", "20")),
+    hedge_after=_float_env("LLM_HEDGE_AFTER", "0"),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.getenv("LLM_BREAKER_FAILURES", "5")),
+        reset_timeout=float(os.getenv("LLM_BREAKER_RESET", "30")),
+    ),
+)
@@ -0,0 +1,51 @@
+import base64
+import re
+from typing import Optional, Tuple
+
+# Pusher private channels: clients must be authorized (see /chat/realtime/auth)
+# before subscribing, so a client only receives traffic for its own threads.
+THREAD_PREFIX = "private-thread-"
+USER_PREFIX = "private-user-"
+_ENCODED = "b64."
+_VALID = re.compile(r"^[-a-zA-Z0-9_=@,.;]+$")
+MAX_CHANNEL_LENGTH = 164
+
+
+def _encode(value: str) -> str:
+    # Ids Pusher would reject (or that look encoded) are base64url'd so the
+    # channel name can always be mapped back to the exact id.
+    if _VALID.match(value) and not value.startswith(_ENCODED):
+        return value
+    return _ENCODED + base64.urlsafe_b64encode(value.encode("utf-8")).decode("ascii")
+
+
+def _decode(value: str) -> str:
+    if value.startswith(_ENCODED):
+        return base64.urlsafe_b64decode(value[len(_ENCODED):].encode("ascii")).decode("utf-8")
+    return value
+
+
+def _channel(prefix: str, value: str) -> str:
+    name = prefix + _encode(value)
+    if len(name) > MAX_CHANNEL_LENGTH:
+        raise ValueError(f"Channel name too long for id {value!r}")
+    return name
+
+
+def thread_channel(thread_id: str) -> str:
+    return _channel(THREAD_PREFIX, thread_id)
+
+
+def user_channel(user_id: str) -> str:
+    return _channel(USER_PREFIX, user_id)
+
+
+def parse_channel(name: str) -> Optional[Tuple[str, str]]:
+    """Return ``("thread", thread_id)`` / ``("user", user_id)``, or None if unknown."""
+    for kind, prefix in (("thread", THREAD_PREFIX), ("user", USER_PREFIX)):
+        if name.startswith(prefix):
+            try:
+                return kind, _decode(name[len(prefix):])
+            except (ValueError, UnicodeError):
+                return None
+    return None
@@ -0,0 +1,170 @@
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.deps.pusher_client import get_pusher_client
+from app.utils.dependency_timing import dependency_stats, track
+from app.utils.lifecycle import on_flush
+
+PUSHER_BATCH_MAX = 10  # Pusher /batch_events accepts at most 10 events per call
+
+
+class RealtimeDispatcher:
+    """Publish realtime events from a worker thread via ``trigger_batch``.
+
+    ``publish`` never waits on the push API: events go onto a bounded queue
+    (blocking for at most ``enqueue_timeout`` when it is full, then dropping)
+    and the worker coalesces them into batches of up to ``max_batch``. Failed
+    batches are retried with full-jitter exponential backoff.
+    """
+
+    def __init__(
+        self,
+        get_client: Callable[[], Any],
+        max_queue: int = 5000,
+        max_batch: int = PUSHER_BATCH_MAX,
+        linger: float = 0.01,
+        enqueue_timeout: float = 0.05,
+        max_retries: int = 3,
+        base_backoff: float = 0.1,
+        name: str = "realtime-dispatch",
+    ):
+        self._get_client = get_client
+        self.max_batch = min(max_batch, PUSHER_BATCH_MAX)
+        self.linger = linger
+        self.enqueue_timeout = enqueue_timeout
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.name = name
+        self._queue: "queue.Queue[tuple]" = queue.Queue(maxsize=max_queue)
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats = {"published": 0, "sent": 0, "batches": 0, "retries": 0, "failed": 0, "dropped": 0}
+        self._last_lag_ms = 0.0
+        self._max_lag_ms = 0.0
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def publish(self, channel: str, event: str, data: Dict[str, Any]) -> bool:
+        """Queue one event; False if it was dropped because the queue stayed full."""
+        self._ensure_worker()
+        with self._idle:
+            self._pending += 1
+        try:
+            self._queue.put((channel, event, data, time.monotonic()), timeout=self.enqueue_timeout)
+        except queue.Full:
+            with self._idle:
+                self._stats["dropped"] += 1
+            self._done(1)
+            print(f"[{self.name}] queue full; dropped {event} on {channel}")
+            return False
+        with self._idle:
+            self._stats["published"] += 1
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        oldest_lag_ms = 0.0
+        with self._queue.mutex:
+            if self._queue.queue:
+                oldest_lag_ms = (time.monotonic() - self._queue.queue[0][3]) * 1000
+        return {
+            **self._stats,
+            "queue_depth": self._queue.qsize(),
+            "oldest_queued_ms": round(oldest_lag_ms, 2),
+            "last_lag_ms": round(self._last_lag_ms, 2),
+            "max_lag_ms": round(self._max_lag_ms, 2),
+        }
+
+    def _done(self, count: int) -> None:
+        with self._idle:
+            self._pending -= count
+            if not self._pending:
+                self._idle.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        # Past the linger window: only take what is already queued
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self._send(batch)
+            finally:
+                self._done(len(batch))
+
+    def _send(self, batch: List[tuple]) -> None:
+        events = [{"channel": channel, "name": event, "data": data} for channel, event, data, _ in batch]
+        attempt = 0
+        while True:
+            try:
+                with track("pusher", "trigger_batch"):
+                    self._get_client().trigger_batch(events)
+                break
+            except ValueError as exc:
+                # Payload/channel validation errors will not succeed on retry
+                self._stats["failed"] += len(events)
+                print(f"[{self.name}] rejected batch: {exc}")
+                return
+            except Exception as exc:
+                attempt += 1
+                if attempt > self.max_retries:
+                    self._stats["failed"] += len(events)
+                    print(f"[{self.name}] giving up on {len(events)} events: {exc}")
+                    return
+                self._stats["retries"] += 1
+                dependency_stats.record_retry(("pusher", "trigger_batch"))
+                time.sleep(random.uniform(0, self.base_backoff * (2 ** (attempt - 1))))
+        now = time.monotonic()
+        lag_ms = (now - batch[0][3]) * 1000
+        self._last_lag_ms = lag_ms
+        self._max_lag_ms = max(self._max_lag_ms, lag_ms)
+        self._stats["sent"] += len(events)
+        self._stats["batches"] += 1
+
+
+_dispatcher: Optional[RealtimeDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_realtime_dispatcher() -> RealtimeDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = RealtimeDispatcher(
+                    get_client=get_pusher_client,
+                    max_queue=int(os.getenv("REALTIME_MAX_QUEUE", "5000")),
+                    linger=float(os.getenv("REALTIME_LINGER_MS", "10")) / 1000,
+                    enqueue_timeout=float(os.getenv("REALTIME_ENQUEUE_TIMEOUT_MS", "50")) / 1000,
+                )
+                on_flush(_dispatcher.flush)
+    return _dispatcher
@@ -0,0 +1,96 @@
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from app.utils.cache import TTLCache
+
+
+def summarize_channels(response: Dict[str, Any], user_id: str) -> List[Dict[str, Any]]:
+    """Inbox rows from one ``query_channels`` response (no per-channel queries).
+
+    Each entry already carries the newest ``message_limit`` messages and the
+    per-member ``read`` state, which has this user's unread count.
+    """
+    rows: List[Dict[str, Any]] = []
+    for entry in response.get("channels", []) or []:
+        channel = entry.get("channel") or {}
+        cid = channel.get("id")
+        if not cid:
+            continue
+        members_meta = channel.get("members_meta", {})
+        messages = entry.get("messages") or []
+        unread = 0
+        for read in entry.get("read") or []:
+            if (read.get("user") or {}).get("id") == user_id:
+                unread = int(read.get("unread_messages") or 0)
+                break
+        rows.append(
+            {
+                "channel_id": cid,
+                "name": channel.get("name"),
+                "members": list(members_meta.values()) if isinstance(members_meta, dict) else [],
+                "unread_count": unread,
+                "last_message": messages[-1] if messages else None,
+                "cid": channel.get("cid"),
+            }
+        )
+    return rows
+
+
+class InboxCache:
+    """Short-TTL cache of inbox pages per user, invalidated by webhook events.
+
+    Keys are ``(user_id, limit, offset)``. A reverse index from channel cid
+    to the users whose cached pages contain it lets an event on a channel
+    drop exactly the affected inboxes, even when the webhook payload does
+    not list the members.
+    """
+
+    def __init__(self, ttl: float = 15.0, maxsize: int = 10_000):
+        self._pages = TTLCache(maxsize=maxsize, ttl=ttl, negative_ttl=None, name="stream_inbox")
+        self._lock = threading.Lock()
+        self._page_keys: Dict[str, Set[tuple]] = {}  # user -> cached page keys
+        self._channel_users: Dict[str, Set[str]] = {}  # cid -> users with it cached
+        self._max_tracked = maxsize * 4
+
+    def get(self, user_id: str, limit: int, offset: int) -> Optional[List[Dict[str, Any]]]:
+        return self._pages.get((user_id, limit, offset))
+
+    def put(self, user_id: str, limit: int, offset: int, rows: List[Dict[str, Any]]) -> None:
+        key = (user_id, limit, offset)
+        self._pages.set(key, rows)
+        with self._lock:
+            if len(self._channel_users) > self._max_tracked:
+                # Index entries outlive expired pages; start over rather than grow
+                self._channel_users.clear()
+                self._page_keys.clear()
+            self._page_keys.setdefault(user_id, set()).add(key)
+            for row in rows:
+                if row.get("cid"):
+                    self._channel_users.setdefault(row["cid"], set()).add(user_id)
+
+    def invalidate_user(self, user_id: str) -> None:
+        with self._lock:
+            keys = self._page_keys.pop(user_id, set())
+        for key in keys:
+            self._pages.invalidate(key)
+
+    def invalidate_channel(self, cid: Optional[str], members: Iterable[str] = ()) -> None:
+        """Drop the inboxes of everyone known to have ``cid`` cached, plus ``members``."""
+        with self._lock:
+            users = set(self._channel_users.pop(cid, set())) if cid else set()
+        users.update(members)
+        for user_id in users:
+            self.invalidate_user(user_id)
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self._pages.stats()
+        with self._lock:
+            stats["tracked_channels"] = len(self._channel_users)
+        return stats
+
+
+inbox_cache = InboxCache(
+    ttl=float(os.getenv("STREAM_INBOX_CACHE_TTL", "15")),
+    maxsize=int(os.getenv("STREAM_INBOX_CACHE_SIZE", "10000")),
+)
@@ -0,0 +1,112 @@
+import os
+import time
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from app.utils.cache import TTLCache
+
+
+class ProvisioningCache:
+    """Remembers which Stream users, channels and memberships are already set up.
+
+    Users are stored with a fingerprint of the upserted fields, so a changed
+    role or persona is upserted again. Entries expire after ``ttl`` seconds,
+    which bounds how long a change made outside this process (a user deleted
+    in the Stream dashboard) can go unnoticed. The webhook invalidates them
+    sooner when Stream reports such a change.
+    """
+
+    def __init__(self, ttl: float = 3600.0, maxsize: int = 50_000):
+        self._entries = TTLCache(maxsize=maxsize, ttl=ttl, negative_ttl=None, name="stream_provisioning")
+
+    def _is_set(self, key: Hashable, value: Any = True) -> bool:
+        found, cached = self._entries.lookup(key)
+        return found and cached == value
+
+    def user_ready(self, user_id: str, fingerprint: Any) -> bool:
+        return self._is_set(("user", user_id), fingerprint)
+
+    def mark_user(self, user_id: str, fingerprint: Any, ttl: Optional[float] = None) -> None:
+        self._entries.set(("user", user_id), fingerprint, ttl=ttl)
+
+    def channel_ready(self, cid: str) -> bool:
+        return self._is_set(("channel", cid))
+
+    def mark_channel(self, cid: str) -> None:
+        self._entries.set(("channel", cid), True)
+
+    def member_ready(self, cid: str, user_id: str) -> bool:
+        return self._is_set(("member", cid, user_id))
+
+    def mark_member(self, cid: str, user_id: str) -> None:
+        self._entries.set(("member", cid, user_id), True)
+
+    def invalidate_user(self, user_id: str) -> None:
+        self._entries.invalidate(("user", user_id))
+
+    def invalidate_channel(self, cid: str) -> None:
+        # Cached memberships stay; callers re-add members whenever they had
+        # to (re)create the channel
+        self._entries.invalidate(("channel", cid))
+
+    def invalidate_member(self, cid: str, user_id: str) -> None:
+        self._entries.invalidate(("member", cid, user_id))
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._entries.stats()
+
+
+class TokenCache:
+    """Stream user tokens that are still valid, per user.
+
+    With ``token_ttl`` set, tokens carry an ``exp`` claim and are reused
+    until ``min_remaining`` seconds before it. Without it (the default, the
+    frontend connects with a static token) tokens never expire and are kept
+    for ``fallback_ttl``.
+    """
+
+    def __init__(
+        self,
+        token_ttl: float = 0,
+        min_remaining: float = 3600.0,
+        fallback_ttl: float = 3600.0,
+        maxsize: int = 50_000,
+    ):
+        self.token_ttl = token_ttl
+        self.min_remaining = min_remaining
+        self.fallback_ttl = fallback_ttl
+        self._tokens = TTLCache(maxsize=maxsize, ttl=fallback_ttl, negative_ttl=None, name="stream_tokens")
+
+    def get_or_create(self, user_id: str, mint: Callable[[str, Optional[int]], str]) -> str:
+        """Cached token for ``user_id``, or ``mint(user_id, exp)`` a new one."""
+        token = self._tokens.get(user_id)
+        if token is not None:
+            return token
+        exp: Optional[int] = None
+        cache_for = self.fallback_ttl
+        if self.token_ttl > 0:
+            exp = int(time.time() + self.token_ttl)
+            cache_for = max(self.token_ttl - self.min_remaining, 0)
+        token = mint(user_id, exp)
+        if cache_for > 0:
+            self._tokens.set(user_id, token, ttl=cache_for)
+        return token
+
+    def invalidate(self, user_id: str) -> None:
+        self._tokens.invalidate(user_id)
+
+    def clear(self) -> None:
+        self._tokens.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return self._tokens.stats()
+
+
+provisioning_cache = ProvisioningCache(ttl=float(os.getenv("STREAM_PROVISIONING_TTL", "3600")))
+token_cache = TokenCache(
+    token_ttl=float(os.getenv("STREAM_TOKEN_TTL", "0")),
+    min_remaining=float(os.getenv("STREAM_TOKEN_MIN_REMAINING", "3600")),
+    fallback_ttl=float(os.getenv("STREAM_PROVISIONING_TTL", "3600")),
+)
@@ -0,0 +1,137 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.deps.repos import get_thread_repo
+from app.utils.lifecycle import on_flush
+
+TouchFn = Callable[[str, str, Optional[List[str]]], None]
+
+
+class ThreadActivityTracker:
+    """Bump ``thread_members.last_activity_at`` from a worker thread.
+
+    ``record`` only notes the newest activity of a thread. The worker writes
+    it (one conditional update per participant) at most once per
+    ``interval`` seconds per thread, so a busy thread costs one round of
+    updates per interval instead of one per message, and none of it runs on
+    the request path. A thread's first message is written right away; later
+    ones within the interval are coalesced into the next write.
+    """
+
+    def __init__(self, touch: TouchFn, interval: float = 30.0, name: str = "thread-activity"):
+        self._touch = touch
+        self.interval = interval
+        self.name = name
+        self._cond = threading.Condition()
+        # thread_id -> (newest timestamp, participants if known)
+        self._pending: Dict[str, Tuple[str, Optional[List[str]]]] = {}
+        # thread_id -> monotonic time its next write is allowed
+        self._next_write: Dict[str, float] = {}
+        self._writing = 0
+        self._force = False
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats = {"recorded": 0, "coalesced": 0, "written": 0, "failed": 0}
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def record(self, thread_id: str, at: str, participants: Optional[List[str]] = None) -> None:
+        self._ensure_worker()
+        with self._cond:
+            self._stats["recorded"] += 1
+            previous = self._pending.get(thread_id)
+            if previous is not None:
+                self._stats["coalesced"] += 1
+                if previous[0] > at:
+                    at = previous[0]
+                participants = participants if participants is not None else previous[1]
+            self._pending[thread_id] = (at, participants)
+            self._cond.notify_all()
+
+    def _take_due(self) -> Dict[str, Tuple[str, Optional[List[str]]]]:
+        """Wait for threads whose interval has passed and remove them from pending."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                for thread_id in [t for t, due in self._next_write.items() if due <= now]:
+                    del self._next_write[thread_id]
+                due = [t for t in self._pending if self._force or t not in self._next_write]
+                if due:
+                    break
+                waits = [self._next_write[t] - now for t in self._pending]
+                self._cond.wait(min(waits) if waits else None)
+            batch = {t: self._pending.pop(t) for t in due}
+            for thread_id in batch:
+                self._next_write[thread_id] = now + self.interval
+            self._writing += len(batch)
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_due()
+            written = failed = 0
+            for thread_id, (at, participants) in batch.items():
+                try:
+                    self._touch(thread_id, at, participants)
+                    written += 1
+                except Exception as exc:
+                    failed += 1
+                    print(f"[{self.name}] activity update failed for {thread_id}: {exc}")
+            with self._cond:
+                self._writing -= len(batch)
+                self._stats["written"] += written
+                self._stats["failed"] += failed
+                self._cond.notify_all()
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Write everything recorded so far, ignoring the interval."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            if not self._pending and not self._writing:
+                return True
+            self._force = True
+            self._cond.notify_all()
+            try:
+                while self._pending or self._writing:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        return False
+                    self._cond.wait(remaining)
+                return True
+            finally:
+                self._force = False
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["pending"] = len(self._pending)
+            stats["throttled"] = len(self._next_write)
+        return stats
+
+
+_tracker: Optional[ThreadActivityTracker] = None
+_tracker_lock = threading.Lock()
+
+
+def get_thread_activity() -> ThreadActivityTracker:
+    """Process-wide tracker writing through ``ThreadRepo.touch_thread``."""
+    global _tracker
+    if _tracker is None:
+        with _tracker_lock:
+            if _tracker is None:
+                _tracker = ThreadActivityTracker(
+                    touch=lambda thread_id, at, participants: get_thread_repo().touch_thread(
+                        thread_id, at=at, participants=participants
+                    ),
+                    interval=float(os.getenv("THREAD_ACTIVITY_INTERVAL", "30")),
+                )
+                on_flush(_tracker.flush)
+    return _tracker
@@ -0,0 +1,347 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, List, Optional
+
+from app.utils.lifecycle import on_flush
+
+PENDING = "pending"
+INFLIGHT = "inflight"
+DEAD = "dead"
+
+
+class DurableEventQueue:
+    """SQLite-backed event queue with strict per-channel ordering.
+
+    Only the oldest unfinished event of a channel can be claimed, and not
+    while an earlier one of the same channel is in flight or waiting out a
+    retry backoff. Events of different channels are independent. Finished
+    events are deleted. Events that exhaust their retries are kept with status
+    ``dead`` for inspection. ``dedupe_key`` (the Stream message id) makes
+    webhook redeliveries no-ops. Among ready channel heads, a lower
+    ``priority`` is claimed first (then the oldest); with ``aging`` set, a
+    head gains one class per ``aging`` seconds queued, so routine channels
+    are delayed by a stream of emergencies but not starved.
+
+    Several processes may share one queue file. A claim records its owner
+    and holds the event for ``lease`` seconds; only events whose lease ran
+    out (their process died mid-event) are handed out again.
+    """
+
+    def __init__(self, path: str, lease: float = 300.0, aging: Optional[float] = None):
+        self.path = path
+        self.lease = lease
+        self.aging = aging
+        self.owner = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS events (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                channel_key TEXT NOT NULL,
+                dedupe_key TEXT UNIQUE,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                available_at REAL NOT NULL,
+                created_at REAL NOT NULL,
+                last_error TEXT,
+                priority INTEGER NOT NULL DEFAULT 0,
+                owner TEXT,
+                lease_until REAL
+            )
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(events)")}
+        if "priority" not in columns:  # queue files created before priorities existed
+            self._conn.execute("ALTER TABLE events ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+        if "owner" not in columns:  # in-flight rows from before leases have none and are reclaimed
+            self._conn.execute("ALTER TABLE events ADD COLUMN owner TEXT")
+            self._conn.execute("ALTER TABLE events ADD COLUMN lease_until REAL")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS events_channel ON events (channel_key, status, id)")
+        with self._lock:
+            self._reclaim_expired(time.time())
+
+    def _reclaim_expired(self, now: float) -> int:
+        """Return events whose owner died mid-event (lease ran out) to pending."""
+        cur = self._conn.execute(
+            "UPDATE events SET status = ?, owner = NULL, lease_until = NULL"
+            " WHERE status = ? AND (lease_until IS NULL OR lease_until < ?)",
+            (PENDING, INFLIGHT, now),
+        )
+        return cur.rowcount
+
+    def enqueue(
+        self, channel_key: str, payload: Dict[str, Any], dedupe_key: Optional[str] = None, priority: int = 0
+    ) -> bool:
+        """Persist an event; False when ``dedupe_key`` was already queued."""
+        now = time.time()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT OR IGNORE INTO events (channel_key, dedupe_key, payload, available_at, created_at, priority)"
+                " VALUES (?, ?, ?, ?, ?, ?)",
+                (channel_key, dedupe_key, json.dumps(payload), now, now, priority),
+            )
+            return cur.rowcount == 1
+
+    def claim(self, limit: int = 1) -> List[Dict[str, Any]]:
+        """Mark up to ``limit`` channel-head events in flight and return them."""
+        now = time.time()
+        if self.aging:
+            order, order_args = "e.priority - (? - e.created_at) / ?", (now, self.aging)
+        else:
+            order, order_args = "e.priority", ()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._reclaim_expired(now)
+                rows = self._conn.execute(
+                    f"""
+                    SELECT e.id, e.channel_key, e.payload, e.attempts, e.created_at
+                    FROM events e
+                    JOIN (
+                        SELECT channel_key, MIN(id) AS head FROM events
+                        WHERE status IN (?, ?) GROUP BY channel_key
+                    ) h ON e.id = h.head
+                    WHERE e.status = ? AND e.available_at <= ?
+                    ORDER BY {order}, e.id
+                    LIMIT ?
+                    """,
+                    (PENDING, INFLIGHT, PENDING, now, *order_args, limit),
+                ).fetchall()
+                if rows:
+                    self._conn.executemany(
+                        "UPDATE events SET status = ?, attempts = attempts + 1, owner = ?, lease_until = ? WHERE id = ?",
+                        [(INFLIGHT, self.owner, now + self.lease, row[0]) for row in rows],
+                    )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+        return [
+            {
+                "id": row[0],
+                "channel_key": row[1],
+                "payload": json.loads(row[2]),
+                "attempt": row[3] + 1,
+                "created_at": row[4],
+            }
+            for row in rows
+        ]
+
+    # ack/retry/bury only touch events this queue still owns: once a lease
+    # ran out and another process reclaimed the event, it is theirs
+
+    def ack(self, event_id: int) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM events WHERE id = ? AND owner = ?", (event_id, self.owner))
+
+    def retry(self, event_id: int, error: str, delay: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE events SET status = ?, available_at = ?, last_error = ?, owner = NULL, lease_until = NULL"
+                " WHERE id = ? AND owner = ?",
+                (PENDING, time.time() + delay, error[:1000], event_id, self.owner),
+            )
+
+    def bury(self, event_id: int, error: str) -> None:
+        """Give up on an event; later events of its channel proceed."""
+        with self._lock:
+            self._conn.execute(
+                "UPDATE events SET status = ?, last_error = ?, owner = NULL, lease_until = NULL"
+                " WHERE id = ? AND owner = ?",
+                (DEAD, error[:1000], event_id, self.owner),
+            )
+
+    def owned_inflight(self) -> int:
+        """Events this queue has claimed and not yet finished."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT COUNT(*) FROM events WHERE status = ? AND owner = ?", (INFLIGHT, self.owner)
+            ).fetchone()
+        return row[0]
+
+    def has_ready(self) -> bool:
+        """Whether some event is pending and past its backoff."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM events WHERE status = ? AND available_at <= ? LIMIT 1", (PENDING, time.time())
+            ).fetchone()
+        return row is not None
+
+    def counts(self) -> Dict[str, int]:
+        with self._lock:
+            rows = self._conn.execute("SELECT status, COUNT(*) FROM events GROUP BY status").fetchall()
+            oldest = self._conn.execute(
+                "SELECT MIN(created_at) FROM events WHERE status IN (?, ?)", (PENDING, INFLIGHT)
+            ).fetchone()[0]
+        counts = {PENDING: 0, INFLIGHT: 0, DEAD: 0}
+        counts.update({status: count for status, count in rows})
+        counts["oldest_age_ms"] = int((time.time() - oldest) * 1000) if oldest else 0
+        return counts
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+class WebhookWorkerPool:
+    """Worker threads draining a :class:`DurableEventQueue`.
+
+    Each worker claims one channel-head event at a time, so a channel's
+    events run strictly in order while different channels run in parallel.
+    A failing event is retried with jittered exponential backoff (blocking
+    only its own channel), then buried after ``max_attempts``.
+    """
+
+    def __init__(
+        self,
+        queue: DurableEventQueue,
+        handler: Callable[[Dict[str, Any]], None],
+        workers: int = 4,
+        poll_interval: float = 0.5,
+        max_attempts: int = 5,
+        base_backoff: float = 1.0,
+        name: str = "webhook-worker",
+    ):
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.name = name
+        self._wake = threading.Condition()
+        self._threads: List[threading.Thread] = []
+        self._started_lock = threading.Lock()
+        self._busy = 0
+        self._stop = False
+        self._stats = {"processed": 0, "retried": 0, "dead": 0}
+
+    def start(self) -> None:
+        with self._started_lock:
+            if self._threads and all(t.is_alive() for t in self._threads):
+                return
+            self._stop = False
+            self._threads = [
+                threading.Thread(target=self._run, name=f"{self.name}-{n}", daemon=True) for n in range(self.workers)
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def submit(
+        self, channel_key: str, payload: Dict[str, Any], dedupe_key: Optional[str] = None, priority: int = 0
+    ) -> bool:
+        queued = self.queue.enqueue(channel_key, payload, dedupe_key, priority)
+        if queued:
+            self.start()
+            self.notify()
+        return queued
+
+    def notify(self) -> None:
+        with self._wake:
+            self._wake.notify_all()
+
+    def _run(self) -> None:
+        while not self._stop:
+            if not self.run_once():
+                with self._wake:
+                    self._wake.wait(self.poll_interval)
+
+    def run_once(self) -> bool:
+        """Claim and handle one event; False when nothing was ready."""
+        claimed = self.queue.claim(1)
+        if not claimed:
+            return False
+        event = claimed[0]
+        with self._wake:
+            self._busy += 1
+        try:
+            self.handler(event["payload"])
+        except Exception as exc:
+            error = f"{type(exc).__name__}: {exc}"
+            if event["attempt"] >= self.max_attempts:
+                self.queue.bury(event["id"], error)
+                self._count("dead")
+                print(f"[{self.name}] giving up on event {event['id']} ({event['channel_key']}): {error}")
+            else:
+                delay = random.uniform(0.5, 1.0) * self.base_backoff * (2 ** (event["attempt"] - 1))
+                self.queue.retry(event["id"], error, delay)
+                self._count("retried")
+        else:
+            self.queue.ack(event["id"])
+            self._count("processed")
+        finally:
+            with self._wake:
+                self._busy -= 1
+                # The channel's next event may be claimable now
+                self._wake.notify_all()
+        return True
+
+    def _count(self, key: str) -> None:
+        with self._wake:
+            self._stats[key] += 1
+
+    def drain(self, timeout: Optional[float] = 5.0) -> bool:
+        """Wait until no event is ready or running; True if drained in time.
+
+        Events waiting out a retry backoff, and events other processes
+        sharing the queue file are working on, do not count.
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self.start()
+        while deadline is None or time.monotonic() < deadline:
+            inflight = self.queue.owned_inflight()
+            with self._wake:
+                busy = self._busy
+            if not busy and not inflight and not self.queue.has_ready():
+                return True
+            self.notify()
+            time.sleep(0.01)
+        return False
+
+    def stop(self) -> None:
+        self._stop = True
+        self.notify()
+        for thread in self._threads:
+            thread.join(timeout=1)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._wake:
+            stats: Dict[str, Any] = dict(self._stats)
+        stats.update(self.queue.counts())
+        stats["workers"] = self.workers
+        return stats
+
+
+_pool: Optional[WebhookWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_webhook_pool(handler: Callable[[Dict[str, Any]], None]) -> WebhookWorkerPool:
+    """Process-wide pool for Stream webhook events (``handler`` is bound on first use)."""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                queue = DurableEventQueue(
+                    os.getenv("WEBHOOK_QUEUE_PATH", "/tmp/landten-webhooks.sqlite3"),
+                    lease=float(os.getenv("WEBHOOK_LEASE_SECONDS", "300")),
+                    # Same promotion rate as the agent scheduler's waiters
+                    aging=float(os.getenv("AGENT_PRIORITY_AGING", "10")),
+                )
+                _pool = WebhookWorkerPool(
+                    queue,
+                    handler,
+                    workers=int(os.getenv("WEBHOOK_WORKERS", "8")),
+                    max_attempts=int(os.getenv("WEBHOOK_MAX_ATTEMPTS", "5")),
+                )
+                on_flush(_pool.drain)
+    return _pool
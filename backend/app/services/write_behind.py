@@ -0,0 +1,163 @@
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from app.deps.repos import get_chat_repo
+from app.utils.lifecycle import on_flush
+
+BATCH_WRITE_MAX = 25  # DynamoDB BatchWriteItem hard limit
+
+
+class WriteBehindBuffer:
+    """Buffer items and persist them with BatchWriteItem from a worker thread.
+
+    A batch is flushed when it reaches ``max_batch`` items or ``flush_interval``
+    seconds after its first item arrived. ``UnprocessedItems`` are retried with
+    exponential backoff and jitter; items still failing after ``max_retries``
+    are handed to ``on_failure`` so callers can keep a fallback copy.
+    """
+
+    def __init__(
+        self,
+        write_batch: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]],
+        key_fields: tuple,
+        max_batch: int = BATCH_WRITE_MAX,
+        flush_interval: float = 0.05,
+        max_queue: int = 10000,
+        max_retries: int = 5,
+        base_backoff: float = 0.05,
+        on_failure: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        name: str = "write-behind",
+    ):
+        self._write_batch = write_batch
+        self._key_fields = key_fields
+        self.max_batch = min(max_batch, BATCH_WRITE_MAX)
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.on_failure = on_failure
+        self.name = name
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue(maxsize=max_queue)
+        self._pending = 0
+        self._idle = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._stats = {"submitted": 0, "written": 0, "batches": 0, "retries": 0, "failed": 0, "rejected": 0}
+
+    def _ensure_worker(self) -> None:
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+                self._thread.start()
+
+    def submit(self, item: Dict[str, Any]) -> bool:
+        """Queue ``item``; False when the buffer is full (caller should write sync)."""
+        self._ensure_worker()
+        with self._idle:
+            self._pending += 1
+            self._stats["submitted"] += 1
+        try:
+            self._queue.put_nowait(item)
+        except queue.Full:
+            with self._idle:
+                self._stats["submitted"] -= 1
+                self._stats["rejected"] += 1
+            self._done(1)
+            return False
+        return True
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until everything submitted so far is written (or given up on)."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._idle:
+            while self._pending:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._idle.wait(remaining)
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        return {**self._stats, "queued": self._queue.qsize(), "pending": self._pending}
+
+    def _done(self, count: int) -> None:
+        with self._idle:
+            self._pending -= count
+            if not self._pending:
+                self._idle.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            try:
+                self._persist(batch)
+            finally:
+                self._done(len(batch))
+
+    def _persist(self, batch: List[Dict[str, Any]]) -> None:
+        # BatchWriteItem rejects two writes to the same key; last write wins
+        unique: Dict[tuple, Dict[str, Any]] = {}
+        for item in batch:
+            unique[tuple(item.get(f) for f in self._key_fields)] = item
+        items = list(unique.values())
+        attempt = 0
+        while items:
+            try:
+                unprocessed = self._write_batch(items)
+            except Exception as exc:
+                print(f"[{self.name}] batch write failed: {exc}")
+                unprocessed = items
+            self._stats["batches"] += 1
+            self._stats["written"] += len(items) - len(unprocessed)
+            if not unprocessed:
+                return
+            attempt += 1
+            if attempt > self.max_retries:
+                self._stats["failed"] += len(unprocessed)
+                print(f"[{self.name}] giving up on {len(unprocessed)} items after {self.max_retries} retries")
+                if self.on_failure:
+                    self.on_failure(unprocessed)
+                return
+            self._stats["retries"] += 1
+            backoff = self.base_backoff * (2 ** (attempt - 1))
+            time.sleep(random.uniform(0, backoff))
+            items = unprocessed
+
+
+_chat_buffer: Optional[WriteBehindBuffer] = None
+_chat_buffer_lock = threading.Lock()
+
+
+def get_chat_write_buffer(
+    on_failure: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+) -> WriteBehindBuffer:
+    """Process-wide buffer for ``chat_messages`` writes."""
+    global _chat_buffer
+    if _chat_buffer is None:
+        with _chat_buffer_lock:
+            if _chat_buffer is None:
+                _chat_buffer = WriteBehindBuffer(
+                    write_batch=lambda items: get_chat_repo().batch_put(items),
+                    key_fields=("thread_id", "timestamp"),
+                    max_batch=int(os.getenv("CHAT_WRITE_BATCH_SIZE", str(BATCH_WRITE_MAX))),
+                    flush_interval=float(os.getenv("CHAT_WRITE_FLUSH_MS", "50")) / 1000,
+                    max_queue=int(os.getenv("CHAT_WRITE_MAX_QUEUE", "10000")),
+                    on_failure=on_failure,
+                    name="chat-write-behind",
+                )
+                on_flush(_chat_buffer.flush)
+    return _chat_buffer
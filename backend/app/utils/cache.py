@@ -0,0 +1,97 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+_NEGATIVE = object()
+
+
+class TTLCache:
+    """Thread-safe LRU cache with per-entry TTL and negative caching.
+
+    ``get_or_load`` is the read-through entry point: a loader returning None
+    is remembered as a miss for ``negative_ttl`` seconds so repeated lookups
+    of unknown keys do not hit the backing store either.
+    """
+
+    def __init__(
+        self,
+        maxsize: int = 1024,
+        ttl: float = 300.0,
+        negative_ttl: Optional[float] = 30.0,
+        name: str = "cache",
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.name = name
+        self._data: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "negative_hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    def lookup(self, key: Hashable) -> Tuple[bool, Any]:
+        """Return ``(found, value)``; a cached negative is ``(True, None)``."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return False, None
+            expires_at, value = entry
+            if expires_at <= now:
+                del self._data[key]
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return False, None
+            self._data.move_to_end(key)
+            if value is _NEGATIVE:
+                self._stats["negative_hits"] += 1
+                return True, None
+            self._stats["hits"] += 1
+            return True, value
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        found, value = self.lookup(key)
+        return value if found and value is not None else default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        if value is None:
+            if not self.negative_ttl:
+                self.invalidate(key)
+                return
+            value, ttl = _NEGATIVE, ttl if ttl is not None else self.negative_ttl
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._stats["evictions"] += 1
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        found, value = self.lookup(key)
+        if found:
+            return value
+        value = loader()
+        self.set(key, value)
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        with self._lock:
+            if self._data.pop(key, None) is not None:
+                self._stats["invalidations"] += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._stats)
+            stats["size"] = len(self._data)
+        lookups = stats["hits"] + stats["negative_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["negative_hits"]) / lookups, 4) if lookups else 0.0
+        return stats
@@ -0,0 +1,23 @@
+import asyncio
+from typing import Callable, TypeVar
+
+T = TypeVar("T")
+
+
+async def acquire_in_thread(acquire: Callable[[], T], release: Callable[[], None]) -> T:
+    """Run a blocking ``acquire`` in a worker thread, off the event loop.
+
+    If the awaiting task is cancelled while ``acquire`` still waits, an
+    acquisition that succeeds afterwards is handed back with ``release``.
+    """
+    pending = asyncio.ensure_future(asyncio.to_thread(acquire))
+    try:
+        return await asyncio.shield(pending)
+    except asyncio.CancelledError:
+
+        def undo(future: "asyncio.Future[T]") -> None:
+            if not future.cancelled() and future.exception() is None:
+                release()
+
+        pending.add_done_callback(undo)
+        raise
@@ -0,0 +1,176 @@
+"""Timing of outbound calls (DynamoDB, OpenAI, Stream, Pusher, S3).
+
+Call sites wrap each outbound call in ``track(dependency, operation)``.
+DynamoDB calls are timed through botocore events instead (see
+``instrument_boto_session``). Every call updates process-wide per-operation
+stats. Inside a request it is also added to that request's breakdown, which
+``MetricsMiddleware`` emits as a ``Server-Timing`` header and in the access
+log line. The breakdown is held in a contextvar, so it follows the request
+into FastAPI's threadpool.
+"""
+import contextvars
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+_OpKey = Tuple[str, str]  # (dependency, operation)
+
+
+class RequestTimings:
+    """Outbound calls made while serving one request."""
+
+    def __init__(self, scope: Optional[Dict[str, Any]] = None):
+        self._lock = threading.Lock()  # sync endpoints may fan out to threads
+        self.calls: Dict[_OpKey, List[float]] = {}  # -> [count, total_ms, errors]
+        self.scope = scope
+
+    @property
+    def route(self) -> Optional[str]:
+        """Templated path of the matched route, once routing has run."""
+        return getattr((self.scope or {}).get("route"), "path", None)
+
+    def add(self, key: _OpKey, elapsed_ms: float, error: bool) -> None:
+        with self._lock:
+            entry = self.calls.setdefault(key, [0, 0.0, 0])
+            entry[0] += 1
+            entry[1] += elapsed_ms
+            entry[2] += 1 if error else 0
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                f"{dep}.{op}": {"calls": int(c), "ms": round(ms, 2), **({"errors": int(e)} if e else {})}
+                for (dep, op), (c, ms, e) in self.calls.items()
+            }
+
+    def server_timing(self) -> str:
+        """``Server-Timing`` value: one metric per dependency operation."""
+        with self._lock:
+            items = sorted(self.calls.items(), key=lambda kv: -kv[1][1])
+        parts = []
+        for (dep, op), (count, total_ms, _) in items:
+            name = _TOKEN_UNSAFE.sub("-", f"{dep}.{op}")
+            parts.append(f'{name};dur={total_ms:.1f};desc="{int(count)}x"')
+        return ", ".join(parts)
+
+
+_TOKEN_UNSAFE = re.compile(r"[^A-Za-z0-9!#$%&'*+.^_`|~-]")
+_current: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar("request_timings", default=None)
+
+
+def begin_request(scope: Optional[Dict[str, Any]] = None) -> Tuple[RequestTimings, contextvars.Token]:
+    timings = RequestTimings(scope)
+    return timings, _current.set(timings)
+
+
+def end_request(token: contextvars.Token) -> None:
+    _current.reset(token)
+
+
+def current_timings() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+class DependencyStats:
+    """Process-wide latency/error/retry counters per (dependency, operation)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._ops: Dict[_OpKey, Dict[str, float]] = {}
+
+    def record(self, key: _OpKey, elapsed_ms: float, error: bool = False, retries: int = 0) -> None:
+        with self._lock:
+            op = self._ops.get(key)
+            if op is None:
+                op = self._ops[key] = {"calls": 0, "errors": 0, "retries": 0, "ms_total": 0.0, "ms_max": 0.0}
+            op["calls"] += 1
+            op["errors"] += 1 if error else 0
+            op["retries"] += retries
+            op["ms_total"] += elapsed_ms
+            if elapsed_ms > op["ms_max"]:
+                op["ms_max"] = elapsed_ms
+        timings = _current.get()
+        if timings is not None:
+            timings.add(key, elapsed_ms, error)
+
+    def record_retry(self, key: _OpKey) -> None:
+        """Count an application-level retry (the failed attempt was recorded already)."""
+        with self._lock:
+            op = self._ops.get(key)
+            if op is not None:
+                op["retries"] += 1
+
+    def snapshot(self) -> Dict[_OpKey, Dict[str, float]]:
+        with self._lock:
+            return {key: dict(op) for key, op in self._ops.items()}
+
+    def stats(self) -> Dict[str, Any]:
+        out: Dict[str, Any] = {}
+        for (dep, op), values in sorted(self.snapshot().items()):
+            values["ms_avg"] = round(values["ms_total"] / values["calls"], 3) if values["calls"] else 0.0
+            out.setdefault(dep, {})[op] = values
+        return out
+
+    def reset(self) -> None:
+        with self._lock:
+            self._ops.clear()
+
+
+dependency_stats = DependencyStats()
+
+
+@contextmanager
+def track(dependency: str, operation: str) -> Iterator[None]:
+    """Time the enclosed outbound call; exceptions are counted and re-raised."""
+    start = time.perf_counter()
+    error = False
+    try:
+        yield
+    except BaseException:
+        error = True
+        raise
+    finally:
+        dependency_stats.record((dependency, operation), (time.perf_counter() - start) * 1000, error)
+
+
+def _boto_before_call(model=None, context=None, **_: Any) -> None:
+    if context is not None and model is not None:
+        context["_timing"] = (model.service_model.service_name, model.name, time.perf_counter())
+
+
+def _boto_after_call(parsed=None, context=None, **_: Any) -> None:
+    _record_boto(context, parsed, error=False)
+
+
+def _boto_after_call_error(context=None, **_: Any) -> None:
+    # Connection-level failure after botocore's own retries were exhausted
+    _record_boto(context, None, error=True)
+
+
+def _record_boto(context, parsed, error: bool) -> None:
+    timing = context.pop("_timing", None) if context is not None else None
+    if timing is None:
+        return
+    service, operation, start = timing
+    retries = 0
+    if isinstance(parsed, dict):
+        retries = int(parsed.get("ResponseMetadata", {}).get("RetryAttempts", 0) or 0)
+        # Error responses (throttling, conditional check failures) arrive here with an Error key
+        error = error or "Error" in parsed
+    dependency_stats.record((service, operation), (time.perf_counter() - start) * 1000, error, retries)
+
+
+def instrument_boto_session(session) -> None:
+    """Time every API call made by clients/resources created from ``session``.
+
+    Must run before the clients are created: they copy the session's event
+    handlers at construction.
+    """
+    events = session.events
+    # before-parameter-build (not before-call): it always fires, even when a
+    # before-call handler short-circuits the request (stubs, caches)
+    events.register("before-parameter-build", _boto_before_call, unique_id="landten-timing-before")
+    events.register("after-call", _boto_after_call, unique_id="landten-timing-after")
+    events.register("after-call-error", _boto_after_call_error, unique_id="landten-timing-error")
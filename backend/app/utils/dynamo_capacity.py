@@ -0,0 +1,227 @@
+"""DynamoDB consumed-capacity accounting per route, repo method and table.
+
+``instrument_capacity(session)`` makes every DynamoDB call made through the
+session ask for ``ReturnConsumedCapacity=TOTAL`` and records the units it
+reports. The units are attributed to:
+
+* the route being served (the request scope kept by ``MetricsMiddleware``,
+  see ``app.utils.dependency_timing``), or ``<background>`` outside one;
+* the repo method, set by ``@track_repo_methods`` on the repo classes;
+* the table.
+
+``capacity_budget`` collects the same data for a block of code, so tests can
+assert that a code path stays within a read/write budget and never scans.
+"""
+import contextvars
+import functools
+import inspect
+import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from app.utils.dependency_timing import current_timings
+
+BACKGROUND = "<background>"
+
+# Operations that accept ReturnConsumedCapacity, and which capacity they consume
+_READ_OPS = {"GetItem", "Query", "Scan", "BatchGetItem", "TransactGetItems"}
+_WRITE_OPS = {"PutItem", "UpdateItem", "DeleteItem", "BatchWriteItem", "TransactWriteItems"}
+
+_repo_method: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("repo_method", default=None)
+_budgets: contextvars.ContextVar[Tuple["CapacityUsage", ...]] = contextvars.ContextVar("capacity_budgets", default=())
+
+# (route, repo method, table, "read"|"write") -> [units, calls]
+_CapKey = Tuple[str, str, str, str]
+
+
+class CapacityBudgetExceeded(AssertionError):
+    """Raised by :func:`capacity_budget` when a block consumed more than allowed."""
+
+
+class CapacityUsage:
+    """Capacity consumed inside one :func:`capacity_budget` block."""
+
+    def __init__(self):
+        self.read_units = 0.0
+        self.write_units = 0.0
+        self.operations: Dict[str, int] = {}
+        self.by_method: Dict[str, float] = {}
+
+    def add(self, operation: str, method: str, kind: str, units: float) -> None:
+        self.operations[operation] = self.operations.get(operation, 0) + 1
+        self.by_method[method] = self.by_method.get(method, 0.0) + units
+        if kind == "read":
+            self.read_units += units
+        else:
+            self.write_units += units
+
+
+class CapacityStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._units: Dict[_CapKey, List[float]] = {}
+
+    def record(self, key: _CapKey, units: float) -> None:
+        with self._lock:
+            entry = self._units.setdefault(key, [0.0, 0])
+            entry[0] += units
+            entry[1] += 1
+
+    def snapshot(self) -> Dict[_CapKey, Tuple[float, int]]:
+        with self._lock:
+            return {key: (units, int(calls)) for key, (units, calls) in self._units.items()}
+
+    def by_route(self) -> List[Dict[str, Any]]:
+        """Routes ranked by total capacity units consumed."""
+        totals: Dict[str, Dict[str, float]] = {}
+        for (route, _, _, kind), (units, calls) in self.snapshot().items():
+            entry = totals.setdefault(route, {"route": route, "read_units": 0.0, "write_units": 0.0, "calls": 0})
+            entry[f"{kind}_units"] += units
+            entry["calls"] += calls
+        ranked = sorted(totals.values(), key=lambda e: e["read_units"] + e["write_units"], reverse=True)
+        return ranked
+
+    def reset(self) -> None:
+        with self._lock:
+            self._units.clear()
+
+
+capacity_stats = CapacityStats()
+
+
+def _current_route() -> str:
+    timings = current_timings()
+    if timings is None:
+        return BACKGROUND
+    return timings.route or BACKGROUND
+
+
+def _wrap_method(name: str, fn):
+    if inspect.isgeneratorfunction(fn):
+        @functools.wraps(fn)
+        def generator_wrapper(*args, **kwargs):
+            gen = fn(*args, **kwargs)
+            # Re-enter the attribution for each step: the caller's context is
+            # active between yields, not ours. send/throw/close are forwarded.
+            sent: Any = None
+            thrown: Optional[BaseException] = None
+            while True:
+                token = _repo_method.set(name)
+                try:
+                    if thrown is not None:
+                        exc, thrown = thrown, None
+                        value = gen.throw(exc)
+                    else:
+                        value = gen.send(sent)
+                except StopIteration as stop:
+                    return stop.value
+                finally:
+                    _repo_method.reset(token)
+                try:
+                    sent = yield value
+                except GeneratorExit:
+                    token = _repo_method.set(name)
+                    try:
+                        gen.close()
+                    finally:
+                        _repo_method.reset(token)
+                    raise
+                except BaseException as exc:
+                    thrown, sent = exc, None
+        return generator_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        token = _repo_method.set(name)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _repo_method.reset(token)
+    return wrapper
+
+
+def track_repo_methods(cls):
+    """Class decorator: attribute DynamoDB capacity to ``<Class>.<method>``.
+
+    Wraps public methods and ``_``-prefixed helpers (not dunders). The
+    innermost repo method on the stack wins.
+    """
+    for attr, value in list(vars(cls).items()):
+        if attr.startswith("__"):
+            continue
+        if isinstance(value, staticmethod):
+            continue
+        if inspect.isfunction(value):
+            setattr(cls, attr, _wrap_method(f"{cls.__name__}.{attr}", value))
+    return cls
+
+
+@contextmanager
+def capacity_budget(
+    max_read_units: Optional[float] = None,
+    max_write_units: Optional[float] = None,
+    forbid: Tuple[str, ...] = ("Scan",),
+) -> Iterator[CapacityUsage]:
+    """Collect capacity consumed in the block and fail if it exceeds the budget.
+
+    ``forbid`` lists operations that must not happen at all (by default a
+    table Scan). Budgets can be nested; each sees everything in its block.
+    """
+    usage = CapacityUsage()
+    token = _budgets.set(_budgets.get() + (usage,))
+    try:
+        yield usage
+    finally:
+        _budgets.reset(token)
+    problems = []
+    for op in forbid:
+        if usage.operations.get(op):
+            problems.append(f"{usage.operations[op]} {op} call(s)")
+    if max_read_units is not None and usage.read_units > max_read_units:
+        problems.append(f"{usage.read_units:g} RCU > budget {max_read_units:g}")
+    if max_write_units is not None and usage.write_units > max_write_units:
+        problems.append(f"{usage.write_units:g} WCU > budget {max_write_units:g}")
+    if problems:
+        detail = ", ".join(f"{m}={u:g}" for m, u in sorted(usage.by_method.items()))
+        raise CapacityBudgetExceeded(f"DynamoDB capacity budget exceeded: {'; '.join(problems)} ({detail})")
+
+
+def _request_capacity(params=None, model=None, **_: Any) -> None:
+    if params is None or model is None:
+        return
+    if model.name in _READ_OPS or model.name in _WRITE_OPS:
+        params.setdefault("ReturnConsumedCapacity", "TOTAL")
+
+
+def _record_capacity(parsed=None, model=None, **_: Any) -> None:
+    if not isinstance(parsed, dict) or model is None:
+        return
+    operation = model.name
+    if operation not in _READ_OPS and operation not in _WRITE_OPS:
+        return
+    kind = "read" if operation in _READ_OPS else "write"
+    method = _repo_method.get() or "<direct>"
+    budgets = _budgets.get()
+    consumed = parsed.get("ConsumedCapacity") or []
+    entries = consumed if isinstance(consumed, list) else [consumed]
+    total = 0.0
+    route = _current_route()
+    for entry in entries:
+        units = float(entry.get("CapacityUnits") or 0.0)
+        total += units
+        capacity_stats.record((route, method, entry.get("TableName", "?"), kind), units)
+    for usage in budgets:
+        usage.add(operation, method, kind, total)
+
+
+def instrument_capacity(session) -> None:
+    """Request and record consumed capacity on DynamoDB clients built from ``session``.
+
+    ``DYNAMO_CAPACITY_TRACKING=false`` turns it off.
+    """
+    if os.getenv("DYNAMO_CAPACITY_TRACKING", "true").lower() in {"false", "0", "no"}:
+        return
+    events = session.events
+    events.register("before-parameter-build.dynamodb", _request_capacity, unique_id="landten-capacity-request")
+    events.register("after-call.dynamodb", _record_capacity, unique_id="landten-capacity-record")
@@ -0,0 +1,30 @@
+import atexit
+import time
+from typing import Callable, List, Optional
+
+# Background pipelines register a flush callback here. The app's lifespan
+# shutdown runs them; Mangum fires that shutdown at the end of every Lambda
+# invocation, so nothing buffered is left behind when the sandbox freezes.
+_flush_hooks: List[Callable[[Optional[float]], bool]] = []
+
+
+def on_flush(hook: Callable[[Optional[float]], bool]) -> None:
+    if hook not in _flush_hooks:
+        _flush_hooks.append(hook)
+
+
+def flush_background_work(timeout: Optional[float] = 5.0) -> bool:
+    """Run every flush hook within a shared deadline; True if all drained."""
+    deadline = None if timeout is None else time.monotonic() + timeout
+    drained = True
+    for hook in list(_flush_hooks):
+        remaining = None if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            drained = hook(remaining) and drained
+        except Exception as exc:  # pragma: no cover - logging only
+            print(f"[lifecycle] flush hook failed: {exc}")
+            drained = False
+    return drained
+
+
+atexit.register(flush_background_work)
@@ -1,2 +1,55 @@
+import atexit
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+from typing import Optional
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_listener_lock = threading.Lock()
+
+
 def log(msg: str):
     print(f"[LOG] {msg}")
+
+
+def configure_logging() -> None:
+    """Route root logging through a queue so request handlers never block on I/O.
+
+    Records are formatted and written by a QueueListener thread. Calling this
+    more than once is a no-op.
+    """
+    global _listener
+    if _listener is not None:
+        return
+    with _listener_lock:
+        if _listener is not None:
+            return
+        root = logging.getLogger()
+        # Keep whatever handlers the host installed (e.g. Lambda's), just move them behind the queue
+        targets = list(root.handlers)
+        if not targets:
+            stream = logging.StreamHandler()
+            stream.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s %(message)s"))
+            targets = [stream]
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        # Unbounded would trade latency for memory under a log storm; drop instead
+        log_queue: "queue.Queue[logging.LogRecord]" = queue.Queue(int(os.getenv("LOG_QUEUE_SIZE", "10000")))
+        handler = _DroppingQueueHandler(log_queue)
+        root.addHandler(handler)
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        _listener = logging.handlers.QueueListener(log_queue, *targets, respect_handler_level=True)
+        _listener.start()
+        atexit.register(_listener.stop)
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    dropped = 0
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            _DroppingQueueHandler.dropped += 1
@@ -0,0 +1,320 @@
+"""Request metrics: per-route latency histograms, status counts, in-flight gauges.
+
+Writers never take a lock: each thread updates its own shard (in practice the
+event loop thread does almost all of the work) and a scrape sums the shards.
+``render_prometheus`` emits the Prometheus text exposition format.
+"""
+import math
+import re
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from app.utils.dependency_timing import begin_request, dependency_stats, end_request
+from app.utils.dynamo_capacity import capacity_stats
+
+# Seconds; tuned for API calls that mostly finish in 5 ms..2 s
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+UNMATCHED_ROUTE = "<unmatched>"
+# A request id supplied by a proxy is kept if it looks like one; otherwise a uuid4 is minted
+_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,128}$")
+_KNOWN_METHODS = {"GET", "HEAD", "POST", "PUT", "PATCH", "DELETE", "OPTIONS"}
+
+
+class _Shard:
+    __slots__ = ("requests", "latency", "in_flight")
+
+    def __init__(self):
+        # (method, route, status) -> count
+        self.requests: Dict[Tuple[str, str, int], int] = {}
+        # (method, route) -> [bucket counts..., +Inf count, sum]
+        self.latency: Dict[Tuple[str, str], List[float]] = {}
+        # method -> started - finished in this thread (the route is unknown until routing ran)
+        self.in_flight: Dict[str, int] = {}
+
+
+class RequestMetrics:
+    def __init__(self, buckets: Iterable[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._shards_lock = threading.Lock()  # only taken when a thread first records
+        self.started_at = time.time()
+
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = _Shard()
+            with self._shards_lock:
+                self._shards.append(shard)
+            self._local.shard = shard
+        return shard
+
+    def request_started(self, method: str) -> None:
+        in_flight = self._shard().in_flight
+        in_flight[method] = in_flight.get(method, 0) + 1
+
+    def request_finished(self, method: str, route: str, status: int, seconds: float) -> None:
+        shard = self._shard()
+        shard.in_flight[method] = shard.in_flight.get(method, 0) - 1
+        req_key = (method, route, status)
+        shard.requests[req_key] = shard.requests.get(req_key, 0) + 1
+        hist = shard.latency.get((method, route))
+        if hist is None:
+            hist = [0.0] * (len(self.buckets) + 2)
+            shard.latency[(method, route)] = hist
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                hist[i] += 1
+                break
+        else:
+            hist[len(self.buckets)] += 1
+        hist[-1] += seconds
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Merge all shards: requests, latency histograms (non-cumulative) and in-flight."""
+        with self._shards_lock:
+            shards = list(self._shards)
+        requests: Dict[Tuple[str, str, int], int] = {}
+        latency: Dict[Tuple[str, str], List[float]] = {}
+        in_flight: Dict[str, int] = {}
+        for shard in shards:
+            for key, count in list(shard.requests.items()):
+                requests[key] = requests.get(key, 0) + count
+            for key, hist in list(shard.latency.items()):
+                merged = latency.setdefault(key, [0.0] * len(hist))
+                for i, value in enumerate(list(hist)):
+                    merged[i] += value
+            for key, count in list(shard.in_flight.items()):
+                in_flight[key] = in_flight.get(key, 0) + count
+        return {"requests": requests, "latency": latency, "in_flight": in_flight}
+
+    def quantile(self, method: str, route: str, q: float) -> Optional[float]:
+        """Bucket-interpolated quantile estimate (what Prometheus' histogram_quantile does)."""
+        hist = self.snapshot()["latency"].get((method, route))
+        if not hist:
+            return None
+        counts = hist[:-1]
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0.0
+        lower = 0.0
+        for i, count in enumerate(counts):
+            upper = self.buckets[i] if i < len(self.buckets) else math.inf
+            if seen + count >= rank and count:
+                if math.isinf(upper):
+                    return lower
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return lower
+
+    def reset(self) -> None:
+        with self._shards_lock:
+            for shard in self._shards:
+                shard.requests.clear()
+                shard.latency.clear()
+                shard.in_flight.clear()
+
+
+request_metrics = RequestMetrics()
+
+# name -> callable returning a flat-ish dict of numbers (nested dicts are flattened)
+_collectors: Dict[str, Callable[[], Dict[str, Any]]] = {}
+
+
+def register_collector(name: str, collect: Callable[[], Dict[str, Any]]) -> None:
+    """Export another component's ``stats()`` as gauges named ``landten_<name>_<key>``."""
+    _collectors[name] = collect
+
+
+_INVALID_NAME_CHARS = re.compile(r"[^a-zA-Z0-9_:]")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _flatten(prefix: str, data: Dict[str, Any], out: List[Tuple[str, float]]) -> None:
+    for key, value in data.items():
+        name = _INVALID_NAME_CHARS.sub("_", f"{prefix}_{key}")
+        if isinstance(value, dict):
+            _flatten(name, value, out)
+        elif isinstance(value, bool):
+            out.append((name, 1.0 if value else 0.0))
+        elif isinstance(value, (int, float)):
+            out.append((name, float(value)))
+
+
+def render_prometheus(metrics: RequestMetrics = request_metrics) -> str:
+    snap = metrics.snapshot()
+    lines: List[str] = [
+        "# HELP http_requests_total Requests by method, route template and status.",
+        "# TYPE http_requests_total counter",
+    ]
+    for (method, route, status), count in sorted(snap["requests"].items()):
+        lines.append(f'http_requests_total{{method="{method}",route="{_escape(route)}",status="{status}"}} {count}')
+
+    lines += [
+        "# HELP http_request_duration_seconds Request latency by method and route template.",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), hist in sorted(snap["latency"].items()):
+        labels = f'method="{method}",route="{_escape(route)}"'
+        cumulative = 0.0
+        for i, bound in enumerate(list(metrics.buckets) + [math.inf]):
+            cumulative += hist[i]
+            lines.append(f'http_request_duration_seconds_bucket{{{labels},le="{_fmt(bound)}"}} {_fmt(cumulative)}')
+        lines.append(f"http_request_duration_seconds_sum{{{labels}}} {_fmt(hist[-1])}")
+        lines.append(f"http_request_duration_seconds_count{{{labels}}} {_fmt(cumulative)}")
+
+    lines += [
+        "# HELP http_requests_in_flight Requests currently being handled.",
+        "# TYPE http_requests_in_flight gauge",
+    ]
+    for method, count in sorted(snap["in_flight"].items()):
+        lines.append(f'http_requests_in_flight{{method="{method}"}} {count}')
+
+    dependency_series = (
+        ("dependency_calls_total", "counter", "calls", "Outbound calls by dependency and operation."),
+        ("dependency_errors_total", "counter", "errors", "Outbound calls that raised or returned an error."),
+        ("dependency_retries_total", "counter", "retries", "Client-side retries (AWS SDK)."),
+        ("dependency_duration_ms_total", "counter", "ms_total", "Total time spent in outbound calls."),
+        ("dependency_duration_ms_max", "gauge", "ms_max", "Slowest single outbound call."),
+    )
+    dependency_snap = sorted(dependency_stats.snapshot().items())
+    for metric, kind, field, help_text in dependency_series:
+        lines += [f"# HELP {metric} {help_text}", f"# TYPE {metric} {kind}"]
+        for (dep, op), values in dependency_snap:
+            lines.append(f'{metric}{{dependency="{_escape(dep)}",operation="{_escape(op)}"}} {_fmt(round(values[field], 3))}')
+
+    capacity_snap = sorted(capacity_stats.snapshot().items())
+    lines += [
+        "# HELP dynamodb_consumed_capacity_units_total Consumed RCU/WCU by route, repo method and table.",
+        "# TYPE dynamodb_consumed_capacity_units_total counter",
+    ]
+    for (route, method, table, kind), (units, _) in capacity_snap:
+        labels = f'route="{_escape(route)}",method="{_escape(method)}",table="{_escape(table)}",kind="{kind}"'
+        lines.append(f"dynamodb_consumed_capacity_units_total{{{labels}}} {_fmt(round(units, 3))}")
+    lines += [
+        "# HELP dynamodb_capacity_calls_total DynamoDB calls that reported consumed capacity.",
+        "# TYPE dynamodb_capacity_calls_total counter",
+    ]
+    for (route, method, table, kind), (_, calls) in capacity_snap:
+        labels = f'route="{_escape(route)}",method="{_escape(method)}",table="{_escape(table)}",kind="{kind}"'
+        lines.append(f"dynamodb_capacity_calls_total{{{labels}}} {calls}")
+
+    lines += ["# TYPE process_uptime_seconds gauge", f"process_uptime_seconds {_fmt(round(time.time() - metrics.started_at, 3))}"]
+
+    for name, collect in sorted(_collectors.items()):
+        try:
+            data = collect() or {}
+        except Exception as exc:  # a broken collector must not break the scrape
+            lines.append(f"# collector {name} failed: {_escape(str(exc))}")
+            continue
+        flat: List[Tuple[str, float]] = []
+        _flatten(f"landten_{name}", data, flat)
+        for metric, value in flat:
+            lines.append(f"# TYPE {metric} gauge")
+            lines.append(f"{metric} {_fmt(value)}")
+    return "\n".join(lines) + "\n"
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording :data:`request_metrics` and an access log.
+
+    Unlike ``BaseHTTPMiddleware`` it does not run the app in a separate task
+    or re-wrap the response stream; it only observes ``send``. Latency is
+    measured to the last body chunk, so streamed responses count in full.
+    Outbound calls made before the response starts are reported in a
+    ``Server-Timing`` header; the log line has all of them. Each request gets
+    a ``request_id`` (an incoming ``X-Request-ID`` or a uuid4), logged and
+    echoed in the ``X-Request-ID`` response header.
+    """
+
+    def __init__(
+        self,
+        app,
+        metrics: RequestMetrics = request_metrics,
+        access_log: Optional[Callable[[Dict[str, Any]], None]] = None,
+        server_timing: bool = True,
+    ):
+        self.app = app
+        self.metrics = metrics
+        self.access_log = access_log
+        self.server_timing = server_timing
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        method = scope.get("method", "GET")
+        if method not in _KNOWN_METHODS:
+            method = "OTHER"  # keep label cardinality bounded
+        start = time.perf_counter()
+        status = 500
+        finished = False
+        request_id = None
+        for name, value in scope.get("headers", ()):
+            if name == b"x-request-id":
+                candidate = value.decode("latin-1")
+                if _REQUEST_ID.match(candidate):
+                    request_id = candidate
+                break
+        request_id = request_id or str(uuid.uuid4())
+        self.metrics.request_started(method)
+        timings, timings_token = begin_request(scope)
+
+        def finish() -> None:
+            nonlocal finished
+            if finished:
+                return
+            finished = True
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            elapsed = time.perf_counter() - start
+            self.metrics.request_finished(method, route, status, elapsed)
+            if self.access_log is not None:
+                self.access_log(
+                    {
+                        "request_id": request_id,
+                        "method": method,
+                        "path": scope.get("path"),
+                        "route": route,
+                        "status": status,
+                        "duration_ms": round(elapsed * 1000, 2),
+                        "dependencies": timings.summary(),
+                    }
+                )
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"x-request-id", request_id.encode("latin-1")))
+                if self.server_timing:
+                    header = timings.server_timing()
+                    total = f"app;dur={(time.perf_counter() - start) * 1000:.1f}"
+                    header = f"{total}, {header}" if header else total
+                    headers.append((b"server-timing", header.encode("latin-1")))
+                message = dict(message)
+                message["headers"] = headers
+            await send(message)
+            if message["type"] == "http.response.body" and not message.get("more_body", False):
+                finish()
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            finish()
+            end_request(timings_token)
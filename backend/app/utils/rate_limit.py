@@ -1,21 +1,224 @@
+import threading
 import time
-from typing import Dict, Tuple
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+TOKEN_BUCKET = "token_bucket"
+SLIDING_WINDOW = "sliding_window"
+
+
+class RatePolicy:
+    """``limit`` requests per ``window_seconds`` for one class of traffic.
+
+    ``algorithm`` is ``token_bucket`` (smooth refill, allows ``burst``) or
+    ``sliding_window`` (the current fixed window's count plus the previous
+    one's, weighted by how much of it still overlaps the sliding window).
+    Both keep a constant-size state per key, whatever the limit.
+    ``scope`` picks the client key: ``ip``, or ``user`` (the verified uid,
+    enforced after authentication by ``app.deps.rate_limit``; the IP when the
+    identity is not verified).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        limit: int,
+        window_seconds: float,
+        algorithm: str = TOKEN_BUCKET,
+        burst: Optional[int] = None,
+        scope: str = "ip",
+    ):
+        if algorithm not in {TOKEN_BUCKET, SLIDING_WINDOW}:
+            raise ValueError(f"Unknown rate limit algorithm: {algorithm}")
+        self.name = name
+        self.limit = limit
+        self.window = window_seconds
+        self.algorithm = algorithm
+        self.burst = burst or limit
+        self.scope = scope
+        self.rate = limit / window_seconds  # tokens per second
+        # After this long without hits a key's state equals a fresh one, so it can be dropped
+        self.idle_ttl = 2 * window_seconds if algorithm == SLIDING_WINDOW else self.burst / self.rate
+
+    @classmethod
+    def parse(cls, name: str, spec: str, **kwargs: Any) -> "RatePolicy":
+        """Build from ``"<limit>/<seconds>"``, e.g. ``"120/60"``."""
+        limit, _, window = spec.partition("/")
+        return cls(name, int(limit), float(window or 60), **kwargs)
+
+    def retry_after(self) -> int:
+        """Seconds a rejected client should wait (one token's refill time)."""
+        return max(1, int(self.window / self.limit))
+
+    def __repr__(self) -> str:
+        return f"RatePolicy({self.name!r}, {self.limit}/{self.window}s, {self.algorithm}, scope={self.scope})"
+
+
+class _Shard:
+    __slots__ = ("lock", "entries", "last_sweep", "evictions")
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        # key -> [last_seen, state]; ordered by last access for LRU/idle eviction
+        self.entries: "OrderedDict[Tuple[str, str], list]" = OrderedDict()
+        self.last_sweep = 0.0
+        self.evictions = 0
+
+
+class RateLimiter:
+    """In-process limiter with sharded locks and bounded memory.
+
+    Keys are spread over ``shards`` independently locked LRU maps. Each shard
+    keeps at most ``max_keys / shards`` entries (least recently seen evicted
+    first), and every ``sweep_interval`` seconds drops keys idle longer than
+    their policy's ``idle_ttl``, since such a key's state equals a fresh one.
+    Every entry has the same small size, so ``max_keys`` bounds the bytes used.
+    """
+
+    def __init__(self, shards: int = 64, max_keys: int = 200_000, sweep_interval: float = 30.0):
+        self._shards = [_Shard() for _ in range(shards)]
+        self._per_shard = max(1, max_keys // shards)
+        self.sweep_interval = sweep_interval
+        self._max_idle: Dict[str, float] = {}
+
+    def _shard(self, key: Tuple[str, str]) -> _Shard:
+        return self._shards[hash(key) % len(self._shards)]
+
+    def allow(self, key: str, policy: RatePolicy, now: Optional[float] = None) -> bool:
+        now = time.monotonic() if now is None else now
+        if self._max_idle.get(policy.name, 0.0) < policy.idle_ttl:
+            self._max_idle[policy.name] = policy.idle_ttl
+        full_key = (policy.name, key)
+        shard = self._shard(full_key)
+        with shard.lock:
+            if now - shard.last_sweep >= self.sweep_interval:
+                self._sweep(shard, now)
+            entry = shard.entries.get(full_key)
+            if entry is None:
+                entry = [now, self._new_state(policy, now)]
+                shard.entries[full_key] = entry
+                if len(shard.entries) > self._per_shard:
+                    shard.entries.popitem(last=False)
+                    shard.evictions += 1
+            else:
+                shard.entries.move_to_end(full_key)
+            entry[0] = now
+            if policy.algorithm == TOKEN_BUCKET:
+                return self._take_token(entry[1], policy, now)
+            return self._count_hit(entry[1], policy, now)
+
+    @staticmethod
+    def _new_state(policy: RatePolicy, now: float):
+        if policy.algorithm == TOKEN_BUCKET:
+            return [float(policy.burst), now]
+        # [current window index, hits in it, hits in the previous window]
+        return [int(now // policy.window), 0, 0]
+
+    @staticmethod
+    def _take_token(state: list, policy: RatePolicy, now: float) -> bool:
+        tokens, last = state
+        tokens = min(float(policy.burst), tokens + (now - last) * policy.rate)
+        state[1] = now
+        if tokens >= 1.0:
+            state[0] = tokens - 1.0
+            return True
+        state[0] = tokens
+        return False
+
+    @staticmethod
+    def _count_hit(state: list, policy: RatePolicy, now: float) -> bool:
+        index = int(now // policy.window)
+        if index != state[0]:
+            state[2] = state[1] if index == state[0] + 1 else 0
+            state[1] = 0
+            state[0] = index
+        overlap = 1.0 - (now - index * policy.window) / policy.window
+        if state[2] * overlap + state[1] + 1 <= policy.limit:
+            state[1] += 1
+            return True
+        return False
+
+    def _sweep(self, shard: _Shard, now: float) -> None:
+        shard.last_sweep = now
+        entries = shard.entries
+        while entries:
+            (policy_name, _), entry = next(iter(entries.items()))
+            if now - entry[0] < self._max_idle.get(policy_name, 0.0):
+                break  # LRU order: everything after this was seen more recently
+            entries.popitem(last=False)
+            shard.evictions += 1
+
+    def __len__(self) -> int:
+        return sum(len(s.entries) for s in self._shards)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "keys": len(self),
+            "evictions": sum(s.evictions for s in self._shards),
+            "shards": len(self._shards),
+        }
+
+
+class PolicyTable:
+    """Longest-prefix route -> policy lookup; a None policy exempts the route."""
+
+    def __init__(self, default: Optional[RatePolicy], routes: Optional[List[Tuple[str, Optional[RatePolicy]]]] = None):
+        self.default = default
+        self._routes = sorted(routes or [], key=lambda r: len(r[0]), reverse=True)
+
+    def resolve(self, path: str) -> Optional[RatePolicy]:
+        for prefix, policy in self._routes:
+            if path == prefix or path.startswith(prefix.rstrip("/") + "/"):
+                return policy
+        return self.default
 
 
 class SimpleRateLimiter:
+    """Backwards-compatible single-policy facade over :class:`RateLimiter`."""
+
     def __init__(self, max_requests: int = 60, window_seconds: int = 60):
         self.max_requests = max_requests
         self.window = window_seconds
-        self.buckets: Dict[str, Tuple[int, float]] = {}
+        self.policy = RatePolicy("default", max_requests, window_seconds, algorithm=SLIDING_WINDOW)
+        self._limiter = RateLimiter()
 
     def allow(self, key: str) -> bool:
-        now = time.time()
-        count, start = self.buckets.get(key, (0, now))
-        if now - start > self.window:
-            self.buckets[key] = (1, now)
-            return True
-        if count < self.max_requests:
-            self.buckets[key] = (count + 1, start)
-            return True
-        return False
+        return self._limiter.allow(key, self.policy)
+
+
+class RateLimitMiddleware:
+    """Pure ASGI middleware: resolve the route's policy, 429 when over the limit.
+
+    ``key_func(scope, policy)`` returns the client key for ``ip`` policies.
+    A ``user`` policy needs the verified identity, which only exists once the
+    route's auth dependency ran, so it is handed to the route in
+    ``scope["state"]["rate_limit"]`` and enforced there.
+    """
+
+    def __init__(self, app, limiter, policies: PolicyTable, key_func):
+        self.app = app
+        self.limiter = limiter
+        self.policies = policies
+        self.key_func = key_func
 
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        policy = self.policies.resolve(scope["path"])
+        if policy is not None and policy.scope == "user":
+            scope.setdefault("state", {})["rate_limit"] = (self.limiter, policy)
+            await self.app(scope, receive, send)
+            return
+        if policy is None or self.limiter.allow(self.key_func(scope, policy), policy):
+            await self.app(scope, receive, send)
+            return
+        retry_after = str(policy.retry_after()).encode("latin-1")
+        await send(
+            {
+                "type": "http.response.start",
+                "status": 429,
+                "headers": [(b"content-type", b"text/plain; charset=utf-8"), (b"retry-after", retry_after)],
+            }
+        )
+        await send({"type": "http.response.body", "body": b"Too Many Requests"})
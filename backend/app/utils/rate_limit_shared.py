@@ -0,0 +1,378 @@
+"""Rate limiting shared across workers (shared memory) or instances (DynamoDB).
+
+Each process pre-aggregates hits locally and pushes them to the shared store
+in batches, so ``allow()`` is a dict update on the request path. Counters are
+fixed windows of ``policy.window`` seconds; a key's decision uses the last
+synced fleet-wide total plus this process's unsynced hits, so the fleet can
+overshoot a limit by at most one batch per process. Batches shrink as a
+window fills up, which keeps that overshoot small near the limit.
+"""
+import abc
+import hashlib
+import math
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from app.utils.rate_limit import RatePolicy
+
+try:  # POSIX only; the shared-memory store is unavailable elsewhere
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+CounterKey = Tuple[str, str, int]  # (policy name, client key, window index)
+
+
+class CounterStore(abc.ABC):
+    """Backend interface: add deltas to window counters, return new totals."""
+
+    # Stores that answer in microseconds are synced inline; remote ones from a thread
+    remote = False
+
+    @abc.abstractmethod
+    def incr(self, deltas: Dict[CounterKey, int], window_seconds: Dict[CounterKey, float]) -> Dict[CounterKey, int]:
+        """Add each delta to its counter; ``window_seconds`` gives each key's window length."""
+
+
+class LocalCounterStore(CounterStore):
+    """In-process store; equivalent to a single worker. Used in tests."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts: Dict[CounterKey, int] = {}
+
+    def incr(self, deltas, window_seconds):
+        with self._lock:
+            totals = {}
+            for key, delta in deltas.items():
+                self._counts[key] = self._counts.get(key, 0) + delta
+                totals[key] = self._counts[key]
+            return totals
+
+
+class SharedMemoryCounterStore(CounterStore):
+    """Counters in a memory-mapped file shared by the workers on one host.
+
+    The file is a fixed open-addressed table of ``slots`` records
+    ``(key digest, window index, expiry epoch, count)``. A record is reused
+    once its window has ended; the expiry is stored because windows of
+    different policies have different lengths, so their indices are not
+    comparable. Updates take an exclusive ``flock`` for the duration of one
+    batch.
+
+    The file is opened on first use in each process: descriptors inherited
+    across a fork share one open file description, and ``flock`` does not
+    exclude holders of the same description from each other.
+    """
+
+    _HEADER = struct.Struct("<8sQ")
+    _MAGIC = b"LTRL0002"
+    _RECORD = struct.Struct("<QqqQ")
+    _PROBES = 16
+
+    def __init__(self, path: str, slots: int = 65536):
+        if fcntl is None:
+            raise RuntimeError("SharedMemoryCounterStore requires fcntl (POSIX)")
+        self.path = path
+        self.slots = slots
+        self._size = self._HEADER.size + slots * self._RECORD.size
+        self._fd: Optional[int] = None
+        self._map: Optional[mmap.mmap] = None
+        self._pid: Optional[int] = None
+        self._lock = threading.Lock()  # flock is per open file, not per thread
+        self.dropped = 0
+
+    def _ensure_open(self) -> None:
+        """Open (or, in a forked child, reopen) the file; call with ``_lock`` held."""
+        if self._pid == os.getpid():
+            return
+        self._release()
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            if os.fstat(fd).st_size < self._size:
+                os.ftruncate(fd, self._size)
+            counters = mmap.mmap(fd, self._size)
+            if self._HEADER.unpack_from(counters, 0) != (self._MAGIC, self.slots):
+                # New file, or one laid out by another version or slot count
+                counters[:] = bytes(self._size)
+                self._HEADER.pack_into(counters, 0, self._MAGIC, self.slots)
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        except Exception:
+            os.close(fd)
+            raise
+        self._fd = fd
+        self._map = counters
+        self._pid = os.getpid()
+
+    @staticmethod
+    def _digest(policy: str, key: str) -> int:
+        raw = hashlib.blake2b(f"{policy}\x00{key}".encode("utf-8"), digest_size=8).digest()
+        return int.from_bytes(raw, "little") or 1  # 0 marks an empty slot
+
+    def _add(self, digest: int, window: int, expires_at: int, delta: int, now: float) -> int:
+        record = self._RECORD
+        home = digest % self.slots
+        reusable = None
+        for probe in range(self._PROBES):
+            offset = self._HEADER.size + ((home + probe) % self.slots) * record.size
+            slot_digest, slot_window, slot_expires, count = record.unpack_from(self._map, offset)
+            if slot_digest == digest and slot_window == window:
+                record.pack_into(self._map, offset, digest, window, slot_expires, count + delta)
+                return count + delta
+            if reusable is None and (slot_digest == 0 or slot_expires <= now):
+                reusable = offset
+        if reusable is None:
+            # Neighbourhood full of live counters: fail open for this key
+            self.dropped += 1
+            return delta
+        record.pack_into(self._map, reusable, digest, window, expires_at, delta)
+        return delta
+
+    def incr(self, deltas, window_seconds):
+        now = time.time()
+        with self._lock:
+            self._ensure_open()
+            fcntl.flock(self._fd, fcntl.LOCK_EX)
+            try:
+                return {
+                    key: self._add(
+                        self._digest(key[0], key[1]),
+                        key[2],
+                        math.ceil((key[2] + 1) * window_seconds[key]),
+                        delta,
+                        now,
+                    )
+                    for key, delta in deltas.items()
+                }
+            finally:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+
+    def _release(self) -> None:
+        if self._map is not None:
+            self._map.close()
+        if self._fd is not None:
+            os.close(self._fd)
+        self._map = self._fd = self._pid = None
+
+    def close(self) -> None:
+        with self._lock:
+            self._release()
+
+
+class DynamoCounterStore(CounterStore):
+    """Fleet-wide counters as DynamoDB items updated with atomic ``ADD``.
+
+    One ``UpdateItem`` per key per batch. Items carry an ``expires_at`` TTL
+    attribute so old windows are cleaned up by DynamoDB.
+    """
+
+    remote = True
+
+    def __init__(self, table):
+        self.table = table
+
+    def incr(self, deltas, window_seconds):
+        totals = {}
+        for key, delta in deltas.items():
+            policy, client, window = key
+            window_len = window_seconds[key]
+            resp = self.table.update_item(
+                Key={"limit_key": f"{policy}#{client}#{window}"},
+                UpdateExpression="ADD hits :n SET expires_at = if_not_exists(expires_at, :exp)",
+                ExpressionAttributeValues={":n": delta, ":exp": int((window + 2) * window_len)},
+                ReturnValues="UPDATED_NEW",
+            )
+            totals[key] = int(resp["Attributes"]["hits"])
+        return totals
+
+
+class _Counter:
+    __slots__ = ("synced", "pending", "in_flight", "last_sync")
+
+    def __init__(self, now: float):
+        self.synced = 0  # fleet-wide total as of the last sync
+        self.pending = 0  # local hits not yet sent
+        self.in_flight = 0  # local hits sent but not yet acknowledged
+        self.last_sync = now
+
+
+class SharedRateLimiter:
+    """Limiter whose counts are shared through a :class:`CounterStore`.
+
+    Same ``allow(key, policy)`` interface as :class:`RateLimiter`. Every
+    policy is enforced as ``limit`` hits per fixed ``window`` (token bucket
+    ``burst`` does not apply). Hits are sent to the store once ``sync_batch``
+    accumulate for a key, or ``sync_interval`` seconds after the last sync.
+    Store errors fail open: the process keeps enforcing its local view.
+    """
+
+    def __init__(
+        self,
+        store: CounterStore,
+        sync_batch: int = 20,
+        sync_interval: float = 0.5,
+        max_keys: int = 100_000,
+    ):
+        self.store = store
+        self.sync_batch = max(1, sync_batch)
+        self.sync_interval = sync_interval
+        self.max_keys = max_keys
+        self._lock = threading.Lock()
+        self._counters: "OrderedDict[CounterKey, _Counter]" = OrderedDict()
+        self._windows: Dict[CounterKey, float] = {}
+        self._stats = {"allowed": 0, "denied": 0, "syncs": 0, "synced_hits": 0, "sync_errors": 0}
+        self._wake = threading.Event()
+        self._syncer: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        self._last_full_sync = 0.0
+
+    def _batch_size(self, policy: RatePolicy, used: int) -> int:
+        # Near the limit, sync every few hits so other processes see them quickly
+        return max(1, min(self.sync_batch, (policy.limit - used) // 10))
+
+    def allow(self, key: str, policy: RatePolicy, now: Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        counter_key = (policy.name, key, int(now // policy.window))
+        with self._lock:
+            counter = self._counters.get(counter_key)
+            if counter is None:
+                counter = _Counter(now)
+                self._counters[counter_key] = counter
+                self._windows[counter_key] = policy.window
+                self._evict_locked()
+            else:
+                self._counters.move_to_end(counter_key)
+            used = counter.synced + counter.pending + counter.in_flight
+            if used >= policy.limit:
+                self._stats["denied"] += 1
+                return False
+            counter.pending += 1
+            self._stats["allowed"] += 1
+            due = counter.pending >= self._batch_size(policy, used) or now - counter.last_sync >= self.sync_interval
+        if due:
+            if self.store.remote:
+                self._ensure_syncer()
+                self._wake.set()
+            elif now - self._last_full_sync >= self.sync_interval:
+                self.sync(now)
+            else:
+                # Inline store: only the key at hand; other keys' hits wait for the periodic full sync
+                self.sync(now, keys=[counter_key])
+        return True
+
+    def _evict_locked(self) -> None:
+        # Dropping a counter with unsynced hits only errs towards allowing
+        while len(self._counters) > self.max_keys:
+            old_key, _ = self._counters.popitem(last=False)
+            self._windows.pop(old_key, None)
+
+    def sync(self, now: Optional[float] = None, keys: Optional[List[CounterKey]] = None) -> None:
+        """Push pending hits (of ``keys``, or all) to the store and refresh the synced totals."""
+        now = time.time() if now is None else now
+        with self._lock:
+            if keys is None:
+                self._last_full_sync = now
+                candidates = list(self._counters.items())
+            else:
+                candidates = [(k, self._counters[k]) for k in keys if k in self._counters]
+            deltas = {k: c.pending for k, c in candidates if c.pending}
+            windows = {k: self._windows.get(k, 1.0) for k in deltas}
+            for k, delta in deltas.items():
+                counter = self._counters[k]
+                counter.pending = 0
+                counter.in_flight += delta
+        if not deltas:
+            return
+        try:
+            totals = self.store.incr(deltas, windows)
+        except Exception as exc:
+            with self._lock:
+                self._stats["sync_errors"] += 1
+                for k, delta in deltas.items():
+                    counter = self._counters.get(k)
+                    if counter is not None:
+                        # Count them locally so this process still enforces its share
+                        counter.in_flight -= delta
+                        counter.synced += delta
+                        counter.last_sync = now
+            print(f"[rate-limit] shared store sync failed: {exc}")
+            return
+        with self._lock:
+            self._stats["syncs"] += 1
+            self._stats["synced_hits"] += sum(deltas.values())
+            for k, delta in deltas.items():
+                counter = self._counters.get(k)
+                if counter is None:
+                    continue
+                counter.in_flight -= delta
+                counter.synced = max(counter.synced, totals.get(k, 0))
+                counter.last_sync = now
+            if keys is not None:
+                return
+            # Counters of finished windows with nothing left to send are no longer needed
+            stale = [
+                k for k, c in self._counters.items()
+                if not c.pending and not c.in_flight and (k[2] + 1) * self._windows[k] <= now
+            ]
+            for k in stale:
+                del self._counters[k]
+                self._windows.pop(k, None)
+
+    def _ensure_syncer(self) -> None:
+        if self._syncer is not None and self._syncer.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._syncer is not None and self._syncer.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._syncer = threading.Thread(target=self._run_syncer, name="rate-limit-sync", daemon=True)
+            self._syncer.start()
+
+    def _run_syncer(self) -> None:  # pragma: no cover - background loop
+        while True:
+            self._wake.wait(self.sync_interval)
+            self._wake.clear()
+            self.sync()
+
+    def __len__(self) -> int:
+        return len(self._counters)
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["keys"] = len(self._counters)
+            stats["pending"] = sum(c.pending for c in self._counters.values())
+        return stats
+
+
+def limiter_from_env():
+    """Build the limiter selected by ``RATE_LIMIT_BACKEND`` (local|shm|dynamodb)."""
+    from app.utils.rate_limit import RateLimiter
+
+    backend = os.getenv("RATE_LIMIT_BACKEND", "local").lower()
+    max_keys = int(os.getenv("RATE_LIMIT_MAX_KEYS", "200000"))
+    if backend == "local":
+        return RateLimiter(shards=int(os.getenv("RATE_LIMIT_SHARDS", "64")), max_keys=max_keys)
+    if backend == "shm":
+        store: CounterStore = SharedMemoryCounterStore(
+            os.getenv("RATE_LIMIT_SHM_PATH", "/dev/shm/landten-rate-limit"),
+            slots=int(os.getenv("RATE_LIMIT_SHM_SLOTS", "65536")),
+        )
+    elif backend == "dynamodb":
+        from app.deps.dynamo import get_table
+
+        store = DynamoCounterStore(get_table("rate_limits"))
+    else:
+        raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+    return SharedRateLimiter(
+        store,
+        sync_batch=int(os.getenv("RATE_LIMIT_SYNC_BATCH", "20")),
+        sync_interval=float(os.getenv("RATE_LIMIT_SYNC_INTERVAL", "0.5")),
+        max_keys=max_keys,
+    )
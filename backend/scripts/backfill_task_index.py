@@ -0,0 +1,37 @@
+"""Backfill the composite status_created_at key used by the task GSIs.
+
+Run from ``backend/``::
+
+    python -m scripts.backfill_task_index [--dry-run]
+
+Tasks written before the persona/assignee indexes existed lack the sort key
+and would not show up in /task/list until this runs. Safe to re-run.
+"""
+import argparse
+
+from app.repos.task_repo import SORT_KEY, TaskRepo, _sort_key
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="Count only; write nothing")
+    args = parser.parse_args()
+
+    repo = TaskRepo()
+    scanned = 0
+    updated = 0
+    for page in repo.iter_all_tasks(page_size=args.page_size):
+        for item in page:
+            scanned += 1
+            if args.dry_run:
+                updated += item.get(SORT_KEY) != _sort_key(item.get("status"), item.get("created_at"))
+            elif repo.backfill_sort_key(item):
+                updated += 1
+        print(f"[backfill] {scanned} tasks scanned, {updated} updated so far")
+    action = "would update" if args.dry_run else "updated"
+    print(f"[backfill] done: {scanned} tasks scanned, {action} {updated}")
+
+
+if __name__ == "__main__":
+    main()
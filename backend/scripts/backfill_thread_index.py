@@ -0,0 +1,37 @@
+"""Backfill the thread_members index from the existing threads table.
+
+Run from ``backend/`` with the usual AWS/TABLE_PREFIX/STAGE environment::
+
+    python -m scripts.backfill_thread_index [--dry-run]
+
+Idempotent: adjacency items are overwritten by (user_id, thread_id), and
+``last_activity_at`` falls back to the thread's ``created_at``.
+"""
+import argparse
+
+from app.repos.thread_repo import ThreadRepo
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--page-size", type=int, default=200)
+    parser.add_argument("--dry-run", action="store_true", help="Count only; write nothing")
+    args = parser.parse_args()
+
+    repo = ThreadRepo()
+    threads = 0
+    entries = 0
+    for page in repo.iter_all_threads(page_size=args.page_size):
+        for thread in page:
+            threads += 1
+            if args.dry_run:
+                entries += len(set(thread.get("participants") or []))
+            else:
+                entries += repo.index_thread(thread)
+        print(f"[backfill] {threads} threads, {entries} index entries so far")
+    action = "would write" if args.dry_run else "wrote"
+    print(f"[backfill] done: {threads} threads, {action} {entries} index entries")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Per-request DynamoDB setup overhead: fresh boto3 resource vs shared registry.
+
+Run from ``backend/``::
+
+    python -m scripts.bench_dynamo_resource --iterations 200
+
+No AWS calls are made; this measures only the construction cost every request
+used to pay before touching the network (session, credential chain, endpoint
+resolution, connection pool).
+"""
+import argparse
+import os
+import time
+
+import boto3
+from botocore.config import Config
+
+from app.deps.dynamo import get_table, reset_dynamo_resources, table_name
+
+
+def _legacy_repo_setup():
+    region = os.getenv("AWS_REGION", os.getenv("AWS_DEFAULT_REGION", "us-east-1"))
+    cfg = Config(retries={"max_attempts": 3, "mode": "standard"})
+    resource = boto3.resource("dynamodb", region_name=region, config=cfg)
+    return resource.Table(table_name("chat_messages"))
+
+
+def _pooled_repo_setup():
+    return get_table("chat_messages")
+
+
+def _bench(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        fn()
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    os.environ.setdefault("AWS_ACCESS_KEY_ID", "bench")
+    os.environ.setdefault("AWS_SECRET_ACCESS_KEY", "bench")
+
+    legacy_ms = _bench(_legacy_repo_setup, args.iterations)
+    reset_dynamo_resources()
+    cold_start = time.perf_counter()
+    _pooled_repo_setup()
+    cold_ms = (time.perf_counter() - cold_start) * 1000
+    pooled_ms = _bench(_pooled_repo_setup, args.iterations)
+
+    print(f"iterations:                 {args.iterations:10d}")
+    print(f"per-request boto3.resource: {legacy_ms:10.3f} ms/request")
+    print(f"shared registry (cold):     {cold_ms:10.3f} ms once per process")
+    print(f"shared registry (warm):     {pooled_ms:10.3f} ms/request")
+    if pooled_ms > 0:
+        print(f"speedup:                    {legacy_ms / pooled_ms:10.1f}x")
+
+
+if __name__ == "__main__":
+    main()
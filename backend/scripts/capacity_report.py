@@ -0,0 +1,70 @@
+"""Rank endpoints by DynamoDB capacity consumed, from a running instance's /metrics.
+
+Run from ``backend/``::
+
+    python -m scripts.capacity_report --url https://api.example.com/metrics [--token T] [--by method]
+
+Counters are cumulative since the process started, so compare two runs (or
+use Prometheus ``increase()``) for a time window. ``--file`` reads a saved
+scrape instead of fetching one.
+"""
+import argparse
+import re
+import urllib.request
+from typing import Dict, Iterable, Tuple
+
+_LINE = re.compile(r"^dynamodb_(consumed_capacity_units|capacity_calls)_total\{(?P<labels>[^}]*)\} (?P<value>\S+)$")
+_LABEL = re.compile(r'(\w+)="((?:[^"\\]|\\.)*)"')
+
+
+def parse(lines: Iterable[str], by: str) -> Dict[str, Dict[str, float]]:
+    totals: Dict[str, Dict[str, float]] = {}
+    for line in lines:
+        match = _LINE.match(line.strip())
+        if not match:
+            continue
+        labels = dict(_LABEL.findall(match.group("labels")))
+        entry = totals.setdefault(labels.get(by, "?"), {"read": 0.0, "write": 0.0, "calls": 0.0})
+        value = float(match.group("value"))
+        if match.group(1) == "capacity_calls":
+            entry["calls"] += value
+        else:
+            entry[labels.get("kind", "read")] += value
+    return totals
+
+
+def ranked(totals: Dict[str, Dict[str, float]]) -> Iterable[Tuple[str, Dict[str, float]]]:
+    return sorted(totals.items(), key=lambda kv: kv[1]["read"] + kv[1]["write"], reverse=True)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--url", help="Full /metrics URL")
+    source.add_argument("--file", help="Saved /metrics output")
+    parser.add_argument("--token", help="METRICS_TOKEN of the instance, if set")
+    parser.add_argument("--by", choices=("route", "method", "table"), default="route")
+    parser.add_argument("--top", type=int, default=20)
+    args = parser.parse_args()
+
+    if args.file:
+        with open(args.file, encoding="utf-8") as fh:
+            text = fh.read()
+    else:
+        request = urllib.request.Request(args.url)
+        if args.token:
+            request.add_header("Authorization", f"Bearer {args.token}")
+        with urllib.request.urlopen(request, timeout=10) as resp:
+            text = resp.read().decode("utf-8")
+
+    rows = list(ranked(parse(text.splitlines(), args.by)))
+    grand = sum(v["read"] + v["write"] for _, v in rows) or 1.0
+    rows = rows[: args.top]
+    print(f"{args.by:<48} {'RCU':>10} {'WCU':>10} {'calls':>8} {'share':>6}")
+    for name, v in rows:
+        share = (v["read"] + v["write"]) / grand * 100
+        print(f"{name[:48]:<48} {v['read']:>10.1f} {v['write']:>10.1f} {int(v['calls']):>8} {share:>5.1f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+import asyncio
+import json
+
+from types import SimpleNamespace
+
+import httpx
+from fastapi.testclient import TestClient
+from openai import AsyncOpenAI
+
+from app.deps.rate_limit import enforce_user_rate_limit
+from app.main import app
+from app.routes import chat_stream
+from app.routes.chat_stream import verify_firebase_token
+from app.services import ai_service
+from app.services.agent_scheduler import AgentScheduler
+
+
+def _fake_completion_server(words):
+    """OpenAI-compatible /chat/completions that streams ``words`` as SSE chunks."""
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(json.loads(request.content))
+        lines = []
+        for word in words:
+            chunk = {
+                "id": "c1",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "fake",
+                "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}],
+            }
+            lines.append(f"data: {json.dumps(chunk)}\n\n")
+        lines.append("data: [DONE]\n\n")
+        return httpx.Response(200, headers={"content-type": "text/event-stream"}, content="".join(lines).encode())
+
+    client = AsyncOpenAI(
+        api_key="test",
+        base_url="http://fake-openai.local/v1",
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler)),
+    )
+    return client, requests
+
+
+class FakeAsyncChannel:
+    def __init__(self, stream, channel_id):
+        self.stream = stream
+        self.channel_id = channel_id
+
+    async def send_message(self, message, user_id):
+        if self.stream.send_error is not None:
+            raise self.stream.send_error
+        self.stream.sent.append((self.channel_id, message["text"], user_id))
+
+
+class FakeAsyncStream:
+    def __init__(self, send_error=None):
+        self.sent = []
+        self.send_error = send_error
+
+    async def upsert_user(self, payload):
+        pass
+
+    def channel(self, channel_type, channel_id):
+        return FakeAsyncChannel(self, channel_id)
+
+
+def _events(text):
+    for block in text.strip().split("\n\n"):
+        name, data = block.split("\n", 1)
+        yield name[len("event: "):], json.loads(data[len("data: "):])
+
+
+def _post_stream_reply(monkeypatch, openai_client, stream, prompt="Water everywhere"):
+    async def get_fake():
+        return stream
+
+    monkeypatch.setattr(ai_service, "_async_openai_client", openai_client)
+    monkeypatch.setattr(chat_stream, "_get_async_stream_client", get_fake)
+    app.dependency_overrides[verify_firebase_token] = lambda: "token"
+    app.dependency_overrides[enforce_user_rate_limit] = lambda: "token"
+    try:
+        return TestClient(app).post(
+            "/chat/stream/agent_reply/stream",
+            json={"channel_id": "unit-1", "prompt": prompt, "persona": "tenant"},
+        )
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_tokens_are_forwarded_and_the_reply_is_posted_once(monkeypatch):
+    openai_client, requests = _fake_completion_server(["Turn ", "off ", "the ", "valve."])
+    stream = FakeAsyncStream()
+    resp = _post_stream_reply(monkeypatch, openai_client, stream)
+
+    assert resp.headers["content-type"].startswith("text/event-stream")
+    events = list(_events(resp.text))
+    assert [data["text"] for name, data in events if name == "token"] == ["Turn ", "off ", "the ", "valve."]
+    assert events[-1] == ("done", {"status": "sent", "agent_id": chat_stream.AGENT_USER_ID, "message": "Turn off the valve."})
+    assert stream.sent == [("unit-1", "Turn off the valve.", chat_stream.AGENT_USER_ID)]
+    assert requests[0]["stream"] is True
+    assert "tenant persona" in requests[0]["messages"][0]["content"]
+
+
+def test_a_non_stream_post_failure_ends_with_an_error_event(monkeypatch):
+    openai_client, _ = _fake_completion_server(["Call ", "a plumber."])
+    stream = FakeAsyncStream(send_error=asyncio.TimeoutError())
+    resp = _post_stream_reply(monkeypatch, openai_client, stream, prompt="The tap will not stop")
+
+    name, data = list(_events(resp.text))[-1]
+    assert name == "error"
+    assert data["message"] == "Call a plumber."
+    assert stream.sent == []
+
+
+class _BreaksAfterFirstChunk:
+    """AsyncOpenAI stand-in whose stream fails after one delta."""
+
+    def __init__(self, first):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.first = first
+
+    async def create(self, **kwargs):
+        async def chunks():
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=self.first))])
+            raise ConnectionError("connection reset mid-stream")
+
+        return chunks()
+
+
+def test_a_stream_broken_after_the_first_chunk_is_not_posted(monkeypatch):
+    stream = FakeAsyncStream()
+    resp = _post_stream_reply(monkeypatch, _BreaksAfterFirstChunk("Do not "), stream, prompt="Should I unplug it")
+
+    events = list(_events(resp.text))
+    assert events[0] == ("token", {"text": "Do not "})
+    assert events[-1][0] == "error"
+    assert [name for name, _ in events].count("done") == 0
+    assert stream.sent == []
+
+
+def test_streamed_reply_is_refused_when_no_agent_slot_frees(monkeypatch):
+    openai_client, requests = _fake_completion_server(["never sent"])
+    monkeypatch.setattr(chat_stream, "agent_scheduler", AgentScheduler(max_concurrency=0, admission_timeout=0.01))
+    stream = FakeAsyncStream()
+    resp = _post_stream_reply(monkeypatch, openai_client, stream, prompt="Is the pool open")
+
+    assert list(_events(resp.text)) == [("error", {"detail": "Agent is busy, try again shortly", "retry_after": 1})]
+    assert requests == [] and stream.sent == []
@@ -0,0 +1,131 @@
+import asyncio
+import threading
+import time
+
+from app.services.agent_scheduler import (
+    EMERGENCY,
+    ROUTINE,
+    URGENT,
+    AgentScheduler,
+    ChannelPriorityHints,
+    priority_for,
+)
+from app.services.webhook_queue import DurableEventQueue
+
+
+def test_priority_classes_follow_classify_issue():
+    assert priority_for("I smell gas in the kitchen") == EMERGENCY
+    assert priority_for("small leak under the sink") == URGENT
+    assert priority_for("when is rent due?") == ROUTINE
+    assert priority_for("it got worse", "location: basement; severity: flooding") == EMERGENCY
+
+
+def _run(scheduler, priority, order, name):
+    with scheduler.slot(priority):
+        order.append(name)
+
+
+def _saturate(scheduler, order, submissions, settle=0.02):
+    """Hold the only slot, queue ``submissions`` in order, then release and record admission order."""
+    release = threading.Event()
+    holder_in = threading.Event()
+
+    def holder():
+        with scheduler.slot(ROUTINE):
+            holder_in.set()
+            release.wait()
+
+    threads = [threading.Thread(target=holder)]
+    threads[0].start()
+    holder_in.wait()
+    for name, priority in submissions:
+        thread = threading.Thread(target=_run, args=(scheduler, priority, order, name))
+        threads.append(thread)
+        thread.start()
+        time.sleep(settle)  # deterministic queueing order
+    return release, threads
+
+
+def test_emergencies_jump_the_queue_when_saturated():
+    scheduler = AgentScheduler(max_concurrency=1, aging_seconds=60)
+    order = []
+    release, threads = _saturate(
+        scheduler, order, [("chat-1", ROUTINE), ("chat-2", ROUTINE), ("leak", URGENT), ("gas", EMERGENCY)]
+    )
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert order == ["gas", "leak", "chat-1", "chat-2"]
+    stats = scheduler.stats()
+    assert stats[EMERGENCY]["admitted"] == 1 and stats[ROUTINE]["admitted"] == 3
+    assert stats[ROUTINE]["queue_wait_ms_max"] >= stats[EMERGENCY]["queue_wait_ms_max"]
+
+
+def test_aging_prevents_starvation():
+    # One class per 50 ms: a routine request queued 0.2 s ago beats a fresh emergency
+    scheduler = AgentScheduler(max_concurrency=1, aging_seconds=0.05)
+    order = []
+    release, threads = _saturate(scheduler, order, [("old-chat", ROUTINE)], settle=0.2)
+    gas = threading.Thread(target=_run, args=(scheduler, EMERGENCY, order, "gas"))
+    gas.start()
+    time.sleep(0.02)
+    release.set()
+    for thread in threads + [gas]:
+        thread.join()
+    assert order == ["old-chat", "gas"]
+    assert scheduler.stats()[ROUTINE]["aged"] == 1
+
+
+def test_webhook_queue_claims_urgent_channels_first(tmp_path):
+    queue = DurableEventQueue(str(tmp_path / "events.sqlite3"))
+    queue.enqueue("messaging:a", {"text": "rent?"}, "m1", priority=2)
+    queue.enqueue("messaging:b", {"text": "gas!"}, "m2", priority=0)
+    queue.enqueue("messaging:b", {"text": "still gas"}, "m3", priority=0)
+    claimed = queue.claim(2)
+    assert [event["payload"]["text"] for event in claimed] == ["gas!", "rent?"]
+
+
+def test_webhook_queue_ages_routine_heads_past_fresh_emergencies(tmp_path):
+    queue = DurableEventQueue(str(tmp_path / "events.sqlite3"), aging=0.05)
+    queue.enqueue("messaging:a", {"text": "rent?"}, "m1", priority=2)
+    time.sleep(0.2)
+    queue.enqueue("messaging:b", {"text": "gas!"}, "m2", priority=0)
+    assert [event["payload"]["text"] for event in queue.claim(2)] == ["rent?", "gas!"]
+
+
+def test_priority_hints_classify_follow_ups_with_the_channels_report():
+    hints = ChannelPriorityHints()
+    hints.remember("messaging:a", ["location: basement; severity: flooding"])
+    assert hints.priority_for("messaging:a", "yes, basement") == EMERGENCY
+    assert hints.priority_for("messaging:b", "yes, basement") == ROUTINE
+    hints.remember("messaging:a", [])  # discovery finished
+    assert hints.priority_for("messaging:a", "yes, basement") == ROUTINE
+
+
+def test_async_slots_wait_off_the_loop_by_priority_and_cancel_cleanly():
+    scheduler = AgentScheduler(max_concurrency=1, aging_seconds=60)
+    order = []
+
+    async def reply(name, priority):
+        async with scheduler.aslot(priority, timeout=2):
+            order.append(name)
+
+    async def main():
+        with scheduler.slot(ROUTINE):
+            chat = asyncio.create_task(reply("chat", ROUTINE))
+            await asyncio.sleep(0.02)
+            gas = asyncio.create_task(reply("gas", EMERGENCY))
+            abandoned = asyncio.create_task(reply("abandoned", URGENT))
+            ticks = 0
+            for _ in range(5):  # the loop keeps running while they wait
+                await asyncio.sleep(0.01)
+                ticks += 1
+            abandoned.cancel()
+            await asyncio.sleep(0.02)
+        await asyncio.gather(chat, gas)
+        return ticks
+
+    assert asyncio.run(main()) == 5
+    assert order == ["gas", "chat"]
+    time.sleep(0.02)
+    assert scheduler.stats()["active"] == 0
@@ -0,0 +1,100 @@
+import base64
+import json
+import time
+from types import SimpleNamespace
+
+import pytest
+from fastapi import HTTPException
+
+from app.deps import auth
+
+
+class FakeFirebaseAuth:
+    def __init__(self, exp_in=3600):
+        self.calls = 0
+        self.exp_in = exp_in
+
+    def verify_id_token(self, token):
+        self.calls += 1
+        if token == "bad":
+            raise ValueError("bad token")
+        return {"uid": f"uid-{token}", "exp": time.time() + self.exp_in}
+
+
+@pytest.fixture
+def fake_firebase(monkeypatch):
+    fake = FakeFirebaseAuth()
+    monkeypatch.setattr(auth, "fb_auth", fake, raising=False)
+    monkeypatch.setattr(auth, "_firebase_ready", True)
+    auth._token_cache.clear()
+    return fake
+
+
+def test_verified_token_is_served_from_cache(fake_firebase):
+    assert auth._verify_with_firebase("tok") == "uid-tok"
+    assert auth._verify_with_firebase("tok") == "uid-tok"
+    assert fake_firebase.calls == 1
+    assert auth.auth_stats()["cache_hits"] >= 1
+
+
+def test_expired_tokens_are_not_cached(fake_firebase):
+    fake_firebase.exp_in = 1  # inside the expiry skew
+    auth._verify_with_firebase("short")
+    auth._verify_with_firebase("short")
+    assert fake_firebase.calls == 2
+
+
+def test_invalid_token_is_rejected_every_time(fake_firebase):
+    for _ in range(2):
+        with pytest.raises(HTTPException) as exc:
+            auth._verify_with_firebase("bad")
+        assert exc.value.status_code == 401
+    assert fake_firebase.calls == 2
+
+
+class FakeCertFetchError(Exception):
+    pass
+
+
+class FakeInvalidTokenError(Exception):
+    pass
+
+
+def _decode(segment):
+    return json.loads(base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4)))
+
+
+class ProbingFirebaseAuth:
+    """verify_id_token as the SDK runs it for the cert probe: claims checked, then certs fetched."""
+
+    CertificateFetchError = FakeCertFetchError
+    InvalidIdTokenError = FakeInvalidTokenError
+
+    def __init__(self, fetch_fails=False):
+        self.fetch_fails = fetch_fails
+        self.claims = None
+
+    def verify_id_token(self, token, app=None):
+        header, claims, _ = token.split(".")
+        assert _decode(header)["alg"] == "RS256" and _decode(header)["kid"]
+        self.claims = _decode(claims)
+        if self.fetch_fails:
+            raise FakeCertFetchError("network down")
+        raise FakeInvalidTokenError("Certificate for key id landten-cert-probe not found.")
+
+
+def test_cert_prefetch_goes_through_public_verify(monkeypatch):
+    fake = ProbingFirebaseAuth()
+    monkeypatch.setattr(auth, "fb_auth", fake, raising=False)
+    monkeypatch.setattr(
+        auth, "firebase_admin", SimpleNamespace(get_app=lambda: SimpleNamespace(project_id="landten")), raising=False
+    )
+    before = auth.auth_stats()
+    auth._prefetch_signing_certs()
+    assert fake.claims["aud"] == "landten"
+    assert fake.claims["iss"] == "https://securetoken.google.com/landten"
+    assert auth.auth_stats()["cert_refreshes"] == before["cert_refreshes"] + 1
+
+    fake.fetch_fails = True
+    auth._prefetch_signing_certs()
+    assert auth.auth_stats()["cert_refresh_failures"] == before["cert_refresh_failures"] + 1
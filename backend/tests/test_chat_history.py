@@ -0,0 +1,109 @@
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.deps.repos import get_chat_repo
+from app.repos.chat_repo import ChatRepo
+from app.repos.pagination import encode_cursor
+
+client = TestClient(app)
+
+
+class FakeChatTable:
+    """Just enough of DynamoDB Query semantics: Limit, ExclusiveStartKey, order."""
+
+    def __init__(self, items):
+        self.items = sorted(items, key=lambda i: i["timestamp"])
+        self.calls = 0
+
+    def query(self, **kwargs):
+        self.calls += 1
+        values = kwargs["ExpressionAttributeValues"]
+        rows = [i for i in self.items if i["thread_id"] == values[":tid"]]
+        if ":before" in values:
+            rows = [i for i in rows if i["timestamp"] <= values[":before"]]
+        if ":after" in values:
+            rows = [i for i in rows if i["timestamp"] >= values[":after"]]
+        if "BETWEEN" not in kwargs["KeyConditionExpression"]:
+            rows = [i for i in rows if i["timestamp"] not in (values.get(":before"), values.get(":after"))]
+        if not kwargs.get("ScanIndexForward", True):
+            rows = list(reversed(rows))
+        start = kwargs.get("ExclusiveStartKey")
+        if start:
+            idx = next(n for n, i in enumerate(rows) if i["timestamp"] == start["timestamp"])
+            rows = rows[idx + 1:]
+        limit = kwargs.get("Limit")
+        resp = {"Items": rows[:limit] if limit else rows}
+        if limit and len(rows) > limit:
+            last = rows[limit - 1]
+            resp["LastEvaluatedKey"] = {"thread_id": last["thread_id"], "timestamp": last["timestamp"]}
+        return resp
+
+
+def _repo_with(items):
+    repo = ChatRepo()
+    repo.table = FakeChatTable(items)
+    return repo
+
+
+def _messages(n):
+    return [
+        {"thread_id": "t1", "timestamp": f"2024-01-01T00:00:{i:02d}Z", "message": f"m{i}"}
+        for i in range(n)
+    ]
+
+
+def test_history_pages_newest_first(monkeypatch):
+    monkeypatch.setenv("AUTH_DISABLED", "true")
+    app.dependency_overrides[get_chat_repo] = lambda: _repo_with(_messages(5))
+    try:
+        r = client.get("/chat/history/t1", params={"limit": 2, "order": "desc"})
+        body = r.json()
+        assert [m["message"] for m in body["messages"]] == ["m4", "m3"]
+        r2 = client.get("/chat/history/t1", params={"limit": 2, "order": "desc", "cursor": body["next_cursor"]})
+        assert [m["message"] for m in r2.json()["messages"]] == ["m2", "m1"]
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_history_without_limit_follows_last_evaluated_key():
+    repo = _repo_with(_messages(7))
+    pages = list(repo.iter_message_pages("t1", page_size=3))
+    assert [len(p) for p in pages] == [3, 3, 1]
+    assert len(repo.list_messages("t1")) == 7
+
+
+def test_history_ndjson_export(monkeypatch):
+    monkeypatch.setenv("AUTH_DISABLED", "true")
+    app.dependency_overrides[get_chat_repo] = lambda: _repo_with(_messages(4))
+    try:
+        r = client.get("/chat/history/t1", params={"format": "ndjson", "limit": 3, "after": "2024-01-01T00:00:00Z"})
+        lines = [json.loads(line) for line in r.text.splitlines()]
+        assert [m["message"] for m in lines] == ["m1", "m2", "m3"]
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_history_rejects_bad_cursor(monkeypatch):
+    monkeypatch.setenv("AUTH_DISABLED", "true")
+    r = client.get("/chat/history/t1", params={"cursor": "not-a-cursor!"})
+    assert r.status_code == 400
+
+
+def test_history_rejects_a_cursor_from_another_thread(monkeypatch):
+    monkeypatch.setenv("AUTH_DISABLED", "true")
+    repo = _repo_with(_messages(5) + [dict(m, thread_id="t2") for m in _messages(5)])
+    app.dependency_overrides[get_chat_repo] = lambda: repo
+    try:
+        first = client.get("/chat/history/t2", params={"limit": 2}).json()
+        assert first["next_cursor"]
+        r = client.get("/chat/history/t1", params={"limit": 2, "cursor": first["next_cursor"]})
+        assert r.status_code == 400
+        assert "different" in r.json()["detail"]
+        # Decodes fine but is not a message key
+        odd = encode_cursor({"thread_id": "t1"})
+        assert client.get("/chat/history/t1", params={"cursor": odd}).status_code == 400
+        assert repo.table.calls == 1
+    finally:
+        app.dependency_overrides.clear()
@@ -0,0 +1,59 @@
+from app.services import chatbot
+from app.services.conversation_context import ContextBuilder, estimate_tokens
+
+
+def _message(n, text=None, user="tenant"):
+    return {
+        "id": f"m{n}",
+        "created_at": f"2026-01-01T00:{n // 60:02d}:{n % 60:02d}Z",
+        "user": {"id": user},
+        "text": text or f"message number {n} about the leaking kitchen pipe",
+    }
+
+
+def test_context_stays_within_budget_as_the_conversation_grows():
+    calls = []
+
+    def summarize(previous, lines, max_tokens):
+        calls.append(len(lines))
+        head = f"summary covering {lines[-1].split()[3]}"
+        return head + " " + "x" * max(0, max_tokens * 4 - len(head) - 1)
+
+    builder = ContextBuilder(budget_tokens=200, summary_tokens=80, summarize=summarize)
+    history = [_message(0, "The leak is under the kitchen sink")]
+    sizes = []
+    for n in range(1, 300):
+        history.append(_message(n))
+        # Stream returns a window of the newest messages, like channel.query
+        context = builder.build("unit-1", history[-25:])
+        sizes.append(estimate_tokens(context))
+
+    assert max(sizes) <= 200 + 10  # headings
+    assert "summary covering" in context
+    # The summarizer runs when the summary fills up, not once per message
+    assert 0 < len(calls) < 299 / 3
+    assert builder.stats()["builds"] == 299
+
+
+def test_no_message_is_sent_twice():
+    builder = ContextBuilder(budget_tokens=60, summary_tokens=30)
+    history = [_message(n) for n in range(20)] + [_message(20, "same again"), _message(21, "same again")]
+    context = builder.build("unit-2", history)
+    lines = [line for line in context.splitlines() if line.startswith("tenant:")]
+    assert len(lines) == len(set(lines))
+    assert context.count("same again") == 1
+    # Already-summarized messages are not repeated in the next build
+    again = builder.build("unit-2", history)
+    assert again.count("message number 0 ") <= 1
+
+
+def test_agent_reply_sends_context_once(monkeypatch):
+    seen = {}
+
+    def fake_ai(message, persona=None, context=None):
+        seen.update(message=message, context=context)
+        return "ok"
+
+    monkeypatch.setattr(chatbot, "get_ai_response", fake_ai)
+    chatbot.agent_reply("Ask about the leak", "tenant: it drips", "tenant")
+    assert seen == {"message": "Ask about the leak", "context": "tenant: it drips"}
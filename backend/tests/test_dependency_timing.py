@@ -0,0 +1,62 @@
+import boto3
+import pytest
+from botocore.stub import Stubber
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.utils.dependency_timing import dependency_stats, instrument_boto_session, track
+from app.utils.metrics import MetricsMiddleware, RequestMetrics
+
+
+@pytest.fixture(autouse=True)
+def _reset_stats():
+    dependency_stats.reset()
+    yield
+    dependency_stats.reset()
+
+
+def test_request_breakdown_reaches_header_and_access_log():
+    log = []
+    demo = FastAPI()
+
+    @demo.get("/work")
+    def work():  # sync endpoint: runs in the threadpool
+        with track("stream", "channel.query"):
+            pass
+        with track("openai", "chat.completions"):
+            pass
+        return {"ok": True}
+
+    @demo.get("/boom")
+    def boom():
+        with track("stream", "send_message"):
+            raise RuntimeError("down")
+
+    demo.add_middleware(MetricsMiddleware, metrics=RequestMetrics(), access_log=log.append)
+    client = TestClient(demo, raise_server_exceptions=False)
+
+    response = client.get("/work")
+    header = response.headers["server-timing"]
+    assert header.startswith("app;dur=")
+    assert "stream.channel.query;dur=" in header and "openai.chat.completions;dur=" in header
+    assert set(log[0]["dependencies"]) == {"stream.channel.query", "openai.chat.completions"}
+
+    assert client.get("/boom").status_code == 500
+    stats = dependency_stats.stats()
+    assert stats["stream"]["send_message"]["errors"] == 1
+    assert stats["openai"]["chat.completions"]["calls"] == 1
+
+
+def test_boto_calls_are_timed_through_session_events():
+    session = boto3.session.Session(region_name="us-east-1", aws_access_key_id="x", aws_secret_access_key="y")
+    instrument_boto_session(session)
+    client = session.client("dynamodb")
+    with Stubber(client) as stub:
+        stub.add_response("get_item", {"Item": {"user_id": {"S": "u1"}}})
+        stub.add_client_error("put_item", service_error_code="ConditionalCheckFailedException")
+        client.get_item(TableName="t", Key={"user_id": {"S": "u1"}})
+        with pytest.raises(client.exceptions.ConditionalCheckFailedException):
+            client.put_item(TableName="t", Item={"user_id": {"S": "u1"}})
+    stats = dependency_stats.stats()["dynamodb"]
+    assert stats["GetItem"]["calls"] == 1 and stats["GetItem"]["errors"] == 0
+    assert stats["PutItem"]["errors"] == 1
@@ -0,0 +1,128 @@
+import boto3
+import pytest
+from botocore.stub import Stubber
+
+from app.repos.chat_repo import ChatRepo
+from app.repos.task_repo import TaskRepo
+from app.repos.thread_repo import MEMBERS_ACTIVITY_INDEX, ThreadRepo
+from app.utils.dependency_timing import begin_request, end_request
+from app.utils.dynamo_capacity import (
+    _repo_method,
+    CapacityBudgetExceeded,
+    capacity_budget,
+    capacity_stats,
+    instrument_capacity,
+    track_repo_methods,
+)
+
+
+def current_repo_method():
+    return _repo_method.get()
+
+
+@pytest.fixture
+def stubbed_table():
+    """Real boto3 Table on an instrumented session, responses served by a Stubber."""
+    session = boto3.session.Session(region_name="us-east-1", aws_access_key_id="x", aws_secret_access_key="y")
+    instrument_capacity(session)
+    resource = session.resource("dynamodb")
+    sent = []
+    resource.meta.client.meta.events.register(
+        "before-parameter-build.dynamodb", lambda params, **_: sent.append(params)
+    )
+
+    def make(name):
+        return resource.Table(name)
+
+    capacity_stats.reset()
+    with Stubber(resource.meta.client) as stub:
+        yield make, stub, sent
+    capacity_stats.reset()
+
+
+def _consumed(table, units):
+    return {"TableName": table, "CapacityUnits": units}
+
+
+def test_history_query_stays_within_budget_and_is_attributed(stubbed_table):
+    make, stub, sent = stubbed_table
+    repo = ChatRepo()
+    repo.table = make("chat_messages")
+    stub.add_response("query", {"Items": [], "Count": 0, "ConsumedCapacity": _consumed("chat_messages", 0.5)})
+
+    scope = {"route": type("Route", (), {"path": "/chat/history/{thread_id}"})()}
+    _, token = begin_request(scope)
+    try:
+        with capacity_budget(max_read_units=1, max_write_units=0) as usage:
+            repo.query_messages("t1", limit=20)
+    finally:
+        end_request(token)
+
+    assert sent[0]["ReturnConsumedCapacity"] == "TOTAL"
+    assert usage.operations == {"Query": 1}
+    assert usage.by_method == {"ChatRepo.query_messages": 0.5}
+    key = ("/chat/history/{thread_id}", "ChatRepo.query_messages", "chat_messages", "read")
+    assert capacity_stats.snapshot()[key] == (0.5, 1)
+    assert capacity_stats.by_route()[0]["route"] == "/chat/history/{thread_id}"
+
+
+def test_budget_rejects_scans_and_overspend(stubbed_table):
+    make, stub, _ = stubbed_table
+    repo = ThreadRepo()
+    repo.table = make("threads")
+    stub.add_response("scan", {"Items": [], "ConsumedCapacity": _consumed("threads", 12.0)})
+    with pytest.raises(CapacityBudgetExceeded, match="1 Scan call"):
+        with capacity_budget():
+            list(repo.iter_all_threads())
+
+    stub.add_response("put_item", {"ConsumedCapacity": _consumed("threads", 3.0)})
+    with pytest.raises(CapacityBudgetExceeded, match="WCU > budget 1"):
+        with capacity_budget(max_write_units=1):
+            repo.table.put_item(Item={"thread_id": "t1"})
+    # Outside a request the units are still counted, as background work
+    assert capacity_stats.by_route()[0]["route"] == "<background>"
+
+
+def test_inbox_and_task_list_paths_query_instead_of_scanning(stubbed_table):
+    make, stub, sent = stubbed_table
+    threads = ThreadRepo()
+    threads.members = make("thread_members")
+    stub.add_response("query", {"Items": [], "Count": 0, "ConsumedCapacity": _consumed("thread_members", 0.5)})
+    with capacity_budget(forbid=("Scan",)) as usage:
+        threads.query_threads_for_user("alice", limit=20)
+    assert usage.operations == {"Query": 1}
+    assert sent[-1]["IndexName"] == MEMBERS_ACTIVITY_INDEX
+
+    tasks = TaskRepo()
+    tasks.table = make("tasks")
+    for _ in range(2):  # one per GSI, issued in parallel
+        stub.add_response("query", {"Items": [], "Count": 0, "ConsumedCapacity": _consumed("tasks", 0.5)})
+    with capacity_budget(forbid=("Scan",)) as usage:
+        tasks.list_tasks("tenant", limit=20)
+    assert usage.operations == {"Query": 2}
+    assert usage.by_method == {"TaskRepo._query_stream": 1.0}
+
+
+def test_repo_generators_forward_send_throw_and_close():
+    events = []
+
+    @track_repo_methods
+    class Repo:
+        def pages(self):
+            try:
+                while True:
+                    try:
+                        received = yield current_repo_method()
+                        events.append(("sent", received))
+                    except KeyError:
+                        events.append(("thrown", current_repo_method()))
+            finally:
+                events.append(("closed", current_repo_method()))
+
+    gen = Repo().pages()
+    assert next(gen) == "Repo.pages"
+    assert current_repo_method() is None  # not leaked to the caller between yields
+    assert gen.send("page-2") == "Repo.pages"
+    assert gen.throw(KeyError("x")) == "Repo.pages"
+    gen.close()
+    assert events == [("sent", "page-2"), ("thrown", "Repo.pages"), ("closed", "Repo.pages")]
@@ -0,0 +1,19 @@
+from app.deps.dynamo import get_dynamo_resource, get_table, reset_dynamo_resources
+from app.deps.repos import get_chat_repo, reset_repos
+
+
+def test_dynamo_resource_is_shared():
+    reset_dynamo_resources()
+    assert get_dynamo_resource() is get_dynamo_resource()
+    assert get_table("chat_messages") is get_table("chat_messages")
+
+
+def test_reset_rebuilds_resource():
+    first = get_dynamo_resource()
+    reset_dynamo_resources()
+    assert get_dynamo_resource() is not first
+
+
+def test_repo_registry_returns_singletons():
+    reset_repos()
+    assert get_chat_repo() is get_chat_repo()
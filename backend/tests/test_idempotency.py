@@ -0,0 +1,103 @@
+import hashlib
+import hmac
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.repos.idempotency_repo import IdempotencyRepo
+from app.routes import chat_stream
+from app.services.idempotency import DUPLICATE, FRESH, IdempotencyStore
+
+
+class ConditionalCheckFailedException(Exception):
+    pass
+
+
+class FakeMarkerTable:
+    """put_item honouring the repo's "absent or expired" condition."""
+
+    class meta:
+        class client:
+            class exceptions:
+                ConditionalCheckFailedException = ConditionalCheckFailedException
+
+    def __init__(self):
+        self.items = {}
+        self.puts = 0
+
+    def put_item(self, Item, ConditionExpression, ExpressionAttributeValues):
+        self.puts += 1
+        existing = self.items.get(Item["event_key"])
+        if existing and existing["expires_at"] >= ExpressionAttributeValues[":now"]:
+            raise ConditionalCheckFailedException()
+        self.items[Item["event_key"]] = Item
+
+    def delete_item(self, Key):
+        self.items.pop(Key["event_key"], None)
+
+
+def _repo(table):
+    repo = IdempotencyRepo()
+    repo.table = table
+    return repo
+
+
+def test_local_lru_answers_before_dynamodb_and_instances_agree():
+    table = FakeMarkerTable()
+    first = IdempotencyStore(lambda: _repo(table), ttl_seconds=60)
+    other_instance = IdempotencyStore(lambda: _repo(table), ttl_seconds=60)
+
+    assert first.claim("m1") == FRESH
+    assert first.claim("m1") == DUPLICATE
+    assert table.puts == 1  # the retry never left the process
+    assert other_instance.claim("m1") == DUPLICATE
+    assert first.stats()["retries_absorbed"] == 1
+    assert other_instance.stats()["duplicates_remote"] == 1
+
+    first.release("m1")
+    assert other_instance.claim("m2") == FRESH
+    assert first.claim("m1") == FRESH
+
+
+def test_expired_markers_are_reclaimable():
+    table = FakeMarkerTable()
+    repo = _repo(table)
+    assert repo.claim("m1", ttl_seconds=10, now=1000)
+    assert not repo.claim("m1", ttl_seconds=10, now=1005)
+    assert repo.claim("m1", ttl_seconds=10, now=1011)
+
+
+def test_store_errors_fail_open():
+    def broken():
+        raise RuntimeError("dynamo down")
+
+    store = IdempotencyStore(broken)
+    assert store.claim("m1") == FRESH
+    assert store.stats()["store_errors"] == 1
+
+
+def test_webhook_replay_is_short_circuited_before_processing(monkeypatch):
+    table = FakeMarkerTable()
+    store = IdempotencyStore(lambda: _repo(table))
+    processed = []
+    monkeypatch.setattr(chat_stream, "WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setattr(chat_stream, "WEBHOOK_ASYNC", False)
+    monkeypatch.setattr(chat_stream, "WEBHOOK_IDEMPOTENCY", True)
+    monkeypatch.setattr(chat_stream, "get_webhook_idempotency", lambda: store)
+    monkeypatch.setattr(
+        chat_stream, "process_webhook_event", lambda payload, **_: processed.append(payload) or {"status": "ok"}
+    )
+
+    async def no_prefetch(cid):
+        return {}
+
+    monkeypatch.setattr(chat_stream, "_prefetch_channel_state", no_prefetch)
+
+    event = {"type": "message.new", "message": {"id": "m1", "cid": "messaging:u1", "text": "agent", "user": {"id": "t"}}}
+    body = json.dumps(event).encode()
+    headers = {"X-Signature": hmac.new(b"s3cret", body, hashlib.sha256).hexdigest()}
+    client = TestClient(app)
+    assert client.post("/chat/stream/webhook", content=body, headers=headers).json() == {"status": "ok"}
+    assert client.post("/chat/stream/webhook", content=body, headers=headers).json() == {"status": "duplicate"}
+    assert len(processed) == 1
@@ -0,0 +1,178 @@
+import asyncio
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import ai_service
+from app.services.llm_gateway import CircuitBreaker, LLMGateway, LLMUnavailable
+
+
+def _fail():
+    raise ConnectionError("upstream down")
+
+
+def test_breaker_opens_fails_fast_and_recovers():
+    gateway = LLMGateway(breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.05))
+    calls = []
+    for _ in range(2):
+        with pytest.raises(LLMUnavailable):
+            gateway.call(_fail)
+    with pytest.raises(LLMUnavailable, match="circuit open"):
+        gateway.call(lambda: calls.append(1))
+    assert calls == [] and gateway.stats()["breaker"]["open"] is True
+
+    time.sleep(0.06)
+    assert gateway.call(lambda: "ok") == "ok"  # the half-open probe
+    assert gateway.stats()["breaker"]["state"] == 0
+
+
+def test_identical_prompts_in_flight_share_one_call():
+    gateway = LLMGateway()
+    upstream = []
+
+    def slow():
+        upstream.append(1)
+        time.sleep(0.1)
+        return "answer"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(gateway.call(slow, key="same"))) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == ["answer"] * 5
+    assert len(upstream) == 1 and gateway.stats()["coalesced"] == 4
+
+
+def test_concurrency_limit_and_deadline():
+    gateway = LLMGateway(max_concurrency=1, queue_timeout=0.02, deadline=0.3)
+    started = threading.Event()
+
+    def slow():
+        started.set()
+        time.sleep(0.15)
+        return "slow"
+
+    thread = threading.Thread(target=gateway.call, args=(slow,))
+    thread.start()
+    started.wait()
+    with pytest.raises(LLMUnavailable, match="concurrent"):
+        gateway.call(lambda: "fast")
+    thread.join()
+    stats = gateway.stats()
+    assert stats["queue_timeouts"] == 1 and stats["queue_wait_ms_max"] >= 15
+
+    with pytest.raises(LLMUnavailable, match="no LLM response"):
+        LLMGateway(deadline=0.05).call(lambda: time.sleep(0.3))
+
+
+def test_abandoned_calls_keep_their_slot_until_they_return():
+    gateway = LLMGateway(max_concurrency=1, queue_timeout=1.0, deadline=0.1)
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def slow():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.2)
+        with lock:
+            running.pop()
+        return "late"
+
+    with pytest.raises(LLMUnavailable, match="no LLM response"):
+        gateway.call(slow)
+    # The next caller waits for the abandoned call's slot instead of running beside it
+    assert gateway.call(lambda: "next") == "next"
+    assert max(peak) == 1
+    stats = gateway.stats()
+    assert stats["queue_wait_ms_max"] >= 50
+    assert stats["breaker"]["consecutive_failures"] == 0
+    time.sleep(0.05)
+    assert gateway.stats()["active"] == 0
+
+
+async def _trickle(n, interval):
+    for i in range(n):
+        await asyncio.sleep(interval)
+        yield i
+
+
+async def _open(n, interval):
+    return _trickle(n, interval)
+
+
+def test_streams_hold_a_slot_and_have_a_total_deadline():
+    gateway = LLMGateway(max_concurrency=1, queue_timeout=0.01, deadline=0.3)
+
+    async def consume():
+        seen = []
+        async for item in gateway.astream(lambda: _open(3, 0.02)):
+            seen.append(item)
+            if item == 0:
+                # The stream's slot is taken for its whole duration
+                assert gateway.stats()["active"] == 1
+                with pytest.raises(LLMUnavailable, match="concurrent"):
+                    await asyncio.to_thread(gateway.call, lambda: "blocked")
+        return seen
+
+    assert asyncio.run(consume()) == [0, 1, 2]
+
+    async def trickle_forever():
+        # Every read arrives well within a per-read timeout, the whole stream never ends
+        async for _ in gateway.astream(lambda: _open(1000, 0.05)):
+            pass
+
+    with pytest.raises(LLMUnavailable, match="no complete LLM response"):
+        asyncio.run(trickle_forever())
+    stats = gateway.stats()
+    assert stats["timeouts"] == 1 and stats["active"] == 0
+    assert stats["calls"] == 2 and stats["queue_timeouts"] == 1
+
+
+def test_streamed_reply_falls_back_when_no_slot_frees(monkeypatch):
+    gateway = LLMGateway(max_concurrency=1, queue_timeout=0.01)
+    monkeypatch.setattr(ai_service, "_async_openai_client", SimpleNamespace())
+    monkeypatch.setattr(ai_service, "llm_gateway", gateway)
+    gateway.acquire()  # another call holds the only slot
+
+    async def reply():
+        return [delta async for delta in ai_service.stream_ai_response("hello", context="x")]
+
+    try:
+        assert asyncio.run(reply()) == ["(Agent offline) olleh"]
+    finally:
+        gateway.release()
+    assert gateway.stats()["queue_timeouts"] == 1
+
+
+def test_hedged_attempt_wins_over_a_slow_first_attempt():
+    gateway = LLMGateway(hedge_after=0.03, deadline=1.0)
+    attempts = []
+
+    def flaky_latency():
+        attempts.append(1)
+        if len(attempts) == 1:
+            time.sleep(0.5)
+            return "slow"
+        return "fast"
+
+    started = time.monotonic()
+    assert gateway.call(flaky_latency) == "fast"
+    assert time.monotonic() - started < 0.3
+    assert gateway.stats()["hedge_wins"] == 1
+
+
+def test_agent_falls_back_while_the_breaker_is_open(monkeypatch):
+    completions = SimpleNamespace(create=lambda **kwargs: _fail())
+    monkeypatch.setattr(ai_service, "_openai_client", SimpleNamespace(chat=SimpleNamespace(completions=completions)))
+    gateway = LLMGateway(breaker=CircuitBreaker(failure_threshold=1, reset_timeout=60))
+    monkeypatch.setattr(ai_service, "llm_gateway", gateway)
+
+    assert ai_service.get_ai_response("hello", context="x").startswith("(Agent offline)")
+    assert ai_service.get_ai_response("hello", context="x").startswith("(Agent offline)")
+    assert gateway.stats()["breaker"]["rejected"] == 1
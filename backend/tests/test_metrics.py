@@ -0,0 +1,87 @@
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.utils.metrics import MetricsMiddleware, RequestMetrics, render_prometheus
+
+
+def _instrumented_app(metrics, log):
+    demo = FastAPI()
+
+    @demo.get("/items/{item_id}")
+    def item(item_id: str):
+        return {"id": item_id}
+
+    @demo.get("/stream")
+    def stream():
+        return StreamingResponse(iter([b"a", b"b"]))
+
+    demo.add_middleware(MetricsMiddleware, metrics=metrics, access_log=log.append)
+    return demo
+
+
+def test_records_templated_routes_statuses_and_latency():
+    metrics, log = RequestMetrics(), []
+    client = TestClient(_instrumented_app(metrics, log))
+    for n in range(3):
+        assert client.get(f"/items/{n}").status_code == 200
+    assert client.get("/stream").text == "ab"
+    assert client.get("/nope").status_code == 404
+
+    snap = metrics.snapshot()
+    assert snap["requests"][("GET", "/items/{item_id}", 200)] == 3
+    assert snap["requests"][("GET", "<unmatched>", 404)] == 1
+    assert snap["in_flight"]["GET"] == 0
+    assert sum(snap["latency"][("GET", "/items/{item_id}")][:-1]) == 3
+    assert metrics.quantile("GET", "/items/{item_id}", 0.99) is not None
+    assert log[0]["route"] == "/items/{item_id}" and log[0]["path"] == "/items/0"
+    assert len({entry["request_id"] for entry in log}) == len(log)
+
+    text = render_prometheus(metrics)
+    assert 'http_requests_total{method="GET",route="/items/{item_id}",status="200"} 3' in text
+    assert 'http_request_duration_seconds_bucket{method="GET",route="/stream",le="+Inf"} 1' in text
+
+
+def test_metrics_endpoint_serves_prometheus_text(monkeypatch):
+    client = TestClient(app)
+    client.get("/health")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    assert 'route="/health"' in response.text
+    assert "landten_profile_cache_hits" in response.text
+
+    monkeypatch.setenv("STAGE", "prod")
+    assert client.get("/metrics").status_code == 401  # no token configured outside dev
+
+    monkeypatch.setenv("METRICS_TOKEN", "s3cret")
+    assert client.get("/metrics").status_code == 401
+    assert client.get("/metrics", headers={"Authorization": "Bearer s3cret"}).status_code == 200
+
+
+def test_request_id_is_logged_and_echoed():
+    metrics, log = RequestMetrics(), []
+    client = TestClient(_instrumented_app(metrics, log))
+    minted = client.get("/items/1")
+    assert minted.headers["x-request-id"] == log[-1]["request_id"]
+    assert len(minted.headers["x-request-id"]) == 36
+    forwarded = client.get("/items/2", headers={"X-Request-ID": "lb-1234"})
+    assert forwarded.headers["x-request-id"] == "lb-1234" == log[-1]["request_id"]
+    bogus = client.get("/items/3", headers={"X-Request-ID": "bad id\nwith newline"})
+    assert bogus.headers["x-request-id"] != "bad id\nwith newline"
+
+
+def test_queue_logging_is_configured_by_the_server_lifespan_not_under_lambda(monkeypatch):
+    import app.main as main
+
+    calls = []
+    monkeypatch.setattr(main, "configure_logging", lambda: calls.append(1))
+    monkeypatch.setenv("AWS_LAMBDA_FUNCTION_NAME", "landten")
+    with TestClient(app):
+        pass
+    assert calls == []
+    monkeypatch.delenv("AWS_LAMBDA_FUNCTION_NAME")
+    with TestClient(app):
+        pass
+    assert calls == [1]
@@ -0,0 +1,53 @@
+from app.repos.profile_repo import ProfileRepo
+from app.utils.cache import TTLCache
+
+
+class FakeProfileTable:
+    def __init__(self):
+        self.items = {}
+        self.reads = 0
+
+    def get_item(self, Key):
+        self.reads += 1
+        item = self.items.get(Key["user_id"])
+        return {"Item": item} if item else {}
+
+    def put_item(self, Item):
+        self.items[Item["user_id"]] = Item
+
+
+def _repo():
+    repo = ProfileRepo()
+    repo.table = FakeProfileTable()
+    repo.cache = TTLCache(maxsize=2, ttl=60, negative_ttl=60)
+    return repo
+
+
+def test_get_profile_reads_through_once_and_caches_misses():
+    repo = _repo()
+    repo.table.items["u1"] = {"user_id": "u1", "persona": "tenant"}
+    assert repo.get_persona("u1") == "tenant"
+    assert repo.get_persona("u1") == "tenant"
+    assert repo.get_profile("ghost") is None
+    assert repo.get_profile("ghost") is None
+    assert repo.table.reads == 2
+    assert repo.cache.stats()["negative_hits"] == 1
+
+
+def test_upsert_writes_through_and_replaces_negative_entry():
+    repo = _repo()
+    assert repo.get_profile("u2") is None
+    repo.upsert_profile("u2", "landlord")
+    assert repo.get_persona("u2") == "landlord"
+    assert repo.table.reads == 1
+
+
+def test_lru_evicts_least_recently_used():
+    cache = TTLCache(maxsize=2, ttl=60)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.lookup("b") == (False, None)
+    assert cache.get("a") == 1
+    assert cache.stats()["evictions"] == 1
@@ -0,0 +1,110 @@
+from fastapi import Depends, FastAPI
+from fastapi.testclient import TestClient
+
+from app.deps import auth
+from app.deps.rate_limit import enforce_user_rate_limit
+from app.utils.rate_limit import SLIDING_WINDOW, PolicyTable, RateLimiter, RateLimitMiddleware, RatePolicy
+
+
+def test_token_bucket_allows_burst_then_refills():
+    policy = RatePolicy("p", 2, 10)  # one token every 5s
+    limiter = RateLimiter(shards=1)
+    assert limiter.allow("k", policy, now=0.0)
+    assert limiter.allow("k", policy, now=0.0)
+    assert not limiter.allow("k", policy, now=0.0)
+    assert not limiter.allow("k", policy, now=4.0)
+    assert limiter.allow("k", policy, now=5.5)
+
+
+def test_sliding_window_counts_recent_hits_only():
+    policy = RatePolicy("p", 2, 10, algorithm=SLIDING_WINDOW)
+    limiter = RateLimiter(shards=1)
+    assert limiter.allow("k", policy, now=0.0)
+    assert limiter.allow("k", policy, now=1.0)
+    assert not limiter.allow("k", policy, now=9.0)
+    # 95% of the previous window still overlaps: 2 * 0.95 hits estimated
+    assert not limiter.allow("k", policy, now=10.5)
+    # Half of it: one hit estimated, room for one more
+    assert limiter.allow("k", policy, now=15.0)
+    assert not limiter.allow("k", policy, now=15.1)
+    # Two windows later nothing is left
+    assert limiter.allow("k", policy, now=30.0)
+    assert limiter.allow("k", policy, now=30.0)
+    # Other keys and policies are independent
+    assert limiter.allow("other", policy, now=9.0)
+    assert limiter.allow("k", RatePolicy("q", 1, 10, algorithm=SLIDING_WINDOW), now=9.0)
+
+
+def test_sliding_window_state_does_not_grow_with_the_limit():
+    policy = RatePolicy("p", 120, 60, algorithm=SLIDING_WINDOW)
+    limiter = RateLimiter(shards=1)
+    allowed = sum(limiter.allow("k", policy, now=n * 0.1) for n in range(500))
+    assert allowed == 120
+    (entry,) = limiter._shards[0].entries.values()
+    assert len(entry[1]) == 3
+
+
+def test_memory_is_capped_and_idle_keys_are_swept():
+    policy = RatePolicy("p", 10, 10)
+    limiter = RateLimiter(shards=1, max_keys=10, sweep_interval=5)
+    for n in range(1000):
+        limiter.allow(f"ip:{n}", policy, now=0.0)
+    assert len(limiter) <= 10
+    assert limiter.stats()["evictions"] >= 990
+
+    # Keys idle longer than the refill time are dropped on the next sweep
+    limiter.allow("fresh", policy, now=100.0)
+    limiter.allow("fresh-2", policy, now=100.0)
+    assert len(limiter) == 2
+
+
+def test_policy_table_longest_prefix_and_exemptions():
+    default = RatePolicy.parse("default", "120/60")
+    agent = RatePolicy.parse("agent", "10/60", scope="user")
+    table = PolicyTable(default, routes=[("/chat", None), ("/chat/stream/agent_reply", agent)])
+    assert table.resolve("/chat/stream/agent_reply") is agent
+    assert table.resolve("/chat/send") is None
+    assert table.resolve("/chatter") is default
+    assert table.resolve("/profile") is default
+    assert agent.limit == 10 and agent.window == 60.0
+
+
+def _user_limited_app(limit):
+    app = FastAPI()
+
+    @app.post("/agent")
+    def agent(uid: str = Depends(enforce_user_rate_limit)):
+        return {"uid": uid}
+
+    policy = RatePolicy("agent", limit, 60, scope="user")
+    app.add_middleware(
+        RateLimitMiddleware,
+        limiter=RateLimiter(),
+        policies=PolicyTable(None, routes=[("/agent", policy)]),
+        key_func=lambda scope, policy: "ip:test",
+    )
+    return TestClient(app)
+
+
+def test_user_policy_keys_on_verified_uid_not_the_token(monkeypatch):
+    monkeypatch.setenv("AUTH_DISABLED", "false")
+    monkeypatch.setenv("USE_FIREBASE_ADMIN", "true")
+    monkeypatch.setattr(auth, "firebase_admin_available", True)
+    # Every request mints a fresh ID token for the same user
+    monkeypatch.setattr(auth, "_verify_with_firebase", lambda token: token.split(":")[0])
+    client = _user_limited_app(limit=2)
+    codes = [
+        client.post("/agent", headers={"Authorization": f"Bearer alice:{n}"}).status_code for n in range(3)
+    ]
+    assert codes == [200, 200, 429]
+    assert client.post("/agent", headers={"Authorization": "Bearer bob:0"}).status_code == 200
+    rejected = client.post("/agent", headers={"Authorization": "Bearer alice:9"})
+    assert rejected.headers["retry-after"] == "30"
+
+
+def test_user_policy_falls_back_to_ip_without_verified_identity(monkeypatch):
+    monkeypatch.setenv("AUTH_DISABLED", "false")
+    monkeypatch.setenv("USE_FIREBASE_ADMIN", "false")  # any non-empty token is accepted
+    client = _user_limited_app(limit=2)
+    codes = [client.post("/agent", headers={"Authorization": f"Bearer t{n}"}).status_code for n in range(3)]
+    assert codes == [200, 200, 429]
@@ -0,0 +1,153 @@
+import multiprocessing
+import time
+
+import pytest
+
+from app.utils.rate_limit import RatePolicy
+from app.utils.rate_limit_shared import (
+    CounterStore,
+    DynamoCounterStore,
+    LocalCounterStore,
+    SharedMemoryCounterStore,
+    SharedRateLimiter,
+)
+
+
+class CountingStore(LocalCounterStore):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def incr(self, deltas, window_seconds):
+        self.calls += 1
+        return super().incr(deltas, window_seconds)
+
+
+def test_workers_share_one_limit_with_batched_syncs():
+    store = CountingStore()
+    policy = RatePolicy("p", 100, 60)
+    workers = [SharedRateLimiter(store, sync_batch=10, sync_interval=60) for _ in range(4)]
+    allowed = sum(workers[n % 4].allow("ip:1", policy, now=1.0) for n in range(400))
+    # Overshoot is bounded by one batch per worker, not 4x the limit
+    assert 100 <= allowed <= 100 + 4 * 10
+    assert store.calls < allowed / 2
+    # A new window starts from zero
+    assert workers[0].allow("ip:1", policy, now=61.0)
+
+
+def test_store_errors_fail_open_to_local_enforcement():
+    class BrokenStore(LocalCounterStore):
+        def incr(self, deltas, window_seconds):
+            raise RuntimeError("store down")
+
+    limiter = SharedRateLimiter(BrokenStore(), sync_batch=5)
+    policy = RatePolicy("p", 10, 60)
+    results = [limiter.allow("k", policy, now=1.0) for _ in range(20)]
+    assert results.count(True) == 10
+    assert limiter.stats()["sync_errors"] >= 1
+
+
+def _hit_shared_store(path, count):
+    store = SharedMemoryCounterStore(path, slots=1024)
+    for _ in range(count):
+        store.incr({("p", "k", 7): 1}, {("p", "k", 7): 60.0})
+    store.close()
+
+
+def test_shared_memory_store_counts_across_processes(tmp_path):
+    path = str(tmp_path / "counters")
+    procs = [multiprocessing.Process(target=_hit_shared_store, args=(path, 200)) for _ in range(3)]
+    for proc in procs:
+        proc.start()
+    for proc in procs:
+        proc.join(10)
+    store = SharedMemoryCounterStore(path, slots=1024)
+    assert store.incr({("p", "k", 7): 1}, {("p", "k", 7): 60.0})[("p", "k", 7)] == 601
+    # Slots of finished windows are reused
+    assert store.incr({("p", "k", 9): 1}, {("p", "k", 9): 60.0})[("p", "k", 9)] == 1
+    store.close()
+
+
+def test_dynamo_store_uses_atomic_add():
+    class FakeTable:
+        def __init__(self):
+            self.calls = []
+            self.hits = {}
+
+        def update_item(self, **kwargs):
+            self.calls.append(kwargs)
+            key = kwargs["Key"]["limit_key"]
+            self.hits[key] = self.hits.get(key, 0) + kwargs["ExpressionAttributeValues"][":n"]
+            return {"Attributes": {"hits": self.hits[key]}}
+
+    table = FakeTable()
+    totals = DynamoCounterStore(table).incr({("p", "ip:1", 3): 5}, {("p", "ip:1", 3): 60.0})
+    assert totals == {("p", "ip:1", 3): 5}
+    call = table.calls[0]
+    assert call["Key"] == {"limit_key": "p#ip:1#3"}
+    assert call["UpdateExpression"].startswith("ADD hits :n")
+    assert call["ExpressionAttributeValues"][":exp"] == 300
+
+
+def test_counter_store_is_abstract():
+    with pytest.raises(TypeError):
+        CounterStore()
+
+
+def test_shared_memory_slots_are_reused_only_after_their_window_expires(tmp_path):
+    store = SharedMemoryCounterStore(str(tmp_path / "counters"), slots=1)  # every key probes the same slot
+    now = time.time()
+    hourly = ("hourly", "k", int(now // 3600))
+    assert store.incr({hourly: 50}, {hourly: 3600.0})[hourly] == 50
+    # A 1s policy's window index is far larger, but the hourly counter is still live
+    per_second = ("per_second", "k", int(now))
+    assert store.incr({per_second: 1}, {per_second: 1.0})[per_second] == 1
+    assert store.dropped == 1
+    assert store.incr({hourly: 1}, {hourly: 3600.0})[hourly] == 51
+    store.close()
+
+
+def _hit_inherited_store(store, count):
+    for _ in range(count):
+        store.incr({("p", "k", 7): 1}, {("p", "k", 7): 60.0})
+
+
+def test_shared_memory_store_opens_lazily_per_process(tmp_path):
+    path = tmp_path / "counters"
+    store = SharedMemoryCounterStore(str(path), slots=1024)
+    assert not path.exists()  # nothing opened at import/construction time
+    store.incr({("p", "k", 7): 1}, {("p", "k", 7): 60.0})
+    # Forked children reopen the file instead of sharing the parent's descriptor
+    procs = [
+        multiprocessing.get_context("fork").Process(target=_hit_inherited_store, args=(store, 200)) for _ in range(2)
+    ]
+    for proc in procs:
+        proc.start()
+    _hit_inherited_store(store, 200)
+    for proc in procs:
+        proc.join(10)
+    assert store.incr({("p", "k", 7): 1}, {("p", "k", 7): 60.0})[("p", "k", 7)] == 602
+    store.close()
+
+
+def test_inline_store_syncs_only_the_due_key():
+    class RecordingStore(LocalCounterStore):
+        def __init__(self):
+            super().__init__()
+            self.batches = []
+
+        def incr(self, deltas, window_seconds):
+            self.batches.append(set(deltas))
+            return super().incr(deltas, window_seconds)
+
+    store = RecordingStore()
+    limiter = SharedRateLimiter(store, sync_batch=2, sync_interval=30)
+    policy = RatePolicy("p", 1000, 60)
+    limiter.sync(now=61.0)  # the periodic full sync just ran
+    limiter.allow("a", policy, now=62.0)
+    limiter.allow("b", policy, now=62.0)
+    limiter.allow("a", policy, now=62.0)
+    assert store.batches == [{("p", "a", 1)}]
+    # The periodic full sync still picks up every key's pending hits
+    limiter.allow("a", policy, now=100.0)
+    assert ("p", "b", 1) in store.batches[-1]
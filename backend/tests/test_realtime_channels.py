@@ -0,0 +1,87 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.deps.auth import verify_firebase_token
+from app.deps.repos import get_thread_repo
+from app.services.realtime_channels import parse_channel, thread_channel, user_channel
+
+client = TestClient(app)
+
+
+class FakeThreadRepo:
+    def is_participant(self, user_id, thread_id):
+        return (user_id, thread_id) == ("alice", "kitchen leak")
+
+
+def test_channel_names_round_trip():
+    assert thread_channel("t1") == "private-thread-t1"
+    assert parse_channel(thread_channel("kitchen leak")) == ("thread", "kitchen leak")
+    assert parse_channel(user_channel("a@b.com")) == ("user", "a@b.com")
+    assert parse_channel("chat") is None
+
+
+def _authorize(channel_name, headers=None):
+    return client.post(
+        "/chat/realtime/auth", data={"socket_id": "123.456", "channel_name": channel_name}, headers=headers or {}
+    )
+
+
+def test_realtime_auth_only_signs_member_channels(monkeypatch):
+    monkeypatch.setenv("AUTH_DISABLED", "false")
+    monkeypatch.setenv("USE_FIREBASE_ADMIN", "true")
+    app.dependency_overrides[verify_firebase_token] = lambda: "alice"
+    app.dependency_overrides[get_thread_repo] = lambda: FakeThreadRepo()
+    headers = {"Authorization": "Bearer verified-id-token"}
+    try:
+        ok = client.post(
+            "/chat/realtime/auth",
+            data={"socket_id": "123.456", "channel_name": thread_channel("kitchen leak")},
+            headers=headers,
+        )
+        assert ok.status_code == 200
+        assert "auth" in ok.json()
+        other = client.post(
+            "/chat/realtime/auth",
+            data={"socket_id": "123.456", "channel_name": thread_channel("someone-else")},
+            headers=headers,
+        )
+        assert other.status_code == 403
+        own_user = client.post(
+            "/chat/realtime/auth",
+            json={"socket_id": "123.456", "channel_name": user_channel("alice")},
+            headers=headers,
+        )
+        assert own_user.status_code == 200
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_realtime_auth_refuses_unverified_callers(monkeypatch):
+    monkeypatch.setenv("AUTH_DISABLED", "false")
+    monkeypatch.setenv("USE_FIREBASE_ADMIN", "false")
+    app.dependency_overrides[get_thread_repo] = lambda: FakeThreadRepo()
+    try:
+        # The fallback verifier accepts any bearer as the uid
+        resp = _authorize(user_channel("alice"), {"Authorization": "Bearer alice"})
+        assert resp.status_code == 403
+        assert _authorize(thread_channel("kitchen leak"), {"Authorization": "Bearer alice"}).status_code == 403
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_a_verified_uid_named_dev_mode_is_still_checked(monkeypatch):
+    monkeypatch.setenv("AUTH_DISABLED", "false")
+    monkeypatch.setenv("USE_FIREBASE_ADMIN", "true")
+    app.dependency_overrides[verify_firebase_token] = lambda: "dev-mode"
+    app.dependency_overrides[get_thread_repo] = lambda: FakeThreadRepo()
+    try:
+        assert _authorize(thread_channel("kitchen leak")).status_code == 403
+        assert _authorize(user_channel("alice")).status_code == 403
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_dev_mode_signs_any_private_channel(monkeypatch):
+    monkeypatch.setenv("AUTH_DISABLED", "true")
+    resp = _authorize(user_channel("alice"))
+    assert resp.status_code == 200 and "auth" in resp.json()
@@ -0,0 +1,52 @@
+import threading
+
+from app.services.realtime_dispatcher import RealtimeDispatcher
+
+
+class FakePusher:
+    def __init__(self, fail_first=0):
+        self.batches = []
+        self.fail_first = fail_first
+        self.gate = threading.Event()
+        self.gate.set()
+
+    def trigger_batch(self, events):
+        self.gate.wait()
+        if self.fail_first:
+            self.fail_first -= 1
+            raise ConnectionError("push API down")
+        self.batches.append(events)
+
+
+def test_dispatcher_coalesces_events_into_batches():
+    pusher = FakePusher()
+    pusher.gate.clear()  # hold the worker so events pile up
+    dispatcher = RealtimeDispatcher(lambda: pusher, linger=0.05)
+    for n in range(25):
+        assert dispatcher.publish("chat", "message", {"n": n})
+    pusher.gate.set()
+    assert dispatcher.flush(timeout=5)
+    assert sum(len(b) for b in pusher.batches) == 25
+    assert max(len(b) for b in pusher.batches) <= 10
+    stats = dispatcher.stats()
+    assert stats["sent"] == 25 and stats["queue_depth"] == 0
+
+
+def test_dispatcher_retries_then_delivers():
+    pusher = FakePusher(fail_first=2)
+    dispatcher = RealtimeDispatcher(lambda: pusher, base_backoff=0.001)
+    dispatcher.publish("chat", "message", {"n": 1})
+    assert dispatcher.flush(timeout=5)
+    assert dispatcher.stats()["retries"] == 2
+    assert pusher.batches == [[{"channel": "chat", "name": "message", "data": {"n": 1}}]]
+
+
+def test_dispatcher_drops_when_queue_stays_full():
+    pusher = FakePusher()
+    pusher.gate.clear()
+    dispatcher = RealtimeDispatcher(lambda: pusher, max_queue=1, enqueue_timeout=0.01, linger=0)
+    results = [dispatcher.publish("chat", "message", {"n": n}) for n in range(5)]
+    assert not all(results)
+    assert dispatcher.stats()["dropped"] >= 1
+    pusher.gate.set()
+    assert dispatcher.flush(timeout=5)
@@ -0,0 +1,50 @@
+from types import SimpleNamespace
+
+from app.services import ai_service
+from app.services.ai_service import ResponseCache, prompt_cache_key
+
+
+class FakeCompletions:
+    def __init__(self):
+        self.calls = 0
+
+    def create(self, **kwargs):
+        self.calls += 1
+        content = f"reply {self.calls}"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def _fake_openai():
+    completions = FakeCompletions()
+    return SimpleNamespace(chat=SimpleNamespace(completions=completions)), completions
+
+
+def test_template_prompts_are_served_from_cache(monkeypatch):
+    client, completions = _fake_openai()
+    monkeypatch.setattr(ai_service, "_openai_client", client)
+    monkeypatch.setattr(ai_service, "response_cache", ResponseCache(maxsize=16, ttl=60))
+
+    first = ai_service.get_ai_response("Ask them: where is the leak?", persona="tenant")
+    again = ai_service.get_ai_response("Ask them:  where is the leak? ", persona="tenant")
+    assert first == again == "reply 1" and completions.calls == 1
+
+    # Other persona, or conversation context: a real completion each time
+    ai_service.get_ai_response("Ask them: where is the leak?", persona="landlord")
+    ai_service.get_ai_response("Ask them: where is the leak?", persona="tenant", context="t: it drips")
+    ai_service.get_ai_response("Ask them: where is the leak?", persona="tenant", context="t: it drips")
+    assert completions.calls == 4
+
+    stats = ai_service.response_cache.stats()
+    assert stats["memory_hits"] == 1 and stats["misses"] == 2 and stats["saved_ms"] >= 0
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "responses.sqlite3")
+    key = prompt_cache_key("system", "tenant", "gpt-4o-mini", 0.2, "hello")
+    ResponseCache(path=path).put(key, "hi there", latency_ms=850.0)
+
+    restarted = ResponseCache(path=path)
+    assert restarted.get(key) == "hi there"
+    assert restarted.get(key) == "hi there"
+    stats = restarted.stats()
+    assert stats["disk_hits"] == 1 and stats["memory_hits"] == 1 and stats["saved_ms"] == 1700.0
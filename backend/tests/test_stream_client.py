@@ -0,0 +1,76 @@
+import asyncio
+
+from app.deps import stream_client
+from app.routes import chat_stream
+from app.services import chatbot
+from app.services.stream_provisioning import ProvisioningCache
+
+SECRET = "s" * 32
+
+
+def test_sync_client_is_shared_and_pooled():
+    stream_client.reset_stream_clients()
+    try:
+        first = stream_client.get_stream_client("key", SECRET)
+        assert stream_client.get_stream_client("key", SECRET) is first
+        assert stream_client.get_stream_client("key", "o" * 32) is not first
+        adapter = first.session.get_adapter("https://chat.stream-io-api.com")
+        assert adapter._pool_maxsize == stream_client.POOL_SIZE
+    finally:
+        stream_client.reset_stream_clients()
+
+
+def test_async_client_is_reused_within_a_loop():
+    async def scenario():
+        first = await stream_client.get_async_stream_client("key", SECRET)
+        second = await stream_client.get_async_stream_client("key", SECRET)
+        assert first is second
+        assert first.session.connector.limit == stream_client.POOL_SIZE
+        await stream_client.close_async_stream_clients()
+        assert first.session.closed
+
+    asyncio.run(scenario())
+
+
+class FakeAsyncChannel:
+    def __init__(self, client):
+        self.client = client
+
+    async def query(self, state=True, watch=False):
+        self.client.log.append("query:start")
+        await asyncio.sleep(0.01)
+        self.client.log.append("query:end")
+        return {"channel": {"data": {"persona": "tenant"}}, "messages": []}
+
+
+class FakeAsyncStream:
+    def __init__(self):
+        self.log = []
+
+    def channel(self, channel_type, channel_id):
+        return FakeAsyncChannel(self)
+
+    async def upsert_user(self, payload):
+        self.log.append("upsert:start")
+        await asyncio.sleep(0.01)
+        self.log.append("upsert:end")
+
+
+def test_webhook_prefetch_runs_stream_calls_concurrently_and_upserts_agent_once(monkeypatch):
+    fake = FakeAsyncStream()
+
+    async def get_fake():
+        return fake
+
+    monkeypatch.setattr(chat_stream, "_get_async_stream_client", get_fake)
+    monkeypatch.setattr(chatbot, "provisioning_cache", ProvisioningCache(ttl=60))
+
+    state = asyncio.run(chat_stream._prefetch_channel_state("messaging:unit-1"))
+    assert state["channel"]["data"]["persona"] == "tenant"
+    # Both calls were in flight before either finished
+    assert fake.log.index("query:start") < fake.log.index("upsert:end")
+    assert fake.log.index("upsert:start") < fake.log.index("query:end")
+
+    fake.log.clear()
+    asyncio.run(chat_stream._prefetch_channel_state("messaging:unit-1"))
+    assert fake.log == ["query:start", "query:end"]
@@ -0,0 +1,77 @@
+import hashlib
+import hmac
+import json
+
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routes import chat_stream
+from app.routes.chat_stream import verify_firebase_token
+from app.services.stream_inbox import InboxCache
+
+
+def _channel(cid, messages, unread):
+    return {
+        "channel": {"id": cid, "cid": f"messaging:{cid}", "name": cid.title(), "members_meta": {"t": {"display": "T"}}},
+        "messages": messages,
+        "read": [{"user": {"id": "someone-else"}, "unread_messages": 9}, {"user": {"id": "tenant"}, "unread_messages": unread}],
+    }
+
+
+class FakeStream:
+    def __init__(self):
+        self.calls = []
+
+    def query_channels(self, filter_conditions, sort=None, **options):
+        self.calls.append((filter_conditions, sort, options))
+        return {
+            "channels": [
+                _channel("unit-1", [{"id": "m2", "text": "latest"}], 2),
+                _channel("unit-2", [], 0),
+            ]
+        }
+
+
+def test_inbox_is_one_query_then_cached_until_a_webhook_touches_it(monkeypatch):
+    stream = FakeStream()
+    monkeypatch.setattr(chat_stream, "_get_stream_client", lambda: stream)
+    monkeypatch.setattr(chat_stream, "inbox_cache", InboxCache(ttl=60))
+    monkeypatch.setattr(chat_stream, "WEBHOOK_SECRET", "s3cret")
+    app.dependency_overrides[verify_firebase_token] = lambda: "token"
+    client = TestClient(app)
+    try:
+        _exercise_inbox(client, stream)
+    finally:
+        app.dependency_overrides.clear()
+
+
+def _exercise_inbox(client, stream):
+    body = client.get("/chat/stream/threads/tenant", params={"limit": 10}).json()
+    assert [t["channel_id"] for t in body] == ["unit-1", "unit-2"]
+    assert body[0]["unread_count"] == 2 and body[0]["last_message"]["text"] == "latest"
+    assert body[1]["last_message"] is None
+    _, sort, options = stream.calls[0]
+    assert options["message_limit"] == 1 and options["limit"] == 10 and options["user_id"] == "tenant"
+
+    client.get("/chat/stream/threads/tenant", params={"limit": 10})
+    assert len(stream.calls) == 1
+
+    # A read receipt on one of the cached channels drops the cached page
+    event = json.dumps({"type": "message.read", "cid": "messaging:unit-2", "user": {"id": "landlord"}}).encode()
+    signature = hmac.new(b"s3cret", event, hashlib.sha256).hexdigest()
+    assert client.post("/chat/stream/webhook", content=event, headers={"X-Signature": signature}).json() == {
+        "status": "ignored"
+    }
+    client.get("/chat/stream/threads/tenant", params={"limit": 10})
+    assert len(stream.calls) == 2
+
+
+def test_invalidation_by_member_list_and_user():
+    cache = InboxCache(ttl=60)
+    cache.put("a", 30, 0, [])
+    cache.put("b", 30, 0, [{"cid": "messaging:x"}])
+    cache.invalidate_channel("messaging:y", members=["a"])
+    assert cache.get("a", 30, 0) is None
+    assert cache.get("b", 30, 0) is not None
+    cache.invalidate_channel("messaging:x")
+    assert cache.get("b", 30, 0) is None
@@ -0,0 +1,88 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routes import chat_stream
+from app.routes.chat_stream import verify_firebase_token
+from app.services import chatbot
+from app.services.stream_provisioning import ProvisioningCache, TokenCache
+
+
+class FakeChannel:
+    def __init__(self, calls):
+        self.calls = calls
+
+    def create(self, user_id):
+        self.calls.append(("create", user_id))
+
+    def add_members(self, members, message=None, hide_history=False):
+        self.calls.append(("add_members", tuple(members)))
+
+
+class FakeStream:
+    def __init__(self):
+        self.calls = []
+        self.minted = 0
+
+    def upsert_user(self, payload):
+        self.calls.append(("upsert_user", payload["id"], payload.get("persona")))
+
+    def channel(self, channel_type, channel_id, data=None):
+        return FakeChannel(self.calls)
+
+    def create_token(self, user_id, exp=None):
+        self.minted += 1
+        return f"token-{user_id}-{self.minted}"
+
+
+def test_returning_user_needs_no_stream_calls(monkeypatch):
+    stream = FakeStream()
+    provisioning = ProvisioningCache(ttl=60)
+    tokens = TokenCache()
+    monkeypatch.setattr(chat_stream, "_get_stream_client", lambda: stream)
+    monkeypatch.setattr(chat_stream, "provisioning_cache", provisioning)
+    monkeypatch.setattr(chat_stream, "token_cache", tokens)
+    monkeypatch.setattr(chatbot, "provisioning_cache", provisioning)
+    app.dependency_overrides[verify_firebase_token] = lambda: "token"
+    client = TestClient(app)
+    params = {"user_id": "Tenant@Example.com", "persona": "tenant"}
+    try:
+        first = client.get("/chat/stream/token", params=params).json()
+        kinds = [call[0] for call in stream.calls]
+        assert kinds == ["upsert_user", "upsert_user", "create", "add_members", "add_members"]
+
+        stream.calls.clear()
+        second = client.get("/chat/stream/token", params=params).json()
+        assert stream.calls == []
+        assert second["token"] == first["token"] and stream.minted == 1
+
+        # A changed persona is upserted again, nothing else
+        client.get("/chat/stream/token", params={**params, "persona": "landlord"})
+        assert stream.calls == [("upsert_user", "tenant@example-com", "landlord")]
+
+        # Stream says the user left the channel: only the membership is redone
+        stream.calls.clear()
+        chat_stream._forget_provisioning(
+            {"type": "member.removed", "member": {"user_id": "tenant@example-com"}},
+            f"messaging:{chat_stream.DEFAULT_CHANNEL_ID}",
+        )
+        client.get("/chat/stream/token", params={**params, "persona": "landlord"})
+        assert stream.calls == [("add_members", ("tenant@example-com",))]
+    finally:
+        app.dependency_overrides.clear()
+
+
+def test_tokens_with_expiry_are_reissued_before_they_lapse():
+    minted = []
+
+    def mint(user_id, exp):
+        minted.append(exp)
+        return f"t{len(minted)}"
+
+    assert TokenCache(token_ttl=7200, min_remaining=3600).get_or_create("u", mint) == "t1"
+    assert minted[0] is not None
+
+    # Less life than min_remaining: never served from the cache
+    short = TokenCache(token_ttl=600, min_remaining=3600)
+    short.get_or_create("u", mint)
+    short.get_or_create("u", mint)
+    assert len(minted) == 3
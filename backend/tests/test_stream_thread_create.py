@@ -0,0 +1,77 @@
+from fastapi.testclient import TestClient
+
+from app.main import app
+from app.routes import chat_stream
+from app.routes.chat_stream import verify_firebase_token
+from app.services import chatbot
+from app.services.stream_provisioning import ProvisioningCache
+
+
+class FakeAsyncChannel:
+    def __init__(self, client, channel_id, data):
+        self.client = client
+        self.id = channel_id
+        self.data = data
+
+    async def query(self, **options):
+        self.client.calls.append(("query", self.id))
+        existing = self.client.channels.setdefault(self.id, list(self.data.get("members", [])))
+        return {"channel": {"id": self.id}, "members": [{"user_id": m} for m in existing], "messages": []}
+
+    async def add_members(self, members, message=None, **options):
+        self.client.calls.append(("add_members", tuple(members)))
+        self.client.channels[self.id].extend(members)
+
+
+class FakeAsyncStream:
+    def __init__(self):
+        self.calls = []
+        self.channels = {}
+
+    async def upsert_users(self, users):
+        self.calls.append(("upsert_users", tuple(u["id"] for u in users)))
+
+    async def upsert_user(self, payload):
+        self.calls.append(("upsert_user", payload["id"]))
+
+    def channel(self, channel_type, channel_id, data=None):
+        return FakeAsyncChannel(self, channel_id, data or {})
+
+
+def test_thread_creation_is_a_fixed_number_of_calls(monkeypatch):
+    stream = FakeAsyncStream()
+
+    async def get_fake():
+        return stream
+
+    provisioning = ProvisioningCache(ttl=60)
+    monkeypatch.setattr(chat_stream, "_get_async_stream_client", get_fake)
+    monkeypatch.setattr(chat_stream, "provisioning_cache", provisioning)
+    monkeypatch.setattr(chatbot, "provisioning_cache", provisioning)
+    app.dependency_overrides[verify_firebase_token] = lambda: "token"
+    client = TestClient(app)
+    participants = [f"p{n}@example.com" for n in range(10)]
+    try:
+        resp = client.post(
+            "/chat/stream/thread",
+            json={"creator": "owner@example.com", "participants": participants, "channel_id": "group-1"},
+        )
+        assert resp.status_code == 200, resp.text
+        assert resp.json()["channel_id"] == "group-1"
+        kinds = [call[0] for call in stream.calls]
+        assert sorted(kinds) == ["query", "upsert_user", "upsert_users"]
+        assert len(next(c for c in stream.calls if c[0] == "upsert_users")[1]) == 11
+
+        # Same group again plus one newcomer: only the newcomer is upserted and added
+        stream.calls.clear()
+        client.post(
+            "/chat/stream/thread",
+            json={"creator": "owner@example.com", "participants": participants + ["new@example.com"], "channel_id": "group-1"},
+        )
+        assert stream.calls == [
+            ("upsert_users", ("new@example-com",)),
+            ("query", "group-1"),
+            ("add_members", ("new@example-com",)),
+        ]
+    finally:
+        app.dependency_overrides.clear()
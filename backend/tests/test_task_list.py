@@ -0,0 +1,76 @@
+from app.repos.task_repo import ASSIGNEE_INDEX, PERSONA_INDEX, SORT_KEY, TaskRepo
+
+
+class FakeTaskTable:
+    """Query-only stand-in for the two task GSIs."""
+
+    def __init__(self):
+        self.items = []
+        self.queries = []
+
+    def put_item(self, Item):
+        self.items.append(Item)
+
+    def query(self, **kwargs):
+        self.queries.append(kwargs["IndexName"])
+        attr = {PERSONA_INDEX: "persona", ASSIGNEE_INDEX: "assigned_to"}[kwargs["IndexName"]]
+        values = kwargs["ExpressionAttributeValues"]
+        rows = [i for i in self.items if i.get(attr) == values[":pk"]]
+        if ":lo" in values:
+            rows = [i for i in rows if values[":lo"] <= i[SORT_KEY] <= values[":hi"]]
+        rows.sort(key=lambda i: i[SORT_KEY], reverse=True)
+        start = kwargs.get("ExclusiveStartKey")
+        if start:
+            idx = next(n for n, i in enumerate(rows) if i["task_id"] == start["task_id"])
+            rows = rows[idx + 1:]
+        limit = kwargs.get("Limit")
+        page = rows[:limit] if limit else rows
+        resp = {"Items": page}
+        if limit and len(rows) > limit:
+            last = page[-1]
+            resp["LastEvaluatedKey"] = {"task_id": last["task_id"], attr: last[attr], SORT_KEY: last[SORT_KEY]}
+        return resp
+
+
+def _repo():
+    repo = TaskRepo()
+    repo.table = FakeTaskTable()
+    tasks = [
+        ("t1", "tenant", "contractor", "pending", "2024-01-01"),
+        ("t2", "landlord", "tenant", "pending", "2024-01-02"),
+        ("t3", "tenant", "tenant", "done", "2024-01-03"),
+        ("t4", "tenant", "landlord", "pending", "2024-01-04"),
+        ("t5", "landlord", "contractor", "pending", "2024-01-05"),
+    ]
+    for task_id, persona, assigned, status, created in tasks:
+        repo.create_task(
+            {"task_id": task_id, "persona": persona, "assigned_to": assigned, "status": status, "created_at": created}
+        )
+    return repo
+
+
+def test_list_tasks_merges_both_indexes_without_duplicates():
+    repo = _repo()
+    items, cursor = repo.list_tasks("tenant")
+    assert sorted(i["task_id"] for i in items) == ["t1", "t2", "t3", "t4"]
+    assert cursor is None
+    assert set(repo.table.queries) == {PERSONA_INDEX, ASSIGNEE_INDEX}
+
+
+def test_list_tasks_paginates_across_both_indexes():
+    repo = _repo()
+    seen = []
+    cursor = None
+    while True:
+        items, cursor = repo.list_tasks("tenant", limit=1, cursor=cursor)
+        seen.extend(i["task_id"] for i in items)
+        if not cursor:
+            break
+    assert sorted(seen) == ["t1", "t2", "t3", "t4"]
+    assert len(seen) == len(set(seen))
+
+
+def test_list_tasks_status_and_date_filters_use_sort_key():
+    repo = _repo()
+    items, _ = repo.list_tasks("tenant", status="pending", created_from="2024-01-02")
+    assert [i["task_id"] for i in items] == ["t4", "t2"]
@@ -0,0 +1,160 @@
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from app.repos.pagination import InvalidCursor
+from app.repos.thread_repo import MEMBERS_ACTIVITY_INDEX, ThreadRepo
+from app.services.thread_activity import ThreadActivityTracker
+
+
+class ConditionalCheckFailed(Exception):
+    pass
+
+
+class FakeBatch:
+    def __init__(self, table):
+        self.table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def put_item(self, Item):
+        self.table.items[(Item["user_id"], Item["thread_id"])] = dict(Item)
+
+
+class FakeMembersTable:
+    """thread_members stand-in: batch puts, conditional activity updates, GSI query."""
+
+    def __init__(self):
+        self.items = {}
+        self.updates = 0
+        self.meta = SimpleNamespace(
+            client=SimpleNamespace(exceptions=SimpleNamespace(ConditionalCheckFailedException=ConditionalCheckFailed))
+        )
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return FakeBatch(self)
+
+    def update_item(self, Key, ExpressionAttributeValues, **kwargs):
+        self.updates += 1
+        item = self.items.get((Key["user_id"], Key["thread_id"]))
+        at = ExpressionAttributeValues[":at"]
+        if item is None or item.get("last_activity_at", "") >= at:
+            raise ConditionalCheckFailed()
+        item["last_activity_at"] = at
+
+    def query(self, **kwargs):
+        assert kwargs["IndexName"] == MEMBERS_ACTIVITY_INDEX
+        user_id = kwargs["ExpressionAttributeValues"][":uid"]
+        rows = sorted(
+            (i for i in self.items.values() if i["user_id"] == user_id),
+            key=lambda i: (i["last_activity_at"], i["thread_id"]),
+            reverse=not kwargs.get("ScanIndexForward", True),
+        )
+        start = kwargs.get("ExclusiveStartKey")
+        if start:
+            idx = next(n for n, i in enumerate(rows) if i["thread_id"] == start["thread_id"])
+            rows = rows[idx + 1:]
+        limit = kwargs.get("Limit")
+        page = rows[:limit] if limit else rows
+        resp = {"Items": [dict(i) for i in page]}
+        if limit and len(rows) > limit:
+            last = page[-1]
+            resp["LastEvaluatedKey"] = {
+                "user_id": user_id,
+                "thread_id": last["thread_id"],
+                "last_activity_at": last["last_activity_at"],
+            }
+        return resp
+
+
+class FakeThreadsTable:
+    def __init__(self):
+        self.items = {}
+
+    def put_item(self, Item):
+        self.items[Item["thread_id"]] = Item
+
+    def get_item(self, Key, **kwargs):
+        item = self.items.get(Key["thread_id"])
+        return {"Item": item} if item else {}
+
+
+def _repo():
+    repo = ThreadRepo()
+    repo.table = FakeThreadsTable()
+    repo.members = FakeMembersTable()
+    return repo
+
+
+def test_index_thread_writes_one_entry_per_distinct_participant():
+    repo = _repo()
+    count = repo.index_thread(
+        {"thread_id": "t1", "title": "Leak", "created_at": "2024-01-01", "participants": ["a", "b", "a"]}
+    )
+    assert count == 2
+    entry = repo.members.items[("b", "t1")]
+    assert entry["participants"] == ["a", "b"]
+    assert entry["last_activity_at"] == "2024-01-01"
+
+
+def test_touch_thread_only_moves_activity_forward():
+    repo = _repo()
+    repo.create_thread({"thread_id": "t1", "created_at": "2024-01-01", "participants": ["a", "b"]})
+    repo.touch_thread("t1", at="2024-01-05")
+    repo.touch_thread("t1", at="2024-01-03", participants=["a", "b", "not-indexed"])
+    assert repo.members.items[("a", "t1")]["last_activity_at"] == "2024-01-05"
+    assert repo.members.items[("b", "t1")]["last_activity_at"] == "2024-01-05"
+    assert ("not-indexed", "t1") not in repo.members.items
+
+
+def test_query_threads_for_user_pages_most_recent_first():
+    repo = _repo()
+    for n, created in enumerate(["2024-01-01", "2024-01-02", "2024-01-03"], start=1):
+        repo.create_thread({"thread_id": f"t{n}", "created_at": created, "participants": ["a", "b"]})
+    repo.create_thread({"thread_id": "other", "created_at": "2024-01-09", "participants": ["b"]})
+    repo.touch_thread("t1", at="2024-01-04")
+
+    first, cursor = repo.query_threads_for_user("a", limit=2)
+    assert [t["thread_id"] for t in first] == ["t1", "t3"]
+    assert "user_id" not in first[0]
+    rest, cursor = repo.query_threads_for_user("a", limit=2, cursor=cursor)
+    assert [t["thread_id"] for t in rest] == ["t2"]
+    assert cursor is None
+    assert [t["thread_id"] for t in repo.list_threads_for_user("a")] == ["t1", "t3", "t2"]
+
+
+def test_query_threads_for_user_rejects_another_users_cursor():
+    repo = _repo()
+    for n in range(3):
+        repo.create_thread({"thread_id": f"t{n}", "created_at": f"2024-01-0{n + 1}", "participants": ["a", "b"]})
+    _, cursor = repo.query_threads_for_user("a", limit=1)
+    with pytest.raises(InvalidCursor):
+        repo.query_threads_for_user("b", limit=1, cursor=cursor)
+
+
+def test_activity_tracker_coalesces_a_busy_thread_into_one_write_per_interval():
+    writes = []
+    done = threading.Event()
+
+    def touch(thread_id, at, participants):
+        writes.append((thread_id, at, participants))
+        done.set()
+
+    tracker = ThreadActivityTracker(touch, interval=60)
+    tracker.record("t1", "2024-01-01T00:00:01", ["a"])
+    assert done.wait(1)
+    for second in range(2, 12):
+        tracker.record("t1", f"2024-01-01T00:00:{second:02d}")
+    time.sleep(0.05)
+    # Still inside the interval: nothing more written until a flush
+    assert writes == [("t1", "2024-01-01T00:00:01", ["a"])]
+    assert tracker.flush(timeout=1)
+    assert writes[-1] == ("t1", "2024-01-01T00:00:11", None)
+    assert tracker.stats()["written"] == 2
+    assert tracker.stats()["coalesced"] == 9
@@ -0,0 +1,315 @@
+import copy
+import hashlib
+import hmac
+import json
+import threading
+import time
+
+from fastapi.testclient import TestClient
+
+from app.deps.auth import verify_firebase_token
+from app.deps.rate_limit import enforce_user_rate_limit
+from app.main import app
+from app.routes import chat_stream
+from app.services.agent_scheduler import AgentScheduler
+from app.services.webhook_queue import DEAD, DurableEventQueue, WebhookWorkerPool
+
+
+class FakeChannel:
+    def __init__(self, client, channel_id):
+        self.client = client
+        self.id = channel_id
+
+    def query(self, **_):
+        data = copy.deepcopy(self.client.channel_data.get(self.id, {}))
+        return {"channel": {"id": self.id, "data": data}, "messages": []}
+
+    def update(self, data):
+        self.client.channel_data.setdefault(self.id, {}).update(data)
+
+    def send_message(self, message, user_id):
+        if self.client.fail_sends:
+            self.client.fail_sends -= 1
+            raise RuntimeError("stream send failed")
+        self.client.sent.append((self.id, message["text"]))
+
+
+class FakeStream:
+    def __init__(self, fail_sends=0):
+        self.channel_data = {}
+        self.sent = []
+        self.fail_sends = fail_sends
+
+    def upsert_user(self, _):
+        pass
+
+    def channel(self, _type, channel_id):
+        return FakeChannel(self, channel_id)
+
+
+def _event(cid, text, message_id):
+    return {"type": "message.new", "message": {"id": message_id, "cid": cid, "text": text, "user": {"id": "tenant"}}}
+
+
+def test_events_survive_restart_and_redeliveries_are_ignored(tmp_path):
+    path = str(tmp_path / "q.sqlite3")
+    queue = DurableEventQueue(path, lease=0.01)
+    assert queue.enqueue("messaging:a", {"n": 1}, dedupe_key="m1")
+    assert not queue.enqueue("messaging:a", {"n": 1}, dedupe_key="m1")
+    claimed = queue.claim()
+    assert claimed[0]["payload"] == {"n": 1}
+    queue.close()  # crash while in flight
+    time.sleep(0.02)
+
+    reopened = DurableEventQueue(path)
+    assert reopened.claim()[0]["attempt"] == 2
+    reopened.close()
+
+
+def test_live_leases_survive_another_process_starting(tmp_path):
+    path = str(tmp_path / "q.sqlite3")
+    first = DurableEventQueue(path, lease=60)
+    first.enqueue("messaging:a", {"n": 1})
+    event = first.claim()[0]
+
+    # A second worker process opening the shared file leaves the event alone
+    second = DurableEventQueue(path, lease=60)
+    assert second.claim() == []
+    assert second.counts()["inflight"] == 1
+    assert second.owned_inflight() == 0
+    second.ack(event["id"])  # not its event
+    assert first.owned_inflight() == 1
+
+    first.ack(event["id"])
+    assert first.counts()["inflight"] == 0
+    first.close()
+    second.close()
+
+
+def test_expired_lease_goes_to_the_next_claimer_only(tmp_path):
+    path = str(tmp_path / "q.sqlite3")
+    stalled = DurableEventQueue(path, lease=0.01)
+    stalled.enqueue("messaging:a", {"n": 1})
+    event = stalled.claim()[0]
+    time.sleep(0.02)
+
+    other = DurableEventQueue(path, lease=60)
+    assert other.claim()[0]["attempt"] == 2
+    # The stalled owner finishing late must not drop the reclaimed event
+    stalled.ack(event["id"])
+    assert other.owned_inflight() == 1
+    stalled.close()
+    other.close()
+
+
+def test_per_channel_order_with_parallelism_across_channels(tmp_path):
+    queue = DurableEventQueue(str(tmp_path / "q.sqlite3"))
+    seen = []
+    active = set()
+    overlap = []
+    lock = threading.Lock()
+
+    def handler(payload):
+        with lock:
+            assert payload["ch"] not in active, "two events of one channel ran concurrently"
+            active.add(payload["ch"])
+            if len(active) > 1:
+                overlap.append(True)
+        time.sleep(0.01)
+        with lock:
+            seen.append((payload["ch"], payload["n"]))
+            active.discard(payload["ch"])
+
+    pool = WebhookWorkerPool(queue, handler, workers=4, poll_interval=0.01)
+    for n in range(5):
+        for ch in ("a", "b", "c"):
+            pool.submit(ch, {"ch": ch, "n": n})
+    assert pool.drain(10)
+    pool.stop()
+    for ch in ("a", "b", "c"):
+        assert [n for c, n in seen if c == ch] == list(range(5))
+    assert overlap
+
+
+def test_failures_retry_then_bury_without_blocking_the_channel(tmp_path):
+    queue = DurableEventQueue(str(tmp_path / "q.sqlite3"))
+    done = []
+
+    def handler(payload):
+        if payload["n"] == 0:
+            raise RuntimeError("stream down")
+        done.append(payload["n"])
+
+    pool = WebhookWorkerPool(queue, handler, max_attempts=2, base_backoff=0.01)
+    pool.submit("a", {"n": 0})
+    pool.submit("a", {"n": 1})
+    while pool.run_once() or queue.has_ready() or queue.counts()["pending"]:
+        time.sleep(0.005)
+    assert done == [1]
+    assert queue.counts()[DEAD] == 1
+    assert pool.stats()["retried"] == 1
+
+
+def test_discovery_flow_runs_offline_with_fakes():
+    stream = FakeStream()
+    replies = []
+
+    def fake_llm(prompt, context, persona):
+        replies.append(prompt)
+        return f"reply {len(replies)}"
+
+    event = _event("messaging:unit-1", "agent please help", "m1")
+    assert chat_stream.process_webhook_event(event, client=stream, reply_fn=fake_llm) == {"status": "ok"}
+    assert stream.channel_data["unit-1"]["discovery"]["stage"] == "questions"
+    assert stream.sent == [("unit-1", "reply 1")]
+
+    answer = _event("messaging:unit-1", "under the sink", "m2")
+    chat_stream.process_webhook_event(answer, client=stream, reply_fn=fake_llm)
+    assert stream.channel_data["unit-1"]["discovery"]["answers"] == {"location": "under the sink"}
+
+
+def _run_with_retries(tmp_path, handler, *events):
+    queue = DurableEventQueue(str(tmp_path / "q.sqlite3"))
+    pool = WebhookWorkerPool(queue, handler, max_attempts=3, base_backoff=0.001)
+    for event in events:
+        queue.enqueue(event["message"]["cid"], event, dedupe_key=event["message"]["id"])
+    while pool.run_once() or queue.has_ready() or queue.counts()["pending"]:
+        time.sleep(0.002)
+    return pool
+
+
+def test_failed_reply_is_retried_without_advancing_discovery_twice(tmp_path):
+    stream = FakeStream(fail_sends=1)
+    prompts = []
+
+    def fake_llm(prompt, context, persona):
+        prompts.append(prompt)
+        return f"reply {len(prompts)}"
+
+    def handler(event):
+        chat_stream.process_webhook_event(event, client=stream, reply_fn=fake_llm)
+
+    stream.channel_data["unit-1"] = {
+        "discovery": {"stage": "questions", "question_index": 0, "answers": {}, "history": []}
+    }
+    pool = _run_with_retries(tmp_path, handler, _event("messaging:unit-1", "under the sink", "m1"))
+
+    discovery = stream.channel_data["unit-1"]["discovery"]
+    assert pool.stats()["retried"] == 1
+    assert discovery["question_index"] == 1
+    assert discovery["answers"] == {"location": "under the sink"}
+    assert len(discovery["history"]) == 1
+    # The retry asked the second question again rather than skipping to the third
+    assert stream.sent == [("unit-1", "reply 2")]
+    assert all(chat_stream.DISCOVERY_QUESTIONS[1]["prompt"] in p for p in prompts)
+
+
+def test_unresolved_diy_retry_still_creates_one_incident(tmp_path, monkeypatch):
+    stream = FakeStream(fail_sends=1)
+    incidents = {}
+
+    def fake_create(thread_id, tenant_email, payload):
+        item = dict(payload, incident_id=payload.get("incident_id") or f"INC-{len(incidents)}")
+        incidents[item["incident_id"]] = item
+        return item
+
+    monkeypatch.setattr(chat_stream, "create_incident_record", fake_create)
+
+    def handler(event):
+        chat_stream.process_webhook_event(event, client=stream, reply_fn=lambda p, c, persona: "ok")
+
+    stream.channel_data["unit-1"] = {
+        "discovery": {"stage": "diy", "summary": "location: sink", "classification": {"category": "plumbing"}}
+    }
+    _run_with_retries(tmp_path, handler, _event("messaging:unit-1", "not resolved", "m9"))
+
+    assert list(incidents) == ["INC-m9"]
+    discovery = stream.channel_data["unit-1"]["discovery"]
+    assert discovery["stage"] == "incident"
+    assert discovery["incident_id"] == "INC-m9"
+    assert stream.sent[0] == ("unit-1", "ok")
+
+
+def test_webhook_acknowledges_and_enqueues(monkeypatch):
+    submitted = []
+
+    class FakePool:
+        def submit(self, channel_key, payload, dedupe_key=None, priority=0):
+            submitted.append((channel_key, dedupe_key))
+            return len(submitted) == 1
+
+    monkeypatch.setattr(chat_stream, "WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setattr(chat_stream, "WEBHOOK_ASYNC", True)
+    monkeypatch.setattr(chat_stream, "WEBHOOK_IDEMPOTENCY", False)
+    monkeypatch.setattr(chat_stream, "get_webhook_pool", lambda handler: FakePool())
+    body = json.dumps(_event("messaging:unit-1", "agent?", "m1")).encode()
+    signature = hmac.new(b"s3cret", body, hashlib.sha256).hexdigest()
+    client = TestClient(app)
+    headers = {"X-Signature": signature, "Content-Type": "application/json"}
+    assert client.post("/chat/stream/webhook", content=body, headers=headers).json() == {"status": "queued"}
+    assert client.post("/chat/stream/webhook", content=body, headers=headers).json() == {"status": "duplicate"}
+    assert submitted[0] == ("messaging:unit-1", "m1")
+
+
+def _post_webhook(client, event):
+    body = json.dumps(event).encode()
+    headers = {"X-Signature": hmac.new(b"s3cret", body, hashlib.sha256).hexdigest(), "Content-Type": "application/json"}
+    return client.post("/chat/stream/webhook", content=body, headers=headers)
+
+
+def test_follow_ups_are_queued_with_the_channels_discovery_priority(monkeypatch):
+    submitted = []
+
+    class FakePool:
+        def submit(self, channel_key, payload, dedupe_key=None, priority=0):
+            submitted.append((payload["message"]["text"], priority))
+            return True
+
+    monkeypatch.setattr(chat_stream, "WEBHOOK_SECRET", "s3cret")
+    monkeypatch.setattr(chat_stream, "WEBHOOK_ASYNC", True)
+    monkeypatch.setattr(chat_stream, "WEBHOOK_IDEMPOTENCY", False)
+    monkeypatch.setattr(chat_stream, "get_webhook_pool", lambda handler: FakePool())
+    client = TestClient(app)
+
+    # The handler saw this channel report flooding
+    stream = FakeStream()
+    stream.channel_data["unit-7"] = {
+        "discovery": {"stage": "questions", "question_index": 1, "answers": {"location": "basement flooding"}}
+    }
+    event = _event("messaging:unit-7", "it started an hour ago", "m1")
+    chat_stream.process_webhook_event(event, client=stream, reply_fn=lambda p, c, persona: "ok")
+
+    _post_webhook(client, _event("messaging:unit-7", "yes, basement", "m2"))
+    _post_webhook(client, _event("messaging:unit-8", "yes, basement", "m3"))
+    assert submitted == [("yes, basement", 0), ("yes, basement", 2)]
+
+
+def test_saturated_agent_answers_discovery_offline(monkeypatch):
+    monkeypatch.setattr(chat_stream, "agent_scheduler", AgentScheduler(max_concurrency=0, admission_timeout=0.01))
+    stream = FakeStream()
+    llm_calls = []
+
+    def fake_llm(prompt, context, persona):
+        llm_calls.append(prompt)
+        return "llm"
+
+    event = _event("messaging:unit-2", "agent please help", "m1")
+    chat_stream.process_webhook_event(event, client=stream, reply_fn=fake_llm)
+    assert llm_calls == []
+    assert stream.sent == [("unit-2", f"I'll gather a few details about the issue. {chat_stream.DISCOVERY_QUESTIONS[0]['prompt']}")]
+    assert stream.channel_data["unit-2"]["discovery"]["stage"] == "questions"
+
+
+def test_saturated_agent_reply_route_returns_503_with_retry_after(monkeypatch):
+    monkeypatch.setattr(chat_stream, "agent_scheduler", AgentScheduler(max_concurrency=0, admission_timeout=0.01))
+    monkeypatch.setattr(chat_stream, "_get_stream_client", lambda: FakeStream())
+    app.dependency_overrides[verify_firebase_token] = lambda: "token"
+    app.dependency_overrides[enforce_user_rate_limit] = lambda: "token"
+    try:
+        resp = TestClient(app).post(
+            "/chat/stream/agent_reply", json={"channel_id": "unit-3", "prompt": "hello", "persona": "tenant"}
+        )
+    finally:
+        app.dependency_overrides.clear()
+    assert resp.status_code == 503
+    assert resp.headers["Retry-After"] == "1"
@@ -0,0 +1,54 @@
+from app.services.write_behind import WriteBehindBuffer
+
+
+def _item(n):
+    return {"thread_id": "t1", "timestamp": f"2024-01-01T00:00:{n:02d}Z"}
+
+
+def test_buffer_batches_up_to_25_items():
+    batches = []
+
+    def write_batch(items):
+        batches.append(len(items))
+        return []
+
+    buf = WriteBehindBuffer(write_batch, key_fields=("thread_id", "timestamp"), flush_interval=0.2)
+    for n in range(30):
+        assert buf.submit(_item(n))
+    assert buf.flush(timeout=5)
+    assert sum(batches) == 30
+    assert max(batches) <= 25
+    assert len(batches) < 30
+    assert buf.stats()["written"] == 30
+
+
+def test_buffer_retries_unprocessed_items():
+    calls = []
+
+    def write_batch(items):
+        calls.append(list(items))
+        return items[:1] if len(calls) == 1 else []
+
+    buf = WriteBehindBuffer(write_batch, key_fields=("thread_id", "timestamp"), flush_interval=0.01, base_backoff=0.001)
+    buf.submit(_item(1))
+    buf.submit(_item(2))
+    assert buf.flush(timeout=5)
+    assert len(calls[-1]) == 1
+    assert buf.stats()["retries"] == 1
+    assert buf.stats()["written"] == 2
+
+
+def test_buffer_hands_off_items_after_max_retries():
+    failed = []
+    buf = WriteBehindBuffer(
+        lambda items: items,
+        key_fields=("thread_id", "timestamp"),
+        flush_interval=0.01,
+        max_retries=2,
+        base_backoff=0.001,
+        on_failure=failed.extend,
+    )
+    buf.submit(_item(1))
+    assert buf.flush(timeout=5)
+    assert failed == [_item(1)]
+    assert buf.stats()["failed"] == 1
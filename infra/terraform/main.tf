@@ -48,19 +48,100 @@ resource "aws_dynamodb_table" "jobs" {
   attribute { name = "user_id" type = "S" }
 }
 
+# user -> thread adjacency items for inbox listing (see ThreadRepo)
+resource "aws_dynamodb_table" "thread_members" {
+  name         = "${local.prefix}_thread_members"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "user_id"
+  range_key    = "thread_id"
+
+  attribute { name = "user_id" type = "S" }
+  attribute { name = "thread_id" type = "S" }
+  attribute { name = "last_activity_at" type = "S" }
+
+  global_secondary_index {
+    name            = "user-activity-index"
+    hash_key        = "user_id"
+    range_key       = "last_activity_at"
+    projection_type = "ALL"
+  }
+}
+
+# Tasks are listed per persona/assignee via GSIs sorted by "<status>#<created_at>"
+resource "aws_dynamodb_table" "tasks" {
+  name         = "${local.prefix}_tasks"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "task_id"
+
+  attribute { name = "task_id" type = "S" }
+  attribute { name = "persona" type = "S" }
+  attribute { name = "assigned_to" type = "S" }
+  attribute { name = "status_created_at" type = "S" }
+
+  global_secondary_index {
+    name            = "persona-status-index"
+    hash_key        = "persona"
+    range_key       = "status_created_at"
+    projection_type = "ALL"
+  }
+
+  global_secondary_index {
+    name            = "assignee-status-index"
+    hash_key        = "assigned_to"
+    range_key       = "status_created_at"
+    projection_type = "ALL"
+  }
+}
+
+# Fleet-wide rate-limit window counters (RATE_LIMIT_BACKEND=dynamodb)
+resource "aws_dynamodb_table" "rate_limits" {
+  name         = "${local.prefix}_rate_limits"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "limit_key"
+
+  attribute { name = "limit_key" type = "S" }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
+
+# Stream webhook message ids already handled (idempotency markers)
+resource "aws_dynamodb_table" "webhook_events" {
+  name         = "${local.prefix}_webhook_events"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "event_key"
+
+  attribute { name = "event_key" type = "S" }
+
+  ttl {
+    attribute_name = "expires_at"
+    enabled        = true
+  }
+}
+
 data "aws_iam_policy_document" "ddb_access" {
   statement {
     actions = [
       "dynamodb:PutItem",
       "dynamodb:UpdateItem",
+      "dynamodb:DeleteItem",
       "dynamodb:GetItem",
       "dynamodb:Query",
-      "dynamodb:Scan"
+      "dynamodb:Scan",
+      "dynamodb:BatchWriteItem"
     ]
     resources = [
       aws_dynamodb_table.chat_messages.arn,
       aws_dynamodb_table.incidents.arn,
-      aws_dynamodb_table.jobs.arn
+      aws_dynamodb_table.jobs.arn,
+      aws_dynamodb_table.thread_members.arn,
+      "${aws_dynamodb_table.thread_members.arn}/index/*",
+      aws_dynamodb_table.tasks.arn,
+      "${aws_dynamodb_table.tasks.arn}/index/*",
+      aws_dynamodb_table.rate_limits.arn,
+      aws_dynamodb_table.webhook_events.arn
     ]
   }
 }
@@ -72,8 +153,12 @@ resource "aws_iam_policy" "app_ddb_policy" {
 
 output "table_names" {
   value = {
-    chat_messages = aws_dynamodb_table.chat_messages.name
-    incidents     = aws_dynamodb_table.incidents.name
-    jobs          = aws_dynamodb_table.jobs.name
+    chat_messages  = aws_dynamodb_table.chat_messages.name
+    incidents      = aws_dynamodb_table.incidents.name
+    jobs           = aws_dynamodb_table.jobs.name
+    thread_members = aws_dynamodb_table.thread_members.name
+    tasks          = aws_dynamodb_table.tasks.name
+    rate_limits    = aws_dynamodb_table.rate_limits.name
+    webhook_events = aws_dynamodb_table.webhook_events.name
   }
 }